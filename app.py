@@ -11,8 +11,10 @@ from flask import (
     send_file,
     send_from_directory,
     current_app,
+    Response,
+    stream_with_context,
 )
-from flask_babel import Babel, gettext as _
+from flask_babel import Babel, get_locale, gettext as _
 from flask_login import (
     LoginManager,
     current_user,
@@ -20,13 +22,47 @@ from flask_login import (
     logout_user,
     login_required,
 )
-from flask_wtf.csrf import CSRFProtect
+from flask_wtf.csrf import CSRFProtect, generate_csrf
+from werkzeug.exceptions import HTTPException
 from werkzeug.security import check_password_hash, generate_password_hash
 from urllib.parse import urlparse
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from mailgun_service import send_email
 
 from config import Config
+from utils.logs import configure_logging
+from utils import metrics
+from utils.querycount import init_query_counter
+from utils import profiler
+from utils import assets
+from utils import bundles
+from utils import compress
+from utils import fragcache
+from utils import memdiag
+from utils.uploads import (
+    UploadRequest,
+    UploadRejected,
+    save_upload,
+    sniff,
+    allowed_ext,
+    mime_for_ext,
+    max_upload_bytes,
+)
+from utils import blobstore
+from utils import avatars
+from utils import thumbnails
+from utils import imagenorm
+from utils import imageproxy
+from utils import warmup
+from utils import responsive
+from utils import fonts
+from utils import serviceworker
+from utils import locales
+from utils import usage
+from utils import uploadgc
+from utils.zipstream import ZipEntry, stream_zip, unique_name
+from utils import storage
+from utils.storage import send_stored
 from models import db, News, Schedule, Signup, User, Document, RoleChangeLog
 import models as models
 from forms import (
@@ -41,9 +77,14 @@ from forms import (
 )
 
 import os
+import re
+import base64
+import uuid
 import secrets
 import sqlite3
+import click
 from functools import wraps
+from sqlalchemy import inspect as sa_inspect
 from babel.messages.pofile import read_po
 from babel.messages.mofile import write_mo
 
@@ -56,15 +97,57 @@ def compile_translations(app):
         po_path = os.path.join(trans_dir, lang, "LC_MESSAGES", "messages.po")
         mo_path = os.path.join(trans_dir, lang, "LC_MESSAGES", "messages.mo")
         if os.path.isfile(po_path):
+            # other workers (and their warmup) may be reading the .mo right now:
+            # leave an up-to-date one alone, replace a stale one atomically
+            if os.path.isfile(mo_path) and os.path.getmtime(mo_path) >= os.path.getmtime(po_path):
+                continue
+            tmp_path = f"{mo_path}.{os.getpid()}.tmp"
             try:
                 with open(po_path, "r", encoding="utf-8") as f:
                     catalog = read_po(f)
                 os.makedirs(os.path.dirname(mo_path), exist_ok=True)
-                with open(mo_path, "wb") as f:
+                with open(tmp_path, "wb") as f:
                     write_mo(f, catalog)
+                os.replace(tmp_path, mo_path)
             except Exception:
                 # Skip locale if it fails to compile
-                pass
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+
+# Columns added after the first deploy, for databases other than SQLite (the
+# SQLite path below reads PRAGMA table_info instead): table, column, DDL type
+# and statements run once right after the column is added
+ADDED_COLUMNS = (
+    ("document", "sha256", "VARCHAR(64)", ("CREATE INDEX ix_document_sha256 ON {table} (sha256)",)),
+    ("user", "storage_bytes", "BIGINT DEFAULT 0 NOT NULL", (
+        "UPDATE {table} SET storage_bytes = "
+        "(SELECT COALESCE(SUM(size_bytes), 0) FROM document WHERE document.user_id = {table}.id)",
+    )),
+    ("user", "storage_files", "INTEGER DEFAULT 0 NOT NULL", (
+        "UPDATE {table} SET storage_files = "
+        "(SELECT COUNT(*) FROM document WHERE document.user_id = {table}.id)",
+    )),
+)
+
+
+def _migrate_added_columns(app, engine):
+    """Dialect-neutral ``ALTER TABLE ... ADD COLUMN`` for ``ADDED_COLUMNS`` (PostgreSQL, MySQL)."""
+    quote = engine.dialect.identifier_preparer.quote
+    try:
+        inspector = sa_inspect(engine)
+        tables = set(inspector.get_table_names())
+        with engine.begin() as conn:
+            for table, column, ddl, after in ADDED_COLUMNS:
+                if table not in tables or column in {c["name"] for c in inspector.get_columns(table)}:
+                    continue
+                conn.exec_driver_sql(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(column)} {ddl}")
+                for stmt in after:
+                    conn.exec_driver_sql(stmt.format(table=quote(table)))
+                app.logger.info("migration: column added", extra={"table": table, "column": column})
+    except Exception as exc:
+        app.logger.error("migration: adding columns failed", extra={"error": str(exc)})
+        raise
 
 
 def run_simple_migrations(app):
@@ -72,6 +155,7 @@ def run_simple_migrations(app):
     with app.app_context():
         engine = db.engine
         if engine.dialect.name != "sqlite":
+            _migrate_added_columns(app, engine)
             return
         try:
             with engine.begin() as conn:
@@ -104,6 +188,14 @@ def run_simple_migrations(app):
                     add_cols_sql.append("ALTER TABLE user ADD COLUMN avatar_path VARCHAR(512)")
                 if "is_superadmin" not in cols:
                     add_cols_sql.append("ALTER TABLE user ADD COLUMN is_superadmin BOOLEAN")
+                if "storage_bytes" not in cols:
+                    add_cols_sql.append("ALTER TABLE user ADD COLUMN storage_bytes BIGINT NOT NULL DEFAULT 0")
+                    add_cols_sql.append("ALTER TABLE user ADD COLUMN storage_files INTEGER NOT NULL DEFAULT 0")
+                    add_cols_sql.append(
+                        "UPDATE user SET "
+                        "storage_bytes = (SELECT COALESCE(SUM(size_bytes), 0) FROM document WHERE document.user_id = user.id), "
+                        "storage_files = (SELECT COUNT(*) FROM document WHERE document.user_id = user.id)"
+                    )
                 for stmt in add_cols_sql:
                     conn.exec_driver_sql(stmt)
 
@@ -157,12 +249,29 @@ def run_simple_migrations(app):
                         )
                 except Exception:
                     pass
+
+                # document table
+                try:
+                    doc_cols = conn.exec_driver_sql(
+                        "PRAGMA table_info('document')"
+                    ).fetchall()
+                    d_cols = {row[1] for row in doc_cols}
+                    if "sha256" not in d_cols:
+                        conn.exec_driver_sql(
+                            "ALTER TABLE document ADD COLUMN sha256 VARCHAR(64)"
+                        )
+                        conn.exec_driver_sql(
+                            "CREATE INDEX IF NOT EXISTS ix_document_sha256 ON document(sha256)"
+                        )
+                except Exception:
+                    pass
         except Exception:
             app.logger.warning("User table migration skipped or failed. Consider using Alembic.")
 
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config.from_object(Config)
 
     # Стабильный SECRET_KEY
@@ -171,12 +280,22 @@ def create_app():
         app.config.get("SECRET_KEY") or "wiru-dev-secret-change-me",
     )
 
+    # registered first: after_request hooks run in reverse, so this one sees the final body
+    compress.init_compression(app)
+    configure_logging(app)
+    profiler.init_profiler(app)
+    assets.init_assets(app)
+    fragcache.init_fragment_cache(app)
+
     # Compile translations on startup
     compile_translations(app)
 
     # DB
     db.init_app(app)
     with app.app_context():
+        metrics.init_metrics(app, db.engine)
+        memdiag.init_memdiag(app)
+        init_query_counter(app, db.engine)
         db.create_all()
         run_simple_migrations(app)
         seed_if_empty()
@@ -248,6 +367,9 @@ def create_app():
 
     # Babel
     def select_locale():
+        # 0) /ru/..., /en/..., /et/... prefix of a public page
+        if locales.url_lang():
+            return locales.url_lang()
         # 1) explicit ?lang=xx
         lang = request.args.get("lang")
         if lang and lang in app.config["LANGUAGES"]:
@@ -259,6 +381,7 @@ def create_app():
         return request.accept_languages.best_match(app.config["LANGUAGES"])
 
     babel = Babel(app, locale_selector=select_locale)
+    locales.init_locales(app)
 
     # Template globals
     @app.context_processor
@@ -270,6 +393,19 @@ def create_app():
             models=models,
             config=app.config,
             t=_,
+            avatar_url=avatars.avatar_url,
+            avatar_srcset=avatars.avatar_srcset,
+            responsive_image=responsive.responsive_image,
+            image_attrs=responsive.image_attrs,
+            resized_image=imageproxy.resized_image,
+            bundle_url=bundles.bundle_url,
+            bundle_link=bundles.bundle_link,
+            inline_bundle=bundles.inline_bundle,
+            font_tags=fonts.font_tags,
+            CURRENT_LANG=str(get_locale() or app.config["BABEL_DEFAULT_LOCALE"]),
+            lang_switch_url=locales.lang_switch_url,
+            hreflang_alternates=locales.alternates,
+            cacheable_page=locales.is_cacheable,
         )
 
     # Utilities
@@ -290,7 +426,7 @@ def create_app():
 
     # ----------------- PUBLIC PAGES -----------------
 
-    @app.route("/")
+    @locales.localized_route(app, "/")
     def home():
         news = News.query.order_by(News.created_at.desc()).limit(6).all()
         schedule = Schedule.query.order_by(
@@ -304,6 +440,20 @@ def create_app():
     def robots():
         return send_from_directory('static', 'robots.txt', mimetype='text/plain')
     
+    @app.route("/sw.js")
+    def service_worker():
+        # served from the root so its scope covers the whole site
+        body, version = serviceworker.render()
+        resp = app.response_class(body, mimetype="text/javascript")
+        resp.set_etag(version)
+        resp.cache_control.no_cache = True
+        resp.headers["Service-Worker-Allowed"] = "/"
+        return resp.make_conditional(request)
+
+    @app.route("/img/<int:width>/<fmt>/<path:filename>")
+    def resized_image(width, fmt, filename):
+        return imageproxy.serve(width, fmt, filename)
+
     @app.route("/favicon.ico")
     def favicon():
         return send_from_directory(
@@ -313,7 +463,7 @@ def create_app():
     )
 
 
-    @app.route("/news")
+    @locales.localized_route(app, "/news")
     def news_list():
         news = News.query.order_by(News.created_at.desc()).all()
         return render_template(
@@ -325,12 +475,12 @@ def create_app():
             og_desc="Будьте в курсе спортивных событий и мероприятий академии единоборств."
         )
 
-    @app.route("/news/<int:news_id>")
+    @locales.localized_route(app, "/news/<int:news_id>")
     def news_detail(news_id):
         item = News.query.get_or_404(news_id)
         return render_template("news_detail.html", item=item)
 
-    @app.route("/schedule")
+    @locales.localized_route(app, "/schedule")
     def schedule_page():
         schedule = Schedule.query.order_by(
             Schedule.day_of_week.asc(), Schedule.time.asc()
@@ -339,7 +489,7 @@ def create_app():
             "schedule.html", schedule=schedule, today=datetime.utcnow().weekday()
         )
 
-    @app.route("/trainers")
+    @locales.localized_route(app, "/trainers")
     def trainers_page():
         trainers = [
             {
@@ -364,7 +514,7 @@ def create_app():
             og_desc="Познакомьтесь с нашими тренерами и их опытом в единоборствах."
         )
 
-    @app.route("/contact")
+    @locales.localized_route(app, "/contact")
     def contact():
         return render_template(
             "contact.html",
@@ -374,7 +524,7 @@ def create_app():
             og_desc="Свяжитесь с нами, чтобы записаться на тренировку или задать вопрос."
         )
 
-    @app.route("/privacy")
+    @locales.localized_route(app, "/privacy")
     def privacy():
         return render_template(
             "privacy.html",
@@ -382,7 +532,7 @@ def create_app():
             description="Wiru Combat Academy MTÜ privaatsuspoliitika"
         )
 
-    @app.route("/terms")
+    @locales.localized_route(app, "/terms")
     def terms():
         return render_template(
             "terms.html",
@@ -390,7 +540,7 @@ def create_app():
             description="Wiru Combat Academy MTÜ kasutustingimused"
         )
 
-    @app.route("/cookies")
+    @locales.localized_route(app, "/cookies")
     def cookies():
         return render_template(
             "cookies.html",
@@ -398,7 +548,7 @@ def create_app():
             description="Wiru Combat Academy MTÜ küpsiste poliitika"
         )
 
-    @app.route("/safety")
+    @locales.localized_route(app, "/safety")
     def safety():
         return render_template(
             "safety.html",
@@ -406,7 +556,7 @@ def create_app():
             description="Wiru Combat Academy MTÜ ohutusreeglid treeningutel"
         )
 
-    @app.route("/youth")
+    @locales.localized_route(app, "/youth")
     def youth():
         return render_template(
             "youth.html",
@@ -414,7 +564,7 @@ def create_app():
             description="Wiru Combat Academy MTÜ noorte ja lapsevanemate tingimused"
         )
 
-    @app.route("/marketing")
+    @locales.localized_route(app, "/marketing")
     def marketing():
         return render_template(
             "marketing.html",
@@ -454,18 +604,27 @@ def create_app():
                 subject="Сообщение с сайта Wiru Combat Academy",
                 text=body,
             )
-            print(r.status_code, r.text)
             if r.status_code == 200:
                 flash(_("Спасибо! Ваше сообщение отправлено."), "success")
             else:
-                print("Mailgun error:", r.status_code, r.text)
+                app.logger.warning(
+                    "contact form: mailgun error",
+                    extra={"status": r.status_code, "body": (r.text or "")[:500]},
+                )
                 flash(_("Произошла ошибка при отправке сообщения."), "error")
-        except Exception as e:
-            print("Mail error:", e)
+        except Exception:
+            app.logger.exception("contact form: mail send failed")
             flash(_("Произошла ошибка при отправке сообщения."), "error")
 
         return redirect(url_for("home"))
 
+    @app.route("/csrf-token")
+    def csrf_token_json():
+        # cacheable public pages carry no token; their forms fetch one on submit
+        resp = jsonify(token=generate_csrf())
+        resp.cache_control.no_store = True
+        return resp
+
     @app.route("/signup", methods=["GET", "POST"])
     def signup():
         form = SignupForm()
@@ -492,41 +651,31 @@ def create_app():
         form = LoginForm()
 
         if form.validate_on_submit():
-            print("LOGIN: form.validate_on_submit() = True", flush=True)
-            print("LOGIN: ident =", repr(form.email.data), flush=True)
-
             ident = (form.email.data or "").strip()
             user = User.query.filter_by(email=ident.lower()).first()
             if not user:
                 user = User.query.filter_by(username=ident).first()
 
-            print(
-                "LOGIN: user found =",
-                bool(user),
-                "id=",
-                getattr(user, "id", None),
-                flush=True,
+            app.logger.debug(
+                "login: lookup", extra={"user_found": bool(user), "user_id": getattr(user, "id", None)}
             )
 
             if user and user.is_active and user.check_password(form.password.data):
-                print("LOGIN: password OK, logging in", flush=True)
                 login_user(user, remember=form.remember.data)
+                app.logger.info("login: success", extra={"user_id": user.id})
                 flash(_("Добро пожаловать!"))
                 nxt = request.args.get("next")
-                print("LOGIN: next =", repr(nxt), flush=True)
                 if nxt and is_safe_next(nxt) and not nxt.startswith("/admin"):
                     return redirect(nxt)
                 return redirect(url_for("profile"))
 
-            print("LOGIN: invalid credentials or inactive", flush=True)
+            app.logger.info(
+                "login: rejected", extra={"user_id": getattr(user, "id", None), "ip": request.remote_addr}
+            )
             flash(_("Неверный email/имя пользователя или пароль"))
         else:
             if request.method == "POST":
-                print(
-                    "LOGIN: validate_on_submit() = False, errors:",
-                    form.errors,
-                    flush=True,
-                )
+                app.logger.debug("login: form invalid", extra={"errors": form.errors})
 
         return render_template("auth/login.html", form=form)
 
@@ -594,10 +743,15 @@ def create_app():
     @app.route("/admin")
     @admin_required
     def admin_dashboard():
+        # Both counts in one round-trip
+        news_count, signup_count = db.session.query(
+            db.select(db.func.count(News.id)).scalar_subquery(),
+            db.select(db.func.count(Signup.id)).scalar_subquery(),
+        ).one()
         return render_template(
             "admin/dashboard.html",
-            news_count=News.query.count(),
-            signup_count=Signup.query.count(),
+            news_count=news_count,
+            signup_count=signup_count,
         )
 
     # ----------------- ADMIN: NEWS -----------------
@@ -876,28 +1030,34 @@ def create_app():
             return jsonify({"error": "invalid day values"}), 400
         if replace:
             Schedule.query.filter_by(day_of_week=dst).delete()
+            taken = None
+        else:
+            # one query for all occupied slots instead of one per source item
+            taken = {
+                t for (t,) in db.session.query(Schedule.time).filter_by(day_of_week=dst)
+            }
         src_items = Schedule.query.filter_by(day_of_week=src).all()
-        created = 0
+        rows = []
         for it in src_items:
-            if not replace:
-                existing = Schedule.query.filter_by(
-                    day_of_week=dst, time=it.time
-                ).first()
-                if existing:
+            if taken is not None:
+                if it.time in taken:
                     continue
-            db.session.add(
-                Schedule(
-                    day_of_week=dst,
-                    time=it.time,
-                    activity=it.activity,
-                    discipline=it.discipline,
-                    coach=it.coach,
-                    age=it.age,
-                )
+                taken.add(it.time)
+            rows.append(
+                {
+                    "day_of_week": dst,
+                    "time": it.time,
+                    "activity": it.activity,
+                    "discipline": it.discipline,
+                    "coach": it.coach,
+                    "age": it.age,
+                }
             )
-            created += 1
+        if rows:
+            # single executemany instead of one INSERT per row
+            db.session.execute(Schedule.__table__.insert(), rows)
         db.session.commit()
-        return jsonify({"ok": True, "created": created})
+        return jsonify({"ok": True, "created": len(rows)})
 
     # ----------------- ADMIN: USERS -----------------
 
@@ -934,6 +1094,59 @@ def create_app():
             "admin/user_detail.html", user=u, subs=subs, payments=pays, docs=docs, role_logs=role_logs
         )
 
+    @app.route("/admin/users/<int:user_id>/documents.zip")
+    @admin_required
+    def admin_user_documents_zip(user_id):
+        u = User.query.get_or_404(user_id)
+        date_from = date_to = None
+        try:
+            if request.args.get("from"):
+                date_from = datetime.strptime(request.args["from"], "%Y-%m-%d")
+            if request.args.get("to"):
+                # inclusive: everything before the next midnight
+                date_to = datetime.strptime(request.args["to"], "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            abort(400)
+        cols = (Document.id, Document.filename, Document.stored_path, Document.size_bytes, Document.uploaded_at)
+
+        def rows():
+            # keyset pages: bounded memory and no cursor held open while the client downloads
+            last_id = 0
+            while True:
+                q = db.select(*cols).where(Document.user_id == u.id, Document.id > last_id)
+                if date_from:
+                    q = q.where(Document.uploaded_at >= date_from)
+                if date_to:
+                    q = q.where(Document.uploaded_at < date_to)
+                page = db.session.execute(q.order_by(Document.id).limit(200)).all()
+                if not page:
+                    return
+                yield from page
+                last_id = page[-1].id
+
+        def entries():
+            used = set()
+            for row in rows():
+                ref = row.stored_path or ""
+                name = (row.filename or os.path.basename(ref)).replace("/", "_").replace("\\", "_")
+                yield ZipEntry(
+                    name=unique_name(name or f"document_{row.id}", used),
+                    modified=row.uploaded_at,
+                    open=lambda ref=ref: storage.for_ref(ref).open(ref),
+                    size=row.size_bytes,
+                )
+
+        def on_error(entry, exc):
+            app.logger.warning("zip export: file skipped", extra={"user_id": u.id, "entry": entry.name, "error": str(exc)})
+
+        suffix = "".join(f"_{request.args[k]}" for k in ("from", "to") if request.args.get(k))
+        resp = Response(stream_with_context(stream_zip(entries(), on_error=on_error)), mimetype="application/zip")
+        resp.headers.set("Content-Disposition", "attachment", filename=f"user_{u.id}_documents{suffix}.zip")
+        resp.headers["Cache-Control"] = "no-store"
+        # let nginx pass chunks through instead of spooling the archive
+        resp.headers["X-Accel-Buffering"] = "no"
+        return resp
+
     @app.route("/admin/users/<int:user_id>/make-admin", methods=["POST"])
     @superadmin_required
     def admin_make_admin(user_id):
@@ -1076,51 +1289,29 @@ def create_app():
                 f = None
 
             if f and getattr(f, "filename", None):
-                filename = f.filename or ""
-                ext = (
-                    filename.rsplit(".", 1)[-1].lower()
-                    if "." in filename
-                    else ""
-                )
-                allowed = set(
-                    app.config.get(
-                        "ALLOWED_UPLOAD_EXTENSIONS",
-                        {"jpg", "jpeg", "png"},
+                try:
+                    info = save_upload(
+                        f, storage.scratch_dir(), prefix="avatar_", allowed={"jpg", "jpeg", "png"}
                     )
-                )
-                if ext not in allowed:
-                    flash(_("Недопустимый тип файла"), "error")
+                    try:
+                        imagenorm.check(info.path)
+                    except UploadRejected:
+                        os.remove(info.path)
+                        raise
+                    key = f"{current_user.id}/{os.path.basename(info.path)}"
+                    ref = storage.get_storage().save(info.path, key, info.mime)
+                except imagenorm.ImageTooLarge:
+                    flash(_("Изображение слишком большое"), "error")
                     return redirect(url_for("profile_edit"))
-                max_bytes = int(app.config.get("MAX_UPLOAD_MB", 15)) * 1024 * 1024
-                content_len = request.content_length or 0
-                if content_len and content_len > max_bytes + 8192:
-                    flash(_("Файл слишком большой"), "error")
+                except UploadRejected:
+                    flash(_("Недопустимый тип файла"), "error")
                     return redirect(url_for("profile_edit"))
-                import uuid
-
-                user_dir = os.path.join(
-                    app.config.get("UPLOAD_DIR", "./uploads"),
-                    str(current_user.id),
-                )
-                os.makedirs(user_dir, exist_ok=True)
-                stored_name = f"avatar_{uuid.uuid4().hex}.{ext}"
-                stored_path = os.path.join(user_dir, stored_name)
-                try:
-                    f.save(stored_path)
-                    size_bytes = os.path.getsize(stored_path)
-                    if size_bytes > max_bytes:
-                        os.remove(stored_path)
-                        flash(_("Файл слишком большой"), "error")
-                        return redirect(url_for("profile_edit"))
-                    current_user.avatar_path = stored_path
                 except Exception:
-                    try:
-                        if os.path.exists(stored_path):
-                            os.remove(stored_path)
-                    except Exception:
-                        pass
+                    app.logger.exception("avatar upload failed")
                     flash(_("Ошибка сохранения файла"), "error")
                     return redirect(url_for("profile_edit"))
+                current_user.avatar_path = ref
+                imagenorm.schedule_avatar(ref, info.ext)
 
             db.session.commit()
             flash(_("Профиль обновлён."), "success")
@@ -1133,17 +1324,31 @@ def create_app():
     @app.route("/profile/avatar")
     @login_required
     def profile_avatar():
-        path = current_user.avatar_path or ""
-        if not path:
+        return send_stored(current_user.avatar_path)
+
+    @app.route("/avatars/<int:user_id>/<token>/<int:size>.<ext>")
+    @login_required
+    def avatar_variant(user_id, token, size, ext):
+        if size not in avatars.SIZES or ext not in avatars.FORMATS:
             abort(404)
-        base = os.path.realpath(app.config.get("UPLOAD_DIR", "./uploads"))
-        real = os.path.realpath(path)
-        if not real.startswith(base + os.sep) and real != base:
+        if user_id != current_user.id and not getattr(current_user, "is_admin", False):
             abort(403)
+        user = current_user if user_id == current_user.id else User.query.get_or_404(user_id)
+        path = user.avatar_path or ""
+        if not path or avatars.avatar_token(path) != token:
+            abort(404)
         try:
-            return send_file(real)
+            variant = avatars.ensure_variant(path, size, ext)
+        except HTTPException:
+            raise
         except Exception:
+            app.logger.exception("avatar variant failed")
             abort(404)
+        resp = send_stored(variant, max_age=31536000)
+        if resp.status_code == 200:
+            # The token changes with every upload, so a URL never changes content
+            resp.cache_control.immutable = True
+        return resp
 
     # ----------------- DOCUMENTS (USER & ADMIN) -----------------
 
@@ -1153,18 +1358,13 @@ def create_app():
         doc = Document.query.get_or_404(doc_id)
         if doc.user_id != current_user.id and not getattr(current_user, "is_admin", False):
             abort(403)
-        base = os.path.realpath(app.config.get("UPLOAD_DIR", "./uploads"))
-        path = os.path.realpath(doc.stored_path or "")
-        if not path.startswith(base + os.sep) and path != base:
-            abort(403)
-        try:
-            return send_file(
-                path,
-                as_attachment=True,
-                download_name=doc.filename or os.path.basename(path),
-            )
-        except Exception:
-            abort(404)
+        return send_stored(
+            doc.stored_path,
+            as_attachment=True,
+            download_name=doc.filename or os.path.basename(doc.stored_path or ""),
+            mimetype=doc.mime or None,
+            etag=doc.sha256,
+        )
 
     @app.route("/documents/<int:doc_id>/view")
     @login_required
@@ -1172,19 +1372,32 @@ def create_app():
         doc = Document.query.get_or_404(doc_id)
         if doc.user_id != current_user.id and not getattr(current_user, "is_admin", False):
             abort(403)
-        base = os.path.realpath(app.config.get("UPLOAD_DIR", "./uploads"))
-        path = os.path.realpath(doc.stored_path or "")
-        if not path.startswith(base + os.sep) and path != base:
+        return send_stored(
+            doc.stored_path,
+            download_name=doc.filename or os.path.basename(doc.stored_path or ""),
+            mimetype=doc.mime or None,
+            etag=doc.sha256,
+        )
+
+    @app.route("/documents/<int:doc_id>/thumb")
+    @login_required
+    def document_thumb(doc_id):
+        doc = Document.query.get_or_404(doc_id)
+        if doc.user_id != current_user.id and not getattr(current_user, "is_admin", False):
             abort(403)
+        if not doc.stored_path:
+            abort(404)
         try:
-            return send_file(
-                path,
-                as_attachment=False,
-                download_name=doc.filename or os.path.basename(path),
-                mimetype=doc.mime or None,
-            )
+            thumb = thumbnails.ensure_thumbnail(doc.stored_path, doc.mime)
+        except HTTPException:
+            raise
         except Exception:
-            abort(404)
+            app.logger.exception("document thumbnail failed")
+            thumb = None
+        if thumb is None:
+            return redirect(url_for("static", filename="images/doc-placeholder.svg"))
+        # A document's content never changes, neither does its preview
+        return send_stored(thumb, mimetype="image/jpeg", max_age=86400)
 
     @app.route("/documents", methods=["GET"])
     @login_required
@@ -1196,7 +1409,13 @@ def create_app():
             ).all()
         except Exception:
             docs = []
-        return render_template("profile/documents.html", form=form, docs=docs)
+        return render_template(
+            "profile/documents.html",
+            form=form,
+            docs=docs,
+            direct_upload=storage.get_storage().direct_uploads,
+            quota_bytes=usage.quota_bytes(),
+        )
 
     @app.route("/documents/upload", methods=["POST"])
     @login_required
@@ -1207,57 +1426,198 @@ def create_app():
             return redirect(url_for("documents"))
         f = form.file.data
         filename = f.filename or ""
-        ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-        allowed = set(
-            app.config.get(
-                "ALLOWED_UPLOAD_EXTENSIONS",
-                {"pdf", "jpg", "jpeg", "png"},
-            )
-        )
-        if ext not in allowed:
-            flash(_("Недопустимый тип файла"), "error")
-            return redirect(url_for("documents"))
-        max_bytes = int(app.config.get("MAX_UPLOAD_MB", 15)) * 1024 * 1024
-        content_len = request.content_length or 0
-        if content_len and content_len > max_bytes + 8192:
-            flash(_("Файл слишком большой"), "error")
-            return redirect(url_for("documents"))
-        import uuid
-
-        user_dir = os.path.join(
-            app.config.get("UPLOAD_DIR", "./uploads"), str(current_user.id)
-        )
-        os.makedirs(user_dir, exist_ok=True)
-        stored_name = f"{uuid.uuid4().hex}.{ext}"
-        stored_path = os.path.join(user_dir, stored_name)
         try:
-            f.save(stored_path)
-            size_bytes = os.path.getsize(stored_path)
-            if size_bytes > max_bytes:
-                os.remove(stored_path)
-                flash(_("Файл слишком большой"), "error")
+            info = save_upload(f, blobstore.staging_dir())
+            if not usage.quota_allows(current_user, info.size):
+                os.remove(info.path)
+                flash(_("Превышен лимит хранилища"), "error")
                 return redirect(url_for("documents"))
+            if info.ext in imagenorm.IMAGE_EXTS:
+                try:
+                    imagenorm.check(info.path)
+                except UploadRejected:
+                    os.remove(info.path)
+                    raise
+            blob = blobstore.ingest(info.path, info.sha256, info.ext, info.size, info.mime)
+        except imagenorm.ImageTooLarge:
+            flash(_("Изображение слишком большое"), "error")
+            return redirect(url_for("documents"))
+        except UploadRejected:
+            flash(_("Недопустимый тип файла"), "error")
+            return redirect(url_for("documents"))
         except Exception:
-            try:
-                if os.path.exists(stored_path):
-                    os.remove(stored_path)
-            except Exception:
-                pass
+            db.session.rollback()
+            app.logger.exception("document upload failed")
             flash(_("Ошибка сохранения файла"), "error")
             return redirect(url_for("documents"))
+        stored_path = blob.stored_path
         doc = Document(
             user_id=current_user.id,
             filename=filename,
             stored_path=stored_path,
-            mime=getattr(f, "mimetype", None),
-            size_bytes=size_bytes,
+            mime=info.mime,
+            size_bytes=info.size,
+            sha256=info.sha256,
             note=(form.note.data or "").strip() or None,
         )
         db.session.add(doc)
+        db.session.flush()
+        doc_id = doc.id
         db.session.commit()
+        if info.ext in imagenorm.IMAGE_EXTS:
+            imagenorm.schedule_document(doc_id, info.ext)
+        else:
+            thumbnails.schedule_thumbnail(stored_path, info.mime)
         flash(_("Документ загружен"), "success")
         return redirect(url_for("documents"))
 
+    # Direct browser -> bucket uploads (S3 driver only). The browser asks for a
+    # presigned PUT (or multipart part URLs), uploads, then calls complete so we
+    # can validate the object and register the document.
+
+    def _direct_key_ok(key):
+        return isinstance(key, str) and re.fullmatch(rf"incoming/{current_user.id}/[0-9a-f]{{32}}", key)
+
+    def _process_document(doc, ext):
+        # after the document row exists: normalise images, preview the rest
+        if ext in imagenorm.IMAGE_EXTS:
+            imagenorm.schedule_document(doc.id, ext)
+        else:
+            thumbnails.schedule_thumbnail(doc.stored_path, doc.mime)
+
+    @app.route("/documents/direct", methods=["POST"])
+    @login_required
+    def documents_direct_start():
+        store = storage.get_storage()
+        if not store.direct_uploads:
+            abort(404)
+        data = request.get_json(silent=True) or {}
+        ext = allowed_ext(data.get("filename") or "")
+        try:
+            size = int(data.get("size") or 0)
+        except (TypeError, ValueError):
+            size = 0
+        sha = str(data.get("sha256") or "").lower()
+        if ext is None:
+            return jsonify({"error": _("Недопустимый тип файла")}), 400
+        if size <= 0 or size > max_upload_bytes():
+            return jsonify({"error": _("Файл слишком большой")}), 413
+        if not usage.quota_allows(current_user, size):
+            return jsonify({"error": _("Превышен лимит хранилища")}), 413
+        key = f"incoming/{current_user.id}/{uuid.uuid4().hex}"
+        mime = mime_for_ext(ext)
+        threshold = int(app.config.get("S3_MULTIPART_THRESHOLD_MB", 8)) * 1024 * 1024
+        if size > threshold:
+            part_size = int(app.config.get("S3_PART_SIZE_MB", 5)) * 1024 * 1024
+            parts = data.get("parts_sha256")
+            parts = [str(v or "").lower() for v in parts] if isinstance(parts, list) else []
+            if len(parts) != -(-size // part_size) or not all(re.fullmatch(r"[0-9a-f]{64}", v) for v in parts):
+                return jsonify({"error": "parts_sha256 required"}), 400
+            plan = store.start_multipart(key, mime, part_size, parts)
+        else:
+            if not re.fullmatch(r"[0-9a-f]{64}", sha):
+                return jsonify({"error": "sha256 required"}), 400
+            plan = store.presign_put(key, mime, size, sha)
+        return jsonify({"key": key, **plan})
+
+    @app.route("/documents/direct/complete", methods=["POST"])
+    @login_required
+    def documents_direct_complete():
+        store = storage.get_storage()
+        if not store.direct_uploads:
+            abort(404)
+        data = request.get_json(silent=True) or {}
+        key = data.get("key")
+        if not _direct_key_ok(key):
+            abort(400)
+        upload_id = data.get("upload_id")
+        parts = data.get("parts") or []
+        try:
+            if upload_id:
+                store.complete_multipart(key, str(upload_id), parts)
+            head = store.head(key)
+        except Exception:
+            app.logger.exception("direct upload completion failed")
+            return jsonify({"error": _("Ошибка сохранения файла")}), 400
+        if head is None:
+            abort(404)
+        size = int(head["ContentLength"])
+        detected = sniff(store.read_head(key, 16)) if size else None
+        filename = (data.get("filename") or "").strip()[:255]
+        if size <= 0 or size > max_upload_bytes() or detected is None or detected[0] != allowed_ext(filename):
+            store.delete(key)
+            return jsonify({"error": _("Недопустимый тип файла")}), 400
+        if not usage.quota_allows(current_user, size):
+            store.delete(key)
+            return jsonify({"error": _("Превышен лимит хранилища")}), 413
+        ext, mime = detected
+        if ext in imagenorm.IMAGE_EXTS:
+            try:
+                imagenorm.check_bytes(store.read_head(key, 256 * 1024))
+            except UploadRejected as exc:
+                store.delete(key)
+                too_large = isinstance(exc, imagenorm.ImageTooLarge)
+                return jsonify({"error": _("Изображение слишком большое") if too_large else _("Недопустимый тип файла")}), 400
+        checksum = head.get("ChecksumSHA256") or ""
+        trusted = app.config.get("S3_TRUST_CHECKSUMS", True)
+        if upload_id and checksum and trusted:
+            # the bucket checked every part; the object must be exactly the parts it checked
+            try:
+                intact = checksum.split("-")[0] == storage.composite_sha256([p["checksum"] for p in parts])
+            except (KeyError, TypeError, ValueError):
+                intact = False
+            if not intact:
+                store.delete(key)
+                return jsonify({"error": _("Ошибка сохранения файла")}), 400
+        sha = None
+        if not upload_id and checksum and "-" not in checksum and trusted:
+            # single PUT: the bucket already verified the body against the signed hash
+            sha = base64.b64decode(checksum).hex()
+        if sha is not None:
+            try:
+                stored_path = blobstore.ingest_stored(key, sha, ext, size, mime).stored_path
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("direct upload ingest failed")
+                return jsonify({"error": _("Ошибка сохранения файла")}), 500
+        else:
+            # part checksums don't give the file's hash: the document points at
+            # the uploaded object until a background job has hashed and ingested it
+            stored_path = store.ref(key)
+        doc = Document(
+            user_id=current_user.id,
+            filename=filename or os.path.basename(stored_path),
+            stored_path=stored_path,
+            mime=mime,
+            size_bytes=size,
+            sha256=sha,
+            note=(str(data.get("note") or "").strip()[:500]) or None,
+        )
+        db.session.add(doc)
+        db.session.commit()
+        if sha is None:
+            blobstore.schedule_ingest(doc.id, ext, then=lambda d: _process_document(d, ext))
+        else:
+            _process_document(doc, ext)
+        flash(_("Документ загружен"), "success")
+        return jsonify({"ok": True, "id": doc.id})
+
+    @app.route("/documents/direct/abort", methods=["POST"])
+    @login_required
+    def documents_direct_abort():
+        store = storage.get_storage()
+        if not store.direct_uploads:
+            abort(404)
+        data = request.get_json(silent=True) or {}
+        key = data.get("key")
+        if not _direct_key_ok(key):
+            abort(400)
+        if data.get("upload_id"):
+            store.abort_multipart(key, str(data["upload_id"]))
+        else:
+            store.delete(key)
+        return jsonify({"ok": True})
+
     @app.route("/admin/documents")
     @admin_required
     def admin_documents():
@@ -1281,18 +1641,94 @@ def create_app():
     @admin_required
     def admin_document_download(doc_id):
         doc = Document.query.get_or_404(doc_id)
-        base = os.path.realpath(app.config.get("UPLOAD_DIR", "./uploads"))
-        path = os.path.realpath(doc.stored_path or "")
-        if not path.startswith(base + os.sep) and path != base:
-            abort(403)
-        try:
-            return send_file(
-                path,
-                as_attachment=True,
-                download_name=doc.filename or os.path.basename(path),
-            )
-        except Exception:
+        return send_stored(
+            doc.stored_path,
+            as_attachment=True,
+            download_name=doc.filename or os.path.basename(doc.stored_path or ""),
+            mimetype=doc.mime or None,
+            etag=doc.sha256,
+        )
+
+    # ----------------- OPS -----------------
+
+    @app.route("/metrics")
+    def metrics_export():
+        token = app.config.get("METRICS_TOKEN")
+        auth = request.headers.get("Authorization") or ""
+        token_ok = bool(token) and secrets.compare_digest(auth, f"Bearer {token}")
+        if not token_ok:
+            if not current_user.is_authenticated:
+                abort(401)
+            if not getattr(current_user, "is_admin", False):
+                abort(403)
+        return (
+            metrics.render_prometheus(),
+            200,
+            {"Content-Type": "text/plain; version=0.0.4; charset=utf-8", "Cache-Control": "no-store"},
+        )
+
+    @app.route("/readyz")
+    def readyz():
+        # Fly's health check: no traffic until the warmup has finished
+        state = warmup.status()
+        resp = jsonify(status=state["status"], warmup=state["report"])
+        resp.status_code = 200 if state["ready"] else 503
+        resp.cache_control.no_store = True
+        return resp
+
+    @app.route("/admin/profiles")
+    @superadmin_required
+    def admin_profiles():
+        directory = app.config.get("PROFILE_DIR", "./profiles")
+        return render_template(
+            "admin/profiles.html",
+            captures=profiler.list_profiles(directory),
+            enabled=app.config.get("PROFILING_ENABLED", True),
+        )
+
+    @app.route("/admin/profiles/<name>")
+    @superadmin_required
+    def admin_profile_download(name):
+        path = profiler.profile_path(app.config.get("PROFILE_DIR", "./profiles"), name)
+        if not path:
             abort(404)
+        return send_file(
+            os.path.realpath(path), mimetype="application/json", as_attachment=True, download_name=name
+        )
+
+    @app.route("/admin/memory", methods=["GET", "POST"])
+    @superadmin_required
+    def admin_memory():
+        rep = None
+        dumped = None
+        if request.method == "POST":
+            action = request.form.get("action")
+            if action == "start":
+                memdiag.start()
+                flash(_("tracemalloc запущен."), "success")
+            elif action == "stop":
+                memdiag.stop()
+                flash(_("tracemalloc остановлен."), "success")
+            elif action in ("snapshot", "census", "dump"):
+                rep = memdiag.report(census=(action != "snapshot"))
+                if action == "dump":
+                    try:
+                        dumped = memdiag.dump(app.config.get("MEMDIAG_DIR", "./memdiag"), rep)
+                    except OSError:
+                        flash(_("Ошибка сохранения файла"), "error")
+        workers = sorted(
+            (dict(k).get("pid"), v) for k, v in metrics.live_gauge("process_resident_memory_bytes").items()
+        )
+        return render_template(
+            "admin/memory.html",
+            report=rep or memdiag.last_report(),
+            dumped=dumped,
+            pid=os.getpid(),
+            tracing=memdiag.tracing(),
+            rss=memdiag.rss_bytes(),
+            meminfo=memdiag.meminfo(),
+            workers=workers,
+        )
 
     @app.route("/test-mail")
     def test_mail():
@@ -1301,7 +1737,7 @@ def create_app():
         if not mail_to:
             return "500 MAIL_TO is not configured", 500
         r = send_email(mail_to, "Test email", "Mailgun works!")
-        print(r.status_code, r.text)
+        app.logger.info("test-mail: sent", extra={"status": r.status_code})
         return f"{r.status_code} {r.text}", (200 if r.status_code == 200 else 500)
 
     # ----------------- ERRORS & CLI -----------------
@@ -1310,6 +1746,67 @@ def create_app():
     def forbidden(_e):
         return render_template("errors/403.html"), 403
 
+    @app.errorhandler(413)
+    def too_large(_e):
+        # Upload forms get the usual flash + redirect; anything else a bare 413
+        targets = {"documents_upload": "documents", "profile_edit": "profile_edit"}
+        if request.endpoint in targets:
+            flash(_("Файл слишком большой"), "error")
+            return redirect(url_for(targets[request.endpoint]))
+        return "Request Entity Too Large", 413
+
+    @app.cli.command("dedupe-uploads")
+    @click.option("--dry-run", is_flag=True, help="Only report what would change.")
+    def dedupe_uploads_cmd(dry_run):
+        """Move existing document files into the content-addressed blob store."""
+        with app.app_context():
+            stats = blobstore.dedupe_existing(dry_run=dry_run)
+        prefix = "[dry-run] " if dry_run else ""
+        print(
+            f"{prefix}documents={stats['documents']} migrated={stats['migrated']} "
+            f"duplicates={stats['duplicates']} missing={stats['missing']} "
+            f"freed={stats['bytes_freed'] // 1024} KB"
+        )
+
+    @app.cli.command("gc-uploads")
+    @click.option("--dry-run", is_flag=True, help="Only report what would be deleted.")
+    @click.option("--grace-hours", type=float, default=None, help="Keep unreferenced files younger than this (default UPLOAD_GC_GRACE_HOURS).")
+    def gc_uploads_cmd(dry_run, grace_hours):
+        """Delete files no user/document/blob references and reconcile usage counters."""
+        with app.app_context():
+            stats = uploadgc.collect(grace_hours=grace_hours, dry_run=dry_run)
+        prefix = "[dry-run] " if dry_run else ""
+        print(
+            f"{prefix}scanned={stats['scanned']} kept={stats['kept']} young={stats['young']} "
+            f"orphans={stats['orphans']} freed={stats['bytes_freed'] // 1024} KB "
+            f"blobs_fixed={stats['blobs_fixed']} blobs_dropped={stats['blobs_dropped']} "
+            f"usage_fixed={stats.get('usage_fixed', 0)}"
+        )
+
+    @app.cli.command("backfill-thumbnails")
+    @click.option("--force", is_flag=True, help="Re-render previews that already exist.")
+    def backfill_thumbnails_cmd(force):
+        """Render missing document previews."""
+        with app.app_context():
+            docs = Document.query.order_by(Document.id.asc()).all()
+            stats = thumbnails.backfill(docs, force=force)
+        print(
+            f"documents={stats['documents']} rendered={stats['rendered']} existing={stats['existing']} "
+            f"skipped={stats['skipped']} failed={stats['failed']}"
+        )
+
+    @app.cli.command("build-assets")
+    def build_assets_cmd():
+        """Build CSS/JS bundles and their .br/.gz siblings, then write static/assets-manifest.json."""
+        sizes = bundles.build_all(app.static_folder)
+        packed = compress.precompress(app.static_folder)
+        manifest = assets.build(app.static_folder)
+        print(
+            f"bundles={len(sizes)} bundle_bytes={sum(sizes.values())} "
+            f"precompressed={packed['written']} precompressed_fresh={packed['fresh']} files={len(manifest)} "
+            f"manifest={os.path.join(app.static_folder, assets.MANIFEST_NAME)}"
+        )
+
     @app.cli.command("create-admin")
     def create_admin_cmd():
         """Create superuser admin@site.local with password from ADMIN_PASSWORD or generated."""
@@ -1335,6 +1832,16 @@ def create_app():
             db.session.commit()
             print(f"Admin email: {email}\nAdmin password: {pwd}")
 
+    @app.cli.command("warmup")
+    def warmup_cmd():
+        """Run the boot-time warmup in the foreground and print how long each step took."""
+        report = warmup.run(app)
+        steps = " ".join(f"{name}={s['seconds']}s/{s['count']}" for name, s in report["steps"].items())
+        print(f"warmup {report['seconds']}s: {steps}")
+
+    # last, so every route exists when the pages are rendered
+    warmup.start(app)
+
     return app
 
 
@@ -1706,7 +2213,11 @@ def seed_if_empty():
         db.session.commit()
 
 
-app = create_app()
+# Under `python app.py` the spawned image pools (utils/imagenorm, utils/imageproxy)
+# re-import this script as __mp_main__; they only need the pool functions, not an
+# app with its DB setup, seeding and warmup thread
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     # Core Flask/DB
@@ -40,6 +41,173 @@ class Config:
     UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "./uploads")
     MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", "15"))
     ALLOWED_UPLOAD_EXTENSIONS = {"pdf", "jpg", "jpeg", "png"}
+    # Who streams protected files: "app" (in-process, Range/ETag/304),
+    # "x-accel" (nginx internal location at FILE_ACCEL_PREFIX) or "x-sendfile"
+    FILE_DELIVERY = os.environ.get("FILE_DELIVERY", "app")
+    FILE_ACCEL_PREFIX = os.environ.get("FILE_ACCEL_PREFIX", "/_protected/")
+    # Per-user upload quota for documents (0 = unlimited; admins are exempt)
+    USER_QUOTA_MB = int(os.environ.get("USER_QUOTA_MB", "200"))
+    # flask gc-uploads keeps unreferenced files younger than this
+    UPLOAD_GC_GRACE_HOURS = float(os.environ.get("UPLOAD_GC_GRACE_HOURS", "24"))
+    # Storage driver: "local" (UPLOAD_DIR) or "s3" (any S3-compatible endpoint, needs boto3)
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+    S3_BUCKET = os.environ.get("S3_BUCKET")
+    S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")  # e.g. MinIO: http://127.0.0.1:9000
+    S3_REGION = os.environ.get("S3_REGION")
+    S3_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID")
+    S3_SECRET_ACCESS_KEY = os.environ.get("S3_SECRET_ACCESS_KEY")
+    S3_PREFIX = os.environ.get("S3_PREFIX", "")
+    S3_ADDRESSING_STYLE = os.environ.get("S3_ADDRESSING_STYLE", "auto")  # "path" for MinIO
+    S3_PRESIGN_EXPIRES = int(os.environ.get("S3_PRESIGN_EXPIRES", "300"))
+    # The bucket rejects single PUTs whose body doesn't match x-amz-checksum-sha256
+    # (AWS, recent MinIO); set to 0 for stand-ins that don't, and the hash is computed
+    # in the background instead, as for multipart uploads
+    S3_TRUST_CHECKSUMS = os.environ.get("S3_TRUST_CHECKSUMS", "1") == "1"
+    # Direct uploads above this size go multipart (parts >= 5 MiB, S3 minimum)
+    S3_MULTIPART_THRESHOLD_MB = int(os.environ.get("S3_MULTIPART_THRESHOLD_MB", "8"))
+    S3_PART_SIZE_MB = int(os.environ.get("S3_PART_SIZE_MB", "5"))
+    # Background threads rendering avatar thumbnails
+    AVATAR_WORKERS = int(os.environ.get("AVATAR_WORKERS", "2"))
+    # Document previews (longest edge in px) and the threads rendering them
+    DOC_THUMB_PX = int(os.environ.get("DOC_THUMB_PX", "240"))
+    DOC_THUMB_WORKERS = int(os.environ.get("DOC_THUMB_WORKERS", "1"))
+    # Uploaded PNG/JPEG: refuse above this many pixels (read from the header), downsample
+    # to this longest edge, strip EXIF/XMP; the re-encode runs in this many processes
+    IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", "40000000"))
+    IMAGE_MAX_EDGE = int(os.environ.get("IMAGE_MAX_EDGE", "2560"))
+    IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "85"))
+    IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+    # Resized copies of static images for news pages (/img/<width>/<fmt>/...): only these
+    # widths and formats, rendered in this many processes, kept in an LRU directory of this size
+    IMAGE_PROXY_WIDTHS = tuple(int(w) for w in os.environ.get("IMAGE_PROXY_WIDTHS", "320,640,960,1280").split(","))
+    IMAGE_PROXY_FORMATS = tuple(os.environ.get("IMAGE_PROXY_FORMATS", "webp,jpg").split(","))
+    IMAGE_PROXY_WORKERS = int(os.environ.get("IMAGE_PROXY_WORKERS", "2"))
+    IMAGE_PROXY_CACHE_DIR = os.environ.get("IMAGE_PROXY_CACHE_DIR", "./cache/images")
+    IMAGE_PROXY_CACHE_MB = int(os.environ.get("IMAGE_PROXY_CACHE_MB", "200"))
+    IMAGE_PROXY_MAX_AGE = int(os.environ.get("IMAGE_PROXY_MAX_AGE", "86400"))
+    # Refuse bodies by Content-Length before reading them (file limit + room for form fields)
+    MAX_CONTENT_LENGTH = MAX_UPLOAD_MB * 1024 * 1024 + 64 * 1024
+
+    # url_for('static') emits content-hashed URLs served as immutable (0 = plain URLs)
+    STATIC_HASHED_URLS = os.environ.get("STATIC_HASHED_URLS", "1") != "0"
+
+    # Cache lifetime of anonymous, cookie-free public pages (/ru/..., /en/..., /et/...):
+    # browsers / shared caches (CDN)
+    PUBLIC_PAGE_MAX_AGE = int(os.environ.get("PUBLIC_PAGE_MAX_AGE", "60"))
+    PUBLIC_PAGE_S_MAXAGE = int(os.environ.get("PUBLIC_PAGE_S_MAXAGE", "300"))
+
+    # Rendered layout fragments ({% cache %} in base.html) kept per process (0 = off)
+    FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", "512"))
+
+    # Open the DB pool, load catalogs and render public pages before /readyz passes (0 = off)
+    WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") != "0"
+
+    # /sw.js: precache bundles, schedule stale-while-revalidate (0 = serve a worker that unregisters itself)
+    SERVICE_WORKER_ENABLED = os.environ.get("SERVICE_WORKER_ENABLED", "1") != "0"
+
+    # Brotli/gzip for HTML/JSON/SVG responses (0 = off, e.g. behind a compressing proxy)
+    COMPRESS_ENABLED = os.environ.get("COMPRESS_ENABLED", "1") != "0"
+    # Bodies smaller than this are sent as is
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "500"))
+    # Per-request levels: cheap enough for every response; build-time static uses the maximum
+    COMPRESS_BR_LEVEL = int(os.environ.get("COMPRESS_BR_LEVEL", "5"))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+
+    # Logging (JSON lines on stderr via a background QueueListener)
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    # Fraction of DEBUG records to keep (1.0 = all); INFO and above are never sampled
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+    # Metrics (/metrics, Prometheus text format)
+    # Each worker dumps its counters here; the endpoint merges all dumps
+    METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "wiru-metrics"))
+    METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+    # Optional bearer token for scrapers that cannot log in as admin
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # SQL query budget per request (warning in logs when exceeded)
+    SQL_QUERY_BUDGET = int(os.environ.get("SQL_QUERY_BUDGET", "10"))
+    # Per-endpoint budgets for a signed-in visitor (so including the flask-login
+    # user lookup). The only copy: tests/ read them through query_budget(), so
+    # keep each one at the route's actual count
+    SQL_QUERY_BUDGETS = {
+        "home": 3,
+        "news_list": 2,
+        "news_detail": 2,
+        "schedule_page": 2,
+        "trainers_page": 1,
+        "contact": 1,
+        "privacy": 1,
+        "terms": 1,
+        "cookies": 1,
+        "safety": 1,
+        "youth": 1,
+        "marketing": 1,
+        "robots": 1,
+        "service_worker": 1,
+        "favicon": 1,
+        "resized_image": 1,
+        "csrf_token_json": 1,
+        "send_message": 1,
+        "signup": 2,
+        "test_mail": 1,
+        "login": 2,
+        "register": 3,
+        "logout": 1,
+        "admin_login": 2,
+        "admin_dashboard": 2,
+        "admin_news_list": 2,
+        "admin_add_news": 2,
+        "admin_edit_news": 3,
+        "admin_delete_news": 3,
+        "admin_edit_schedule": 2,
+        "admin_schedule_data": 2,
+        "admin_coaches_list": 1,
+        "admin_schedule_create": 4,
+        "admin_schedule_update": 3,
+        "admin_schedule_delete": 3,
+        "admin_schedule_copy_day": 4,
+        "admin_users": 2,
+        "admin_user_detail": 4,
+        "admin_user_documents_zip": 4,
+        "admin_make_admin": 4,
+        "admin_remove_admin": 4,
+        "profile": 1,
+        "profile_overview": 2,
+        "profile_edit": 3,
+        "profile_avatar": 1,
+        "avatar_variant": 2,
+        "documents": 2,
+        "documents_upload": 7,
+        "documents_direct_start": 1,
+        "documents_direct_complete": 7,
+        "documents_direct_abort": 1,
+        "document_view": 2,
+        "document_download": 2,
+        "document_thumb": 2,
+        "admin_documents": 2,
+        "admin_document_download": 2,
+        "metrics_export": 1,
+        "readyz": 1,
+        "admin_profiles": 1,
+        "admin_profile_download": 1,
+        "admin_memory": 1,
+    }
+    # Same statement fingerprint this many times in one request = likely N+1
+    SQL_REPEAT_THRESHOLD = int(os.environ.get("SQL_REPEAT_THRESHOLD", "3"))
+    # Emit a Server-Timing header with DB time and query count
+    SQL_SERVER_TIMING = os.environ.get("SQL_SERVER_TIMING", "0") == "1"
+
+    # On-demand request profiling (admins only, X-Profile: 1 or ?_profile=1)
+    PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "1") == "1"
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles")
+    PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+
+    # Memory diagnostics (/admin/memory)
+    MEMDIAG_DIR = os.environ.get("MEMDIAG_DIR", "./memdiag")
+    # Log a warning when MemAvailable drops below this many MB
+    MEMORY_LOW_MB = int(os.environ.get("MEMORY_LOW_MB", "150"))
 
     # Mail settings
     MAIL_FROM = os.environ.get("MAIL_FROM")
@@ -1,6 +1,12 @@
+import logging
 import os
+import time
 import requests
 
+from utils import metrics
+
+log = logging.getLogger(__name__)
+
 MAILGUN_API_KEY = os.getenv("MAILGUN_API_KEY")
 MAILGUN_DOMAIN = os.getenv("MAILGUN_DOMAIN")  # wirucombatacademy.ee
 MAILGUN_BASE_URL = os.getenv("MAILGUN_BASE_URL", "https://api.eu.mailgun.net/v3")
@@ -16,6 +22,8 @@ def send_email(to: str, subject: str, text: str) -> requests.Response:
 
     url = f"{MAILGUN_BASE_URL}/{MAILGUN_DOMAIN}/messages"
 
+    start = time.perf_counter()
+    status = "error"
     try:
         response = requests.post(
             url,
@@ -28,11 +36,20 @@ def send_email(to: str, subject: str, text: str) -> requests.Response:
             },
             timeout=15,
         )
-        print("MAILGUN STATUS:", response.status_code)
-        print("MAILGUN RESPONSE:", response.text)
+        status = response.status_code
+        if response.status_code == 200:
+            log.debug("mailgun: accepted", extra={"status": response.status_code})
+        else:
+            log.warning(
+                "mailgun: rejected",
+                extra={"status": response.status_code, "body": (response.text or "")[:500]},
+            )
         return response
     except Exception as e:
+        log.warning("mailgun: request failed", extra={"error": str(e)})
         r = requests.Response()
         r.status_code = 500
         r._content = str(e).encode()
         return r
+    finally:
+        metrics.observe("mailgun_request_seconds", time.perf_counter() - start, {"status": status})
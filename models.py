@@ -62,6 +62,10 @@ class User(UserMixin, db.Model):
     # Avatar image path (stored file path within UPLOAD_DIR)
     avatar_path = db.Column(db.String(512))
 
+    # Upload usage index, kept in step by Document insert/delete events (utils/usage.py)
+    storage_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    storage_files = db.Column(db.Integer, nullable=False, default=0)
+
     # Relationships (billing removed)
     documents = db.relationship('Document', backref='user', lazy='dynamic', cascade="all, delete-orphan")
 
@@ -95,16 +99,35 @@ class User(UserMixin, db.Model):
 
 
 
+class Blob(db.Model):
+    # Content-addressed file under UPLOAD_DIR/blobs, shared by identical uploads
+    sha256 = db.Column(db.String(64), primary_key=True)
+    stored_path = db.Column(db.String(512), nullable=False)
+    size_bytes = db.Column(db.Integer)
+    mime = db.Column(db.String(120))
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
 class Document(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True, nullable=False)
     filename = db.Column(db.String(255), nullable=False)
+    # For blob-backed documents this equals blob.stored_path
     stored_path = db.Column(db.String(512), nullable=False)
     mime = db.Column(db.String(120))
     size_bytes = db.Column(db.Integer)
+    sha256 = db.Column(db.String(64), index=True)
     note = db.Column(db.String(500))
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    blob = db.relationship(
+        'Blob',
+        primaryjoin='foreign(Document.sha256) == Blob.sha256',
+        viewonly=True,
+        lazy='select',
+    )
+
 
 class Signup(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,632 @@
+// Admin schedule editor. Translated strings come from the JSON block
+// #schedule-editor-i18n rendered by admin/edit_schedule.html.
+const I18N = JSON.parse((document.getElementById('schedule-editor-i18n') || {}).textContent || '{}');
+function t(key){ return Object.prototype.hasOwnProperty.call(I18N, key) ? I18N[key] : key; }
+
+// CSRF Token
+function getCookie(name) {
+  const m = document.cookie.match(new RegExp('(^| )' + name + '=([^;]+)'));
+  return m ? decodeURIComponent(m[2]) : '';
+}
+
+const CSRF_TOKEN = (() => {
+  const meta = document.querySelector('meta[name="csrf-token"]');
+  if (meta?.content) return meta.content;
+  const input = document.querySelector('input[name="csrf_token"]');
+  if (input?.value) return input.value;
+  return getCookie('csrf_token') || '';
+})();
+
+// Constants
+const DAY_NAMES = [
+  t('Понедельник'),
+  t('Вторник'),
+  t('Среда'),
+  t('Четверг'),
+  t('Пятница'),
+  t('Суббота'),
+  t('Воскресенье')
+];
+
+const DAY_NAMES_SHORT = [t('Пн'), t('Вт'), t('Ср'), t('Чт'), t('Пт'), t('Сб'), t('Вс')];
+
+// Fixed groups mapping used by add/edit forms
+const GROUPS = {
+  mma_10_14: { discipline: 'mma', age: '10–14', label: `MMA 10–14 ${t('лет')}` },
+  mma_15_plus: { discipline: 'mma', age: '15+', label: `MMA 15+ ${t('лет')}` },
+  boxing_5_7: { discipline: 'boxing', age: '5–7', label: `${t('Бокс')} 5–7 ${t('лет')}` },
+  boxing_8_11: { discipline: 'boxing', age: '8–11', label: `${t('Бокс')} 8–11 ${t('лет')}` },
+  boxing_12_plus: { discipline: 'boxing', age: '12+', label: `${t('Бокс')} 12+ ${t('лет')}` },
+  sparring: { discipline: 'sparring', age: '', label: t('Спарринг') },
+  general_circuit: { discipline: 'other', age: '', label: t('Общеукрепляющие тренировки') },
+};
+
+function getGroupKey(discipline, age) {
+  if (!discipline) return '';
+  const cleanedAge = (age || '').replace(/[aлy][.,o]*/gi, '').trim();
+  for (const [key, conf] of Object.entries(GROUPS)) {
+    if (conf.discipline === discipline && conf.age === cleanedAge) {
+      return key;
+    }
+  }
+  return '';
+}
+
+// Localized age suffix
+const AGE_SUFFIX = t('age_suffix');
+const AGE_PREFIX_TO = t('до');
+
+// Debug: log the values
+console.log('AGE_SUFFIX:', AGE_SUFFIX);
+console.log('AGE_PREFIX_TO:', AGE_PREFIX_TO);
+
+// State
+let scheduleData = [];
+let activeDay = (() => {
+  const js = new Date().getDay();
+  return js === 0 ? 6 : js - 1;
+})();
+const todayDay = activeDay;
+
+// Coaches data
+let COACHES = [];
+async function loadCoaches() {
+  try {
+    const list = await api('/admin/coaches');
+    COACHES = Array.isArray(list) ? list.filter(Boolean) : [];
+  } catch (e) {
+    COACHES = [];
+  }
+  populateAddCoachSelect();
+}
+
+function populateCoachOptions(selectEl, selected) {
+  if (!selectEl) return;
+  const current = selected || '';
+  // Reset options
+  selectEl.innerHTML = '';
+  const empty = document.createElement('option');
+  empty.value = '';
+  empty.textContent = t('Без тренера');
+  selectEl.appendChild(empty);
+
+  const names = [...COACHES];
+  if (current && !names.includes(current)) {
+    names.unshift(current);
+  }
+  names.forEach((n) => {
+    const opt = document.createElement('option');
+    opt.value = n;
+    opt.textContent = n;
+    if (n === current) opt.selected = true;
+    selectEl.appendChild(opt);
+  });
+}
+
+function populateAddCoachSelect() {
+  const el = document.getElementById('add-coach');
+  populateCoachOptions(el, '');
+}
+
+// API Helper
+async function api(path, opts = {}) {
+  const headers = { 'Content-Type': 'application/json', ...opts.headers };
+  if (CSRF_TOKEN) headers['X-CSRFToken'] = CSRF_TOKEN;
+  
+  const resp = await fetch(path, { ...opts, headers });
+  const data = await resp.json().catch(() => ({}));
+  
+  if (!resp.ok) {
+    throw new Error(data.error || `HTTP ${resp.status}`);
+  }
+  
+  return data;
+}
+
+// Toast Notifications
+function showToast(message, type = 'success') {
+  const toast = document.createElement('div');
+  toast.className = `toast ${type}`;
+  toast.innerHTML = `
+    <span class="toast-icon">${type === 'success' ? '✓' : '✕'}</span>
+    <span class="toast-message">${message}</span>
+  `;
+  document.body.appendChild(toast);
+  
+  setTimeout(() => {
+    toast.style.animation = 'slideIn 0.2s ease reverse';
+    setTimeout(() => toast.remove(), 200);
+  }, 3000);
+}
+
+// Initialize
+async function init() {
+  await loadCoaches();
+  renderDaysTabs();
+  setupEventListeners();
+  initDaysSelection();
+  await loadSchedule();
+}
+
+// Render Days Tabs
+function renderDaysTabs() {
+  const container = document.getElementById('days-tabs');
+  container.innerHTML = '';
+  
+  DAY_NAMES.forEach((name, index) => {
+    const tab = document.createElement('button');
+    tab.className = 'day-tab';
+    tab.dataset.day = index;
+    
+    if (index === activeDay) tab.classList.add('active');
+    if (index === todayDay) tab.classList.add('today');
+    
+    const count = scheduleData.filter(item => item.day_of_week === index).length;
+    tab.innerHTML = `${DAY_NAMES_SHORT[index]}${index === activeDay && count > 0 ? `<span class="day-badge">${count}</span>` : ''}`;
+    
+    tab.onclick = () => setActiveDay(index);
+    container.appendChild(tab);
+  });
+}
+
+// Populate Copy Selects
+
+// Set Active Day
+function setActiveDay(day) {
+  activeDay = day;
+  renderDaysTabs();
+  renderScheduleList();
+}
+
+// Load Schedule
+async function loadSchedule() {
+  try {
+    scheduleData = await api('/admin/schedule/data');
+    renderDaysTabs();
+    renderScheduleList();
+  } catch (error) {
+    showToast(error.message, 'error');
+  }
+}
+
+// Render Schedule List
+function renderScheduleList() {
+  const container = document.getElementById('schedule-list');
+  const dayItems = scheduleData
+    .filter(item => item.day_of_week === activeDay)
+    .sort((a, b) => a.time.localeCompare(b.time));
+  
+  if (dayItems.length === 0) {
+    container.innerHTML = `
+      <div class="empty-state">
+        <div class="empty-state-icon">📅</div>
+        <div class="empty-state-title">${t('Пока нет занятий')}</div>
+        <div class="empty-state-text">${t('Добавьте первое занятие для этого дня')}</div>
+      </div>
+    `;
+    return;
+  }
+  
+  container.innerHTML = '';
+  dayItems.forEach(item => {
+    container.appendChild(createScheduleCard(item));
+  });
+}
+
+// Create Schedule Card
+function createScheduleCard(item) {
+  const card = document.createElement('div');
+  card.className = 'schedule-card';
+  card.dataset.id = item.id;
+  
+  let activityDisplay;
+  if (item.discipline === 'other') {
+    activityDisplay = item.activity || t('Другое');
+  } else {
+    const labels = {
+      boxing: t('Бокс'),
+      wrestling: t('Борьба'),
+      mma: t('ММА'),
+      sparring: t('Спарринг')
+    };
+    activityDisplay = labels[item.discipline] || item.activity;
+    if (item.age) {
+      // Remove old suffixes and add localized one
+      const cleanedAge = item.age.replace(/[aлy][.,o]*/gi, '').trim();
+      activityDisplay += ` ${cleanedAge}${AGE_SUFFIX}`;
+    }
+  }
+  
+  card.innerHTML = `
+    <div class="drag-handle" title="${t('Перетащить')}">⋮⋮</div>
+    <div class="card-time">${item.time}</div>
+    <div class="card-info">
+      <div class="card-title">${activityDisplay}</div>
+      ${item.coach ? `<div class="card-meta"><span class="card-meta-item">👤 ${item.coach}</span></div>` : ''}
+    </div>
+    <div class="card-actions">
+      <button class="btn btn-secondary btn-sm" onclick="editItem(${item.id})">${t('Изменить')}</button>
+      <div class="dropdown">
+        <button class="btn btn-secondary btn-icon btn-sm" onclick="toggleDropdown(event)">⋯</button>
+        <div class="dropdown-menu">
+          <div class="dropdown-item" onclick="moveItem(${item.id})">📤 ${t('Перенести')}</div>
+          <div class="dropdown-item" onclick="duplicateItem(${item.id})">📋 ${t('Дублировать')}</div>
+          <div class="dropdown-divider"></div>
+          <div class="dropdown-item" style="color: var(--danger);" onclick="deleteItem(${item.id})">🗑 ${t('Удалить')}</div>
+        </div>
+      </div>
+    </div>
+  `;
+  
+  return card;
+}
+
+// Edit Item
+function editItem(id) {
+  const item = scheduleData.find(i => i.id === id);
+  if (!item) return;
+  
+  const card = document.querySelector(`[data-id="${id}"]`);
+  card.classList.add('editing');
+  
+  // Extract custom name for 'other' discipline
+  let customName = '';
+  if (item.discipline === 'other' && item.activity) {
+    customName = item.age && item.activity.endsWith(' ' + item.age) 
+      ? item.activity.slice(0, -(item.age.length + 1))
+      : item.activity;
+  }
+  
+  // Parse age range
+  const ageRange = parseAgeRange(item.age);
+  
+  card.innerHTML = `
+    <div></div>
+    <form class="edit-form" onsubmit="return saveEdit(event, ${id})">
+      <input type="time" class="input input-time" value="${item.time}" required>
+      <select class="input" id="edit-group-${id}" required>
+        <option value="" disabled>${t('Выберите группу')}</option>
+        ${Object.entries(GROUPS).map(([key, conf]) => `<option value="${key}">${conf.label}</option>`).join('')}
+      </select>
+      <select class="input input-coach" id="edit-coach-${id}">
+        <option value="">${t('Без тренера')}</option>
+      </select>
+      <div class="edit-form-actions">
+        <button type="submit" class="btn btn-primary btn-sm">${t('Сохранить')}</button>
+        <button type="button" class="btn btn-secondary btn-sm" onclick="loadSchedule()">${t('Отмена')}</button>
+      </div>
+    </form>
+  `;
+  
+  // Set selected group and populate coach
+  const groupSelect = document.getElementById(`edit-group-${id}`);
+  groupSelect.value = getGroupKey(item.discipline, item.age) || '';
+  populateCoachOptions(document.getElementById(`edit-coach-${id}`), item.coach || '');
+}
+
+// Save Edit
+async function saveEdit(event, id) {
+  event.preventDefault();
+  const form = event.target;
+  
+  const inputs = form.querySelectorAll('input, select');
+  const groupKey = document.getElementById(`edit-group-${id}`).value;
+  const conf = GROUPS[groupKey];
+  if (!conf) return false;
+
+  const payload = {
+    time: inputs[0].value.trim(),
+    discipline: conf.discipline,
+    age: conf.age,
+    coach: (document.getElementById(`edit-coach-${id}`)?.value || '').trim() || null
+  };
+  if (conf.discipline === 'other') {
+    payload.activity = conf.label;
+  }
+  
+  try {
+    await api(`/admin/schedule/item/${id}`, { method: 'PUT', body: JSON.stringify(payload) });
+    await loadSchedule();
+    showToast(t('Занятие обновлено'));
+  } catch (error) {
+    showToast(error.message, 'error');
+  }
+  
+  return false;
+}
+
+// Delete Item
+function deleteItem(id) {
+  const item = scheduleData.find(i => i.id === id);
+  if (!item) return;
+  
+  showModal(
+    t('Удалить занятие?'),
+    `${t('Вы уверены, что хотите удалить')} "${item.activity}" ${t('в')} ${item.time}?`,
+    async () => {
+      try {
+        await api(`/admin/schedule/item/${id}`, { method: 'DELETE' });
+        await loadSchedule();
+        showToast(t('Занятие удалено'));
+      } catch (error) {
+        showToast(error.message, 'error');
+      }
+    }
+  );
+}
+
+// Move Item
+function moveItem(id) {
+  // TODO: Implement move modal
+  showToast(t('Функция в разработке'), 'error');
+}
+
+// Duplicate Item
+async function duplicateItem(id) {
+  const item = scheduleData.find(i => i.id === id);
+  if (!item) return;
+  
+  try {
+    await api('/admin/schedule/item', {
+      method: 'POST',
+      body: JSON.stringify({
+        day_of_week: activeDay,
+        time: item.time,
+        activity: item.activity,
+        discipline: item.discipline,
+        coach: item.coach,
+        age: item.age
+      })
+    });
+    await loadSchedule();
+    showToast(t('Занятие дублировано'));
+  } catch (error) {
+    showToast(error.message, 'error');
+  }
+}
+
+// Helper function to format age range (WITHOUT suffix for storage)
+function formatAgeRangeForStorage(from, to) {
+  if (from && to) {
+    return `${from}–${to}`;
+  } else if (from) {
+    return `${from}+`;
+  } else if (to) {
+    return `${AGE_PREFIX_TO} ${to}`;
+  }
+  return null;
+}
+
+// Helper function to format age range WITH suffix for display
+function formatAgeRange(from, to) {
+  if (from && to) {
+    return `${from}–${to}${AGE_SUFFIX}`;
+  } else if (from) {
+    return `${from}+${AGE_SUFFIX}`;
+  } else if (to) {
+    return `${AGE_PREFIX_TO} ${to}${AGE_SUFFIX}`;
+  }
+  return null;
+}
+
+// Helper function to parse age range
+function parseAgeRange(ageStr) {
+  if (!ageStr) return { from: '', to: '' };
+  
+  // Remove "a.", "л.", "y." suffixes and trim
+  const cleaned = ageStr.replace(/[aлy][.,]/g, '').trim();
+  
+  // Check for range (e.g., "6–12" or "6-12")
+  const rangeMatch = cleaned.match(/^(\d+)\s*[–-]\s*(\d+)$/);
+  if (rangeMatch) {
+    return { from: rangeMatch[1], to: rangeMatch[2] };
+  }
+  
+  // Check for "from+" (e.g., "13+")
+  const plusMatch = cleaned.match(/^(\d+)\+$/);
+  if (plusMatch) {
+    return { from: plusMatch[1], to: '' };
+  }
+  
+  // Check for "до X" / "kuni X" / "to X" (e.g., "до 12")
+  const toMatch = cleaned.match(/^(?:до|kuni|to)\s+(\d+)$/i);
+  if (toMatch) {
+    return { from: '', to: toMatch[1] };
+  }
+  
+  // Single number
+  const singleMatch = cleaned.match(/^(\d+)$/);
+  if (singleMatch) {
+    return { from: singleMatch[1], to: singleMatch[1] };
+  }
+  
+  return { from: '', to: '' };
+}
+
+function updateDaysToggleLabel() {
+  const btn = document.getElementById('add-days-toggle');
+  const checked = Array.from(document.querySelectorAll('input[name="add-days"]:checked'))
+    .map(el => parseInt(el.value))
+    .filter(v => !Number.isNaN(v));
+  if (!btn) return;
+  if (checked.length === 0) {
+    btn.textContent = `${t('Дни')}: ${t('Выберите')}`;
+  } else if (checked.length <= 3) {
+    const names = checked.map(i => DAY_NAMES_SHORT[i]).join(', ');
+    btn.textContent = `${t('Дни')}: ${names}`;
+  } else {
+    btn.textContent = `${t('Дни')}: ${checked.length} ${t('выбрано')}`;
+  }
+}
+
+function initDaysSelection() {
+  // preselect active day
+  const el = document.querySelector(`input[name="add-days"][value="${activeDay}"]`);
+  if (el) el.checked = true;
+  // attach change listeners
+  document.querySelectorAll('input[name="add-days"]').forEach(chk => {
+    chk.addEventListener('change', updateDaysToggleLabel);
+  });
+  updateDaysToggleLabel();
+}
+
+// Add Form
+document.getElementById('add-form').onsubmit = async (e) => {
+  e.preventDefault();
+
+  const time = document.getElementById('add-time').value.trim();
+  const key = document.getElementById('add-group').value;
+  const coach = document.getElementById('add-coach').value.trim() || null;
+
+  if (!time || !key) return;
+
+  const conf = GROUPS[key];
+  if (!conf) return;
+
+  // collect selected days; fallback to current activeDay if none
+  const days = Array.from(document.querySelectorAll('input[name="add-days"]:checked'))
+    .map(el => parseInt(el.value))
+    .filter(v => !Number.isNaN(v));
+  const targetDays = days.length > 0 ? days : [activeDay];
+
+  try {
+    const results = await Promise.allSettled(targetDays.map(day =>
+      api('/admin/schedule/item', {
+        method: 'POST',
+        body: JSON.stringify({
+        day_of_week: day,
+        time,
+        discipline: conf.discipline,
+        age: conf.age,
+        coach,
+        ...(conf.discipline === 'other' ? { activity: conf.label } : {})
+        }),
+      })
+    ));
+
+    const ok = results.filter(r => r.status === 'fulfilled').length;
+    await loadSchedule();
+    resetAddForm();
+    showToast(`${ok} ${t('добавлено')}`);
+  } catch (error) {
+    showToast(error.message, 'error');
+  }
+};
+
+// Toggle Add Panel
+function toggleAddPanel() {
+  document.getElementById('add-panel').classList.toggle('collapsed');
+}
+
+// Reset Add Form
+function resetAddForm() {
+  document.getElementById('add-form').reset();
+  // restore default day selection to activeDay and update label
+  document.querySelectorAll('input[name="add-days"]').forEach(chk => chk.checked = false);
+  const el = document.querySelector(`input[name="add-days"][value="${activeDay}"]`);
+  if (el) el.checked = true;
+  updateDaysToggleLabel();
+}
+
+
+
+// Modal
+function showModal(title, body, onConfirm) {
+  document.getElementById('modal-title').textContent = title;
+  document.getElementById('modal-body').textContent = body;
+  document.getElementById('modal-confirm').onclick = () => {
+    closeModal();
+    onConfirm();
+  };
+  document.getElementById('confirm-modal').classList.add('active');
+}
+
+function closeModal() {
+  document.getElementById('confirm-modal').classList.remove('active');
+}
+
+// Dropdown
+function toggleDropdown(event) {
+  event.stopPropagation();
+  const dropdown = event.target.closest('.dropdown');
+  const wasActive = dropdown.classList.contains('active');
+  
+  document.querySelectorAll('.dropdown').forEach(d => d.classList.remove('active'));
+  
+  if (!wasActive) {
+    dropdown.classList.add('active');
+  }
+}
+
+document.addEventListener('click', (event) => {
+  // Don't close if clicking inside a dropdown
+  if (!event.target.closest('.dropdown')) {
+    document.querySelectorAll('.dropdown').forEach(d => d.classList.remove('active'));
+  }
+});
+
+// Setup Event Listeners
+function setupEventListeners() {
+  // Keyboard shortcuts
+  document.addEventListener('keydown', (e) => {
+    if (e.key === 'a' && !e.ctrlKey && !e.metaKey && document.activeElement.tagName !== 'INPUT') {
+      e.preventDefault();
+      document.getElementById('add-time').focus();
+    }
+  });
+}
+
+// Override createScheduleCard to add checkbox
+const originalCreateScheduleCard = createScheduleCard;
+createScheduleCard = function(item) {
+  const card = originalCreateScheduleCard(item);
+  
+  // Add checkbox
+  const checkbox = document.createElement('input');
+  checkbox.type = 'checkbox';
+  checkbox.className = 'card-checkbox';
+  checkbox.setAttribute('aria-label', `${item.time} ${item.activity}`);
+  checkbox.onclick = (e) => {
+    e.stopPropagation();
+    if (window.toggleSelection) {
+      window.toggleSelection(item.id, e);
+    }
+  };
+  
+  // Insert checkbox at the beginning
+  card.insertBefore(checkbox, card.firstChild);
+  
+  // Make card clickable in selection mode
+  card.onclick = (e) => {
+    if (window.ScheduleMultiselect && window.ScheduleMultiselect.isSelectionMode() && 
+        !e.target.closest('.card-actions') && !e.target.closest('.card-checkbox')) {
+      if (window.toggleSelection) {
+        window.toggleSelection(item.id, e);
+      }
+    }
+  };
+  
+  return card;
+};
+
+// Override setActiveDay to reset selection
+const originalSetActiveDay = setActiveDay;
+setActiveDay = function(day) {
+  originalSetActiveDay(day);
+  if (window.ScheduleMultiselect) {
+    window.ScheduleMultiselect.onDayChange();
+  }
+};
+
+// Override loadSchedule to update multiselect state
+const originalLoadSchedule = loadSchedule;
+loadSchedule = async function() {
+  await originalLoadSchedule();
+  if (window.ScheduleMultiselect) {
+    window.ScheduleMultiselect.updateState(scheduleData, activeDay);
+    window.ScheduleMultiselect.updateSelectionUI();
+  }
+};
+
+// Initialize on load
+init();
@@ -0,0 +1,10 @@
+// Initialize multiselect module after main init
+if (window.ScheduleMultiselect) {
+  window.ScheduleMultiselect.init({
+    api: api,
+    showToast: showToast,
+    loadSchedule: loadSchedule,
+    closeModal: closeModal
+  });
+  window.ScheduleMultiselect.updateState(scheduleData, activeDay);
+}
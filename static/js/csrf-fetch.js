@@ -0,0 +1,44 @@
+// Forms on cacheable pages render without a token (form[data-csrf-url]):
+// fetch one when the form is submitted, then submit it for real
+(function(){
+  document.addEventListener('submit', function(evt){
+    var form = evt.target;
+    if (evt.defaultPrevented || !form.matches || !form.matches('form[data-csrf-url]')) return;
+    var input = form.querySelector('input[name="csrf_token"]');
+    if (!input || input.value) return;
+    evt.preventDefault();
+    fetch(form.getAttribute('data-csrf-url'), { credentials: 'same-origin', cache: 'no-store' })
+      .then(function(r){ return r.json(); })
+      .then(function(data){ input.value = data.token; form.submit(); })
+      .catch(function(){ form.submit(); });
+  });
+})();
+
+// Global fetch wrapper to attach CSRF token to non-GET requests
+(function(){
+  try{
+    var tag = document.querySelector('meta[name="csrf-token"]');
+    var token = tag ? tag.getAttribute('content') : null;
+    if(!token) return;
+    var originalFetch = window.fetch;
+    window.fetch = function(input, init){
+      init = init || {};
+      var method = (init.method || 'GET').toUpperCase();
+      if (method !== 'GET' && method !== 'HEAD' && method !== 'OPTIONS'){
+        var hdrs = init.headers || {};
+        try{
+          // If Headers object, clone to set new header
+          if (typeof Headers !== 'undefined' && hdrs instanceof Headers){
+            var h2 = new Headers(hdrs);
+            if (!h2.has('X-CSRFToken')) h2.set('X-CSRFToken', token);
+            init.headers = h2;
+          } else {
+            if (!('X-CSRFToken' in hdrs)) hdrs['X-CSRFToken'] = token;
+            init.headers = hdrs;
+          }
+        }catch(e){ /* noop */ }
+      }
+      return originalFetch(input, init);
+    };
+  }catch(e){ /* noop */ }
+})();
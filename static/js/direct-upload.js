@@ -0,0 +1,97 @@
+// Direct-to-bucket document upload: the file goes from the browser straight to
+// storage through presigned URLs; the app only signs and registers it.
+// Falls back to the normal form POST if anything before the transfer fails.
+(function(){
+  const form = document.querySelector('form[data-direct-upload]');
+  if (!form || !window.crypto || !crypto.subtle) return;
+  const fileInput = form.querySelector('input[type="file"]');
+  const noteInput = form.querySelector('[name="note"]');
+  const button = form.querySelector('button[type="submit"]');
+
+  function hex(buf){
+    return Array.from(new Uint8Array(buf)).map(b => b.toString(16).padStart(2, '0')).join('');
+  }
+
+  function put(url, body, headers){
+    // XHR, not fetch: the global fetch wrapper adds X-CSRFToken, which the
+    // bucket's CORS rules don't need to know about
+    return new Promise((resolve, reject) => {
+      const xhr = new XMLHttpRequest();
+      xhr.open('PUT', url);
+      Object.entries(headers || {}).forEach(([k, v]) => xhr.setRequestHeader(k, v));
+      xhr.onload = () => (xhr.status >= 200 && xhr.status < 300) ? resolve(xhr) : reject(new Error('upload ' + xhr.status));
+      xhr.onerror = () => reject(new Error('network'));
+      xhr.send(body);
+    });
+  }
+
+  async function sha256Hex(blob){
+    return hex(await crypto.subtle.digest('SHA-256', await blob.arrayBuffer()));
+  }
+
+  async function postJSON(url, data){
+    const r = await fetch(url, {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify(data),
+      credentials: 'same-origin'
+    });
+    const payload = await r.json().catch(() => ({}));
+    if (!r.ok) throw Object.assign(new Error(payload.error || ('HTTP ' + r.status)), {status: r.status, payload});
+    return payload;
+  }
+
+  form.addEventListener('submit', async function(e){
+    const file = fileInput && fileInput.files && fileInput.files[0];
+    if (!file || form.dataset.fallback) return;
+    e.preventDefault();
+    if (button) button.disabled = true;
+    let plan = null;
+    const partSize = Number(form.dataset.partSize);
+    const multipart = file.size > Number(form.dataset.multipartThreshold);
+    try{
+      const start = {filename: file.name, size: file.size};
+      if (multipart){
+        // the bucket checks each part against its signed hash
+        start.parts_sha256 = [];
+        for (let offset = 0; offset < file.size; offset += partSize){
+          start.parts_sha256.push(await sha256Hex(file.slice(offset, offset + partSize)));
+        }
+      } else {
+        start.sha256 = await sha256Hex(file);
+      }
+      plan = await postJSON(form.dataset.directUpload, start);
+    }catch(err){
+      if (err.status === 400 || err.status === 413){
+        alert(err.message);
+        if (button) button.disabled = false;
+        return;
+      }
+      // direct upload unavailable: submit through the app instead
+      form.dataset.fallback = '1';
+      form.submit();
+      return;
+    }
+    try{
+      const done = {key: plan.key, filename: file.name, note: noteInput ? noteInput.value : ''};
+      if (plan.method === 'put'){
+        await put(plan.url, file, plan.headers);
+      } else {
+        const parts = [];
+        for (let i = 0; i < plan.parts.length; i++){
+          const chunk = file.slice(i * plan.part_size, (i + 1) * plan.part_size);
+          const part = plan.parts[i];
+          const xhr = await put(part.url, chunk, part.headers);
+          parts.push({number: i + 1, etag: xhr.getResponseHeader('ETag'), checksum: part.headers['x-amz-checksum-sha256']});
+        }
+        done.upload_id = plan.upload_id;
+        done.parts = parts;
+      }
+      await postJSON(form.dataset.directComplete, done);
+    }catch(err){
+      postJSON(form.dataset.directAbort, {key: plan.key, upload_id: plan.upload_id}).catch(() => {});
+      alert(err.message);
+    }
+    window.location.reload();
+  });
+})();
@@ -0,0 +1,12 @@
+// Auto-hide flash messages after 1 second with a smooth transition
+(function(){
+  var container = document.getElementById('flash');
+  if (!container) return;
+  setTimeout(function(){
+    var items = container.querySelectorAll('.flash-item');
+    items.forEach(function(el){ el.classList.add('hide'); });
+    setTimeout(function(){
+      if (container && container.parentNode) container.parentNode.removeChild(container);
+    }, 300);
+  }, 1000);
+})();
@@ -0,0 +1,129 @@
+// Schedule page: today chip, plan tabs, localized ages and live training status
+/* Отключено: инициирование оплаты
+async function createCheckout(price_id){
+  try{
+    const resp = await fetch('/billing/checkout/session', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({price_id})});
+    const data = await resp.json();
+    if (data.url) window.location = data.url; else alert('Ошибка создания сессии оплаты');
+  }catch(e){ alert('Ошибка сети'); }
+}
+*/
+
+// Mark today's day with the "Сегодня" chip
+(function(){
+  try{
+    const base = ['E','T','K','N','R','L','P']; // Mon..Sun
+    const code = base[(new Date().getDay() + 6) % 7]; // map JS 0..6 (Sun..Sat) to Mon..Sun index
+    document.querySelectorAll('.day-head .today-chip').forEach(el => {
+      if (el.getAttribute('data-day') === code) {
+        el.hidden = false;
+      } else {
+        el.remove();
+      }
+    });
+  }catch(e){ /* no-op */ }
+})();
+
+// Tabs: sync with URL hash and toggle panels
+(function(){
+  const mapKey = (hash) => {
+    switch ((hash || '').toLowerCase()){
+      case '#boxing': return 'boxing';
+      case '#wrestling': return 'wrestling';
+      case '#mma': return 'mma';
+      default: return 'all';
+    }
+  };
+  const tabs = Array.from(document.querySelectorAll('.plans-tab'));
+  const panels = Array.from(document.querySelectorAll('.plans-panel'));
+  const setActive = (key) => {
+    tabs.forEach(btn => btn.setAttribute('aria-selected', btn.getAttribute('data-key') === key ? 'true' : 'false'));
+    panels.forEach(p => {
+      if (p.getAttribute('data-key') === key) p.removeAttribute('hidden'); else p.setAttribute('hidden','');
+    });
+  };
+  const sync = () => setActive(mapKey(location.hash));
+  tabs.forEach(btn => btn.addEventListener('click', () => {
+    const key = btn.getAttribute('data-key');
+    const target = key === 'boxing' ? '#boxing' : key === 'wrestling' ? '#wrestling' : key === 'mma' ? '#mma' : '#all';
+    if (location.hash !== target) location.hash = target; else sync();
+  }));
+  window.addEventListener('hashchange', sync);
+  sync();
+})();
+function onPlanCtaClick(ev, cta, link){
+  const btn = ev.currentTarget;
+  if (cta === 'buy'){
+    btn.disabled = true;
+    btn.setAttribute('aria-busy','true');
+    const isPath = typeof link === 'string' && link.startsWith('/');
+    const action = isPath ? Promise.resolve().then(()=>{ window.location = link; }) : createCheckout(link);
+    action.finally(()=>{
+      btn.disabled = false;
+      btn.removeAttribute('aria-busy');
+    });
+  } else if (link){
+    window.location = link;
+  }
+}
+
+// Process age display with localized suffix
+(function(){
+  const host = document.querySelector('[data-age-suffix]');
+  const AGE_SUFFIX = host ? host.getAttribute('data-age-suffix') : '';
+  document.querySelectorAll('.age-display').forEach(el => {
+    const age = el.getAttribute('data-age') || '';
+    if (!age) return;
+
+    // Remove any existing suffixes (a., л., y.o, y.)
+    const cleaned = age.replace(/[aлy][.,o]*/gi, '').trim();
+
+    // Add localized suffix
+    el.textContent = cleaned + AGE_SUFFIX;
+  });
+})();
+
+function updateTrainingStatuses() {
+  const now = new Date();
+
+  // 1) Сначала очистим подсветку у всех элементов на странице,
+  //    чтобы не оставались старые состояния на других днях
+  document.querySelectorAll('.schedule-item').forEach(item => {
+    item.classList.remove('schedule-item--active');
+    const statusEl = item.querySelector('.schedule-item__status');
+    if (statusEl) statusEl.innerHTML = '';
+  });
+
+  // 2) Найдём карточку текущего дня (там, где остался .today-chip)
+  const todayChip = document.querySelector('.day-head .today-chip');
+  const todayCard = todayChip ? todayChip.closest('.day-card') : null;
+  if (!todayCard) return;
+
+  // 3) Обрабатываем только слоты текущего дня
+  const items = todayCard.querySelectorAll('.schedule-item[data-start]');
+
+  items.forEach(item => {
+    const startStrRaw = item.dataset.start || '';
+    if (!startStrRaw) return;
+
+    const startStr = startStrRaw.replace('.', ':').trim();
+    const [h, m] = startStr.split(':').map(Number);
+    if (Number.isNaN(h)) return;
+
+    const start = new Date();
+    start.setHours(h, Number.isNaN(m) ? 0 : m, 0, 0);
+
+    const end = new Date(start.getTime() + 2 * 60 * 60 * 1000);
+
+    if (now >= start && now <= end) {
+      item.classList.add('schedule-item--active');
+    } else {
+      item.classList.remove('schedule-item--active');
+    }
+  });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  updateTrainingStatuses();
+  setInterval(updateTrainingStatuses, 60000);
+});
@@ -0,0 +1,8 @@
+// Register the service worker (<html data-sw="/sw.js">) once the page has loaded
+(function(){
+  var url = document.documentElement.getAttribute('data-sw');
+  if (!url || !('serviceWorker' in navigator)) return;
+  window.addEventListener('load', function(){
+    navigator.serviceWorker.register(url, { scope: '/' }).catch(function(){ /* offline support is optional */ });
+  });
+})();
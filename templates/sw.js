@@ -0,0 +1,130 @@
+{# Service worker, rendered by utils/serviceworker.py and served from /sw.js.
+   __SW_VERSION__ is replaced with a hash of the rendered script, so every
+   deploy that changes a precached URL installs a new worker. #}
+/* Wiru Combat Academy service worker, version __SW_VERSION__ */
+'use strict';
+const VERSION = '__SW_VERSION__';
+const PREFIX = 'wiru-';
+{% if not enabled %}
+// Service worker switched off (SERVICE_WORKER_ENABLED=0): drop our caches and unregister
+self.addEventListener('install', () => self.skipWaiting());
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((keys) => Promise.all(keys.filter((k) => k.startsWith(PREFIX)).map((k) => caches.delete(k))))
+      .then(() => self.registration.unregister())
+  );
+});
+{% else %}
+const STATIC_CACHE = PREFIX + 'static-' + VERSION;
+const PAGES_CACHE = PREFIX + 'pages-' + VERSION;
+const PRECACHE = {{ precache|tojson }};
+// Pages answered stale-while-revalidate: the cached copy at once, a fresh one for next time
+const SWR_PAGES = new RegExp({{ swr_pattern|tojson }});
+// Content-hashed static URLs never change, so a cached copy is always right
+const HASHED_STATIC = new RegExp({{ hashed_pattern|tojson }});
+const LOGOUT_PATH = {{ logout_path|tojson }};
+const LOGIN_PATHS = {{ login_paths|tojson }};
+// Synthetic entry in PAGES_CACHE: present while this browser has a session
+const SESSION_KEY = '/__sw-session';
+const MAX_RUNTIME_STATIC = {{ max_runtime_static }};
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(
+    caches.open(STATIC_CACHE)
+      .then((cache) => cache.addAll(PRECACHE))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((keys) => Promise.all(
+        keys.filter((k) => k.startsWith(PREFIX) && k !== STATIC_CACHE && k !== PAGES_CACHE)
+          .map((k) => caches.delete(k))
+      ))
+      .then(() => self.clients.claim())
+  );
+});
+
+async function trim(cache, keep) {
+  const keys = await cache.keys();
+  const extra = keys.length - keep;
+  for (let i = PRECACHE.length; i < PRECACHE.length + extra && i < keys.length; i++) {
+    await cache.delete(keys[i]);
+  }
+}
+
+async function cacheFirst(event) {
+  const cache = await caches.open(STATIC_CACHE);
+  const cached = await cache.match(event.request);
+  if (cached) return cached;
+  const response = await fetch(event.request);
+  if (response.ok && response.type === 'basic') {
+    const copy = response.clone();
+    event.waitUntil(cache.put(event.request, copy).then(() => trim(cache, PRECACHE.length + MAX_RUNTIME_STATIC)));
+  }
+  return response;
+}
+
+function isPublic(response) {
+  return /(^|,)\s*public\s*(,|$)/i.test(response.headers.get('Cache-Control') || '');
+}
+
+async function setSession(cache, signedIn) {
+  if (signedIn) {
+    await cache.put(SESSION_KEY, new Response(''));
+    // anything stored before is for another visitor state
+    const keys = await cache.keys();
+    await Promise.all(keys.filter((k) => new URL(k.url).pathname !== SESSION_KEY).map((k) => cache.delete(k)));
+  } else {
+    await cache.delete(SESSION_KEY);
+  }
+}
+
+// Only the anonymous variant (Cache-Control: public) is stored, and nothing
+// cached is returned while the browser has a session
+async function staleWhileRevalidate(event) {
+  const cache = await caches.open(PAGES_CACHE);
+  const signedIn = Boolean(await cache.match(SESSION_KEY));
+  const cached = signedIn ? undefined : await cache.match(event.request);
+  const network = fetch(event.request).then(async (response) => {
+    if (response.ok && response.type === 'basic' && !response.redirected) {
+      if (isPublic(response)) {
+        if (signedIn) await setSession(cache, false);
+        await cache.put(event.request, response.clone());
+      } else {
+        await setSession(cache, true);
+      }
+    }
+    return response;
+  });
+  if (cached) {
+    event.waitUntil(network.catch(() => undefined));
+    return cached;
+  }
+  return network;
+}
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+  if (request.method === 'POST' && LOGIN_PATHS.includes(url.pathname)) {
+    event.waitUntil(caches.open(PAGES_CACHE).then((cache) => setSession(cache, true)));
+    return;
+  }
+  if (request.method !== 'GET') return;
+  if (url.pathname === LOGOUT_PATH) {
+    // cached pages and the session flag must not outlive the session on this device
+    event.waitUntil(caches.delete(PAGES_CACHE));
+    return;
+  }
+  if (HASHED_STATIC.test(url.pathname)) {
+    event.respondWith(cacheFirst(event));
+  } else if (SWR_PAGES.test(url.pathname)) {
+    event.respondWith(staleWhileRevalidate(event));
+  }
+});
+{% endif %}
@@ -0,0 +1,166 @@
+"""App, seeded database and logged-in clients for the test suite.
+
+``config.Config`` reads the environment when it is imported, so everything
+it needs is set here, before ``app`` is imported: a throwaway SQLite file
+and scratch directories under one temporary root, no warmup thread, and
+the superadmin that ``seed_if_empty`` creates from ``SUPERADMIN_EMAIL``.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+_ROOT = tempfile.mkdtemp(prefix="wiru-tests-")
+
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_ROOT, 'test.db')}",
+    UPLOAD_DIR=os.path.join(_ROOT, "uploads"),
+    IMAGE_PROXY_CACHE_DIR=os.path.join(_ROOT, "cache", "images"),
+    METRICS_DIR=os.path.join(_ROOT, "metrics"),
+    PROFILE_DIR=os.path.join(_ROOT, "profiles"),
+    MEMDIAG_DIR=os.path.join(_ROOT, "memdiag"),
+    WARMUP_ENABLED="0",
+    SUPERADMIN_EMAIL="root@example.com",
+    ADMIN_PASSWORD="root-password",
+)
+for _name in ("MAIL_FROM", "MAIL_TO", "METRICS_TOKEN", "STORAGE_BACKEND"):
+    os.environ.pop(_name, None)
+
+from PIL import Image  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+from models import Document, News, User, db  # noqa: E402
+from utils import blobstore, storage  # noqa: E402
+
+PASSWORD = "password123"
+
+# Smallest PDF pypdfium2 opens: one empty page
+PDF_BYTES = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 200 200]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def png_bytes(size=(64, 48)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def store_document(user, filename, data, ext, mime):
+    sha = hashlib.sha256(data).hexdigest()
+    staged = os.path.join(blobstore.staging_dir(), f"seed-{sha}.{ext}")
+    os.makedirs(os.path.dirname(staged), exist_ok=True)
+    with open(staged, "wb") as fh:
+        fh.write(data)
+    blob = blobstore.ingest(staged, sha, ext, len(data), mime)
+    doc = Document(
+        user_id=user.id,
+        filename=filename,
+        stored_path=blob.stored_path,
+        mime=mime,
+        size_bytes=len(data),
+        sha256=sha,
+    )
+    db.session.add(doc)
+    return doc
+
+
+def query_budget(endpoint, signed_in=True):
+    """``SQL_QUERY_BUDGETS[endpoint]`` from config.py, the one place budgets are written.
+
+    Budgets include the flask-login user lookup; anonymous requests skip it.
+    Tests of a cheaper branch (a 403, a GET form, a redirect) pin their own
+    lower count instead.
+    """
+    return flask_app.config["SQL_QUERY_BUDGETS"][endpoint] - (0 if signed_in else 1)
+
+
+def make_user(email, **kwargs):
+    user = User(email=email, **kwargs)
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def _store_avatar(user):
+    path = os.path.join(storage.scratch_dir(), f"seed-avatar-{user.id}.png")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(png_bytes((256, 256)))
+    user.avatar_path = storage.get_storage().save(path, f"{user.id}/avatar.png", "image/png")
+
+
+@pytest.fixture(scope="session")
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    yield flask_app
+    shutil.rmtree(_ROOT, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def seed(app):
+    """Users of every role, a few news items, and the member's documents and avatar."""
+    with app.app_context():
+        admin = User(email="admin@example.com", username="admin", role="admin", is_admin=True)
+        member = User(email="member@example.com", username="member", full_name="Member")
+        other = User(email="other@example.com", username="other")
+        for user in (admin, member, other):
+            user.set_password(PASSWORD)
+        db.session.add_all([admin, member, other])
+        db.session.add_all(News(title=f"News {i}", body=f"Body {i}") for i in range(5))
+        db.session.flush()
+        pdf = store_document(member, "contract.pdf", PDF_BYTES, "pdf", "application/pdf")
+        image = store_document(member, "photo.png", png_bytes(), "png", "image/png")
+        _store_avatar(member)
+        db.session.commit()
+        superadmin = User.query.filter_by(is_superadmin=True).one()
+        return SimpleNamespace(
+            superadmin_id=superadmin.id,
+            admin_id=admin.id,
+            member_id=member.id,
+            other_id=other.id,
+            pdf_id=pdf.id,
+            image_id=image.id,
+            news_id=News.query.order_by(News.id).first().id,
+        )
+
+
+def _login(app, email, password):
+    client = app.test_client()
+    resp = client.post("/login", data={"email": email, "password": password})
+    assert resp.status_code == 302, resp.status_code
+    return client
+
+
+@pytest.fixture
+def client(app, seed):
+    return app.test_client()
+
+
+@pytest.fixture
+def member_client(app, seed):
+    return _login(app, "member@example.com", PASSWORD)
+
+
+@pytest.fixture
+def other_client(app, seed):
+    return _login(app, "other@example.com", PASSWORD)
+
+
+@pytest.fixture
+def admin_client(app, seed):
+    return _login(app, "admin@example.com", PASSWORD)
+
+
+@pytest.fixture
+def superadmin_client(app, seed):
+    return _login(app, os.environ["SUPERADMIN_EMAIL"], os.environ["ADMIN_PASSWORD"])
@@ -0,0 +1,290 @@
+import io
+import os
+import zipfile
+
+from models import Document, News, Schedule, Signup, User, db
+from utils.querycount import assert_max_queries
+
+from tests.conftest import PDF_BYTES, make_user, png_bytes, query_budget, store_document
+
+
+def test_admin_dashboard(app, admin_client):
+    with app.app_context():
+        db.session.add(Signup(name="Ann", email="ann@example.com", activity="boxing"))
+        db.session.commit()
+        news, signups = News.query.count(), Signup.query.count()
+    # user + both counts in one statement
+    with assert_max_queries(query_budget("admin_dashboard")):
+        resp = admin_client.get("/admin")
+    assert resp.status_code == 200
+    html = resp.get_data(as_text=True)
+    assert f"Всего: {news}" in html
+    assert f"Новых заявок: {signups}" in html
+
+
+def test_admin_requires_admin(member_client):
+    with assert_max_queries(1):
+        resp = member_client.get("/admin")
+    assert resp.status_code == 403
+
+
+def test_admin_news_list(admin_client):
+    with assert_max_queries(query_budget("admin_news_list")):
+        resp = admin_client.get("/admin/news")
+    assert resp.status_code == 200
+
+
+def test_admin_add_news_page(admin_client):
+    with assert_max_queries(1):
+        resp = admin_client.get("/admin/news/add")
+    assert resp.status_code == 200
+
+
+def test_admin_add_news(admin_client):
+    with assert_max_queries(query_budget("admin_add_news")):
+        resp = admin_client.post("/admin/news/add", data={"title": "Added", "body": "Text"})
+    assert resp.status_code == 302
+
+
+def test_admin_edit_news_page(admin_client, seed):
+    with assert_max_queries(2):
+        resp = admin_client.get(f"/admin/news/edit/{seed.news_id}")
+    assert resp.status_code == 200
+
+
+def test_admin_edit_news(admin_client, seed):
+    with assert_max_queries(query_budget("admin_edit_news")):
+        resp = admin_client.post(f"/admin/news/edit/{seed.news_id}", data={"title": "News 0", "body": "Edited"})
+    assert resp.status_code == 302
+
+
+def test_admin_delete_news(app, admin_client):
+    with app.app_context():
+        item = News(title="Doomed", body="Text")
+        db.session.add(item)
+        db.session.commit()
+        news_id = item.id
+    with assert_max_queries(query_budget("admin_delete_news")):
+        resp = admin_client.post(f"/admin/news/delete/{news_id}")
+    assert resp.status_code == 302
+
+
+def test_admin_edit_schedule_page(admin_client):
+    with assert_max_queries(query_budget("admin_edit_schedule")):
+        resp = admin_client.get("/admin/schedule")
+    assert resp.status_code == 200
+    head = resp.get_data(as_text=True).split("</head>")[0]
+    assert ".schedule-editor{" in head
+    assert '<link rel="preload" href="/static/dist/admin-schedule' in head
+
+
+def test_admin_edit_schedule(admin_client):
+    data = {"day_of_week": 6, "time": "08:00", "activity": "Boxing", "discipline": "boxing", "coach": ""}
+    with assert_max_queries(query_budget("admin_edit_schedule")):
+        resp = admin_client.post("/admin/schedule", data=data)
+    assert resp.status_code == 302
+
+
+def test_admin_schedule_data(admin_client):
+    with assert_max_queries(query_budget("admin_schedule_data")):
+        resp = admin_client.get("/admin/schedule/data")
+    assert resp.status_code == 200
+    assert resp.get_json()
+
+
+def test_admin_coaches_list(admin_client):
+    with assert_max_queries(query_budget("admin_coaches_list")):
+        resp = admin_client.get("/admin/coaches")
+    assert resp.status_code == 200
+
+
+def test_admin_schedule_create(admin_client):
+    with assert_max_queries(query_budget("admin_schedule_create")):
+        resp = admin_client.post("/admin/schedule/item", json={"day_of_week": 3, "time": "07:00", "discipline": "boxing"})
+    assert resp.status_code == 200
+
+
+def _schedule_item(app, **kwargs):
+    with app.app_context():
+        item = Schedule(**{"day_of_week": 5, "time": "06:00", "activity": "MMA", "discipline": "mma", **kwargs})
+        db.session.add(item)
+        db.session.commit()
+        return item.id
+
+
+def test_admin_schedule_update(app, admin_client):
+    item_id = _schedule_item(app, time="06:15")
+    with assert_max_queries(query_budget("admin_schedule_update")):
+        resp = admin_client.patch(f"/admin/schedule/item/{item_id}", json={"discipline": "boxing", "age": "18+"})
+    assert resp.status_code == 200
+
+
+def test_admin_schedule_delete(app, admin_client):
+    item_id = _schedule_item(app, time="06:30")
+    with assert_max_queries(query_budget("admin_schedule_delete")):
+        resp = admin_client.delete(f"/admin/schedule/item/{item_id}")
+    assert resp.status_code == 200
+    assert resp.get_json()["deleted"] == 1
+
+
+def _day(app, day):
+    with app.app_context():
+        return sorted(
+            (it.time, it.activity, it.discipline, it.coach or "", it.age or "")
+            for it in Schedule.query.filter_by(day_of_week=day)
+        )
+
+
+def test_admin_schedule_copy_day(app, admin_client):
+    # occupied slots in one query, new rows in one executemany, however long the day
+    source, before = _day(app, 0), _day(app, 1)
+    assert len(source) > 1
+    taken = {row[0] for row in before}
+    with assert_max_queries(query_budget("admin_schedule_copy_day")):
+        resp = admin_client.post("/admin/schedule/copy_day", json={"source_day": 0, "target_day": 1})
+    assert resp.status_code == 200
+    free = {row[0] for row in source} - taken
+    assert resp.get_json()["created"] == len(free)
+    # occupied slots are kept, each free one gets a row of the source day
+    after = _day(app, 1)
+    added = [row for row in after if row not in before]
+    assert len(after) == len(before) + len(free)
+    assert sorted(row[0] for row in added) == sorted(free)
+    assert all(row in source for row in added)
+
+
+def test_admin_schedule_copy_day_replace(app, admin_client):
+    with assert_max_queries(query_budget("admin_schedule_copy_day")):
+        resp = admin_client.post("/admin/schedule/copy_day", json={"source_day": 0, "target_day": 2, "replace": True})
+    assert resp.status_code == 200
+    assert resp.get_json()["created"] > 1
+    assert _day(app, 2) == _day(app, 0)
+
+
+def test_admin_users(admin_client):
+    with assert_max_queries(query_budget("admin_users")):
+        resp = admin_client.get("/admin/users")
+    assert resp.status_code == 200
+
+
+def test_admin_users_search(admin_client):
+    with assert_max_queries(query_budget("admin_users")):
+        resp = admin_client.get("/admin/users?q=member")
+    assert resp.status_code == 200
+
+
+def test_admin_user_detail(admin_client, seed):
+    with assert_max_queries(query_budget("admin_user_detail")):
+        resp = admin_client.get(f"/admin/users/{seed.member_id}")
+    assert resp.status_code == 200
+
+
+def test_admin_user_documents_zip(admin_client, seed):
+    # the archive is streamed: its queries run while the body is read
+    with assert_max_queries(query_budget("admin_user_documents_zip")):
+        resp = admin_client.get(f"/admin/users/{seed.member_id}/documents.zip")
+        body = resp.data
+    assert resp.status_code == 200
+    assert body.startswith(b"PK")
+
+
+def test_admin_user_documents_zip_contents(app, admin_client):
+    with app.app_context():
+        user = make_user("zip-owner@example.com")
+        first = PDF_BYTES + b"% zip first\n"
+        second = PDF_BYTES + b"% zip second\n"
+        photo = png_bytes((32, 32))
+        store_document(user, "report.pdf", first, "pdf", "application/pdf")
+        store_document(user, "report.pdf", second, "pdf", "application/pdf")
+        store_document(user, "photo.jpg", photo, "jpg", "image/jpeg")
+        store_document(user, "notes.txt", b"plain text " * 100, "txt", "text/plain")
+        db.session.add(Document(
+            user_id=user.id, filename="lost.pdf", stored_path=os.path.join(app.config["UPLOAD_DIR"], "lost.pdf"),
+            mime="application/pdf", size_bytes=10,
+        ))
+        db.session.commit()
+        user_id = user.id
+
+    resp = admin_client.get(f"/admin/users/{user_id}/documents.zip")
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.data)) as zf:
+        assert zf.testzip() is None
+        infos = {info.filename: info for info in zf.infolist()}
+        assert sorted(infos) == ["_missing.txt", "notes.txt", "photo.jpg", "report (2).pdf", "report.pdf"]
+        assert zf.read("report.pdf") == first
+        assert zf.read("report (2).pdf") == second
+        assert zf.read("photo.jpg") == photo
+        # already-compressed formats are stored, the rest deflated
+        for name in ("report.pdf", "report (2).pdf", "photo.jpg"):
+            assert infos[name].compress_type == zipfile.ZIP_STORED
+        assert infos["notes.txt"].compress_type == zipfile.ZIP_DEFLATED
+        assert zf.read("_missing.txt").decode() == "lost.pdf: NotFound\n"
+
+
+def _user(app, email, **kwargs):
+    with app.app_context():
+        user = User(email=email, **kwargs)
+        user.set_password("password123")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def test_admin_make_admin(app, superadmin_client):
+    user_id = _user(app, "promoted@example.com")
+    with assert_max_queries(query_budget("admin_make_admin")):
+        resp = superadmin_client.post(f"/admin/users/{user_id}/make-admin")
+    assert resp.status_code == 302
+
+
+def test_admin_remove_admin(app, superadmin_client):
+    user_id = _user(app, "demoted@example.com", role="admin", is_admin=True)
+    with assert_max_queries(query_budget("admin_remove_admin")):
+        resp = superadmin_client.post(f"/admin/users/{user_id}/remove-admin")
+    assert resp.status_code == 302
+
+
+def test_admin_role_change_requires_superadmin(admin_client, seed):
+    with assert_max_queries(1):
+        resp = admin_client.post(f"/admin/users/{seed.other_id}/make-admin")
+    assert resp.status_code == 403
+
+
+def test_admin_documents(admin_client):
+    with assert_max_queries(query_budget("admin_documents")):
+        resp = admin_client.get("/admin/documents")
+    assert resp.status_code == 200
+
+
+def test_admin_documents_filtered(admin_client, seed):
+    with assert_max_queries(query_budget("admin_documents")):
+        resp = admin_client.get(f"/admin/documents?user_id={seed.member_id}&q=contract")
+    assert resp.status_code == 200
+
+
+def test_admin_document_download(admin_client, seed):
+    with assert_max_queries(query_budget("admin_document_download")):
+        resp = admin_client.get(f"/admin/documents/{seed.pdf_id}/download")
+    assert resp.status_code == 200
+
+
+def test_admin_profiles(superadmin_client):
+    with assert_max_queries(query_budget("admin_profiles")):
+        resp = superadmin_client.get("/admin/profiles")
+    assert resp.status_code == 200
+
+
+def test_admin_profile_download(app, superadmin_client):
+    directory = app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "capture.speedscope.json"), "w") as fh:
+        fh.write("{}")
+    with assert_max_queries(query_budget("admin_profile_download")):
+        resp = superadmin_client.get("/admin/profiles/capture.speedscope.json")
+    assert resp.status_code == 200
+
+
+def test_admin_memory(superadmin_client):
+    with assert_max_queries(query_budget("admin_memory")):
+        resp = superadmin_client.get("/admin/memory")
+    assert resp.status_code == 200
@@ -0,0 +1,59 @@
+from utils.querycount import assert_max_queries
+
+from tests.conftest import PASSWORD, query_budget
+
+
+def test_login_page(client):
+    with assert_max_queries(0):
+        resp = client.get("/login")
+    assert resp.status_code == 200
+
+
+def test_login(client):
+    with assert_max_queries(query_budget("login", signed_in=False)):
+        resp = client.post("/login", data={"email": "member@example.com", "password": PASSWORD})
+    assert resp.status_code == 302
+
+
+def test_login_rejected(client):
+    with assert_max_queries(query_budget("login", signed_in=False)):
+        resp = client.post("/login", data={"email": "member@example.com", "password": "wrong-password"})
+    assert resp.status_code == 200
+
+
+def test_login_when_signed_in(member_client):
+    with assert_max_queries(1):
+        resp = member_client.get("/login")
+    assert resp.status_code == 302
+
+
+def test_register_page(client):
+    with assert_max_queries(0):
+        resp = client.get("/register")
+    assert resp.status_code == 200
+
+
+def test_register(client):
+    data = {"email": "new@example.com", "username": "newbie", "password": PASSWORD, "confirm": PASSWORD}
+    # duplicate check, insert, reload after commit for login_user
+    with assert_max_queries(query_budget("register")):
+        resp = client.post("/register", data=data)
+    assert resp.status_code == 302
+
+
+def test_logout(member_client):
+    with assert_max_queries(query_budget("logout")):
+        resp = member_client.get("/logout")
+    assert resp.status_code == 302
+
+
+def test_admin_login_page(client):
+    with assert_max_queries(0):
+        resp = client.get("/admin/login")
+    assert resp.status_code == 200
+
+
+def test_admin_login(client):
+    with assert_max_queries(query_budget("admin_login", signed_in=False)):
+        resp = client.post("/admin/login", data={"email": "admin@example.com", "password": PASSWORD})
+    assert resp.status_code == 302
@@ -0,0 +1,118 @@
+import os
+
+from flask import current_app
+
+from models import Blob, Document, db
+from utils import blobstore
+
+from tests.conftest import PDF_BYTES, make_user, store_document
+
+
+def _pdf(tag):
+    return PDF_BYTES + f"% {tag}\n".encode()
+
+
+def _store(user, tag):
+    return store_document(user, f"{tag}.pdf", _pdf(tag), "pdf", "application/pdf")
+
+
+def test_identical_uploads_share_one_blob(app, seed):
+    with app.app_context():
+        user = make_user("blob-same@example.com")
+        first, second = _store(user, "same"), _store(user, "same")
+        db.session.commit()
+        assert first.stored_path == second.stored_path
+        blobs = Blob.query.filter_by(sha256=first.sha256).all()
+        assert [b.ref_count for b in blobs] == [2]
+        # the second upload's staged copy was dropped, not stored twice
+        assert not os.listdir(blobstore.staging_dir())
+
+
+def test_last_reference_removes_the_file_after_commit(app, seed):
+    with app.app_context():
+        user = make_user("blob-release@example.com")
+        first, second = _store(user, "release"), _store(user, "release")
+        db.session.commit()
+        path, sha = first.stored_path, first.sha256
+
+        db.session.delete(first)
+        db.session.commit()
+        assert os.path.exists(path)
+        assert db.session.get(Blob, sha).ref_count == 1
+
+        db.session.delete(second)
+        db.session.flush()
+        assert os.path.exists(path)
+        db.session.commit()
+        assert not os.path.exists(path)
+        assert db.session.get(Blob, sha) is None
+
+
+def test_rollback_keeps_the_file(app, seed):
+    with app.app_context():
+        user = make_user("blob-rollback@example.com")
+        doc = _store(user, "rollback")
+        db.session.commit()
+        path, sha, doc_id = doc.stored_path, doc.sha256, doc.id
+
+        db.session.delete(doc)
+        db.session.flush()
+        db.session.rollback()
+        assert os.path.exists(path)
+        assert db.session.get(Blob, sha).ref_count == 1
+        assert db.session.get(Document, doc_id) is not None
+        # nothing left pending for the next commit either
+        db.session.commit()
+        assert os.path.exists(path)
+
+
+def test_deleting_a_user_releases_their_documents(app, seed):
+    with app.app_context():
+        leaving = make_user("blob-leaving@example.com")
+        staying = make_user("blob-staying@example.com")
+        shared = _store(leaving, "user shared")
+        _store(staying, "user shared")
+        own = _store(leaving, "user own")
+        db.session.commit()
+        shared_path, own_path = shared.stored_path, own.stored_path
+
+        db.session.delete(leaving)
+        db.session.commit()
+
+        assert os.path.exists(shared_path)
+        assert db.session.get(Blob, shared.sha256).ref_count == 1
+        assert not os.path.exists(own_path)
+        assert db.session.get(Blob, own.sha256) is None
+
+
+def _legacy_document(user, tag):
+    """A document as stored before the blob store: its own file, no sha256."""
+    data = _pdf(tag)
+    path = os.path.join(current_app.config["UPLOAD_DIR"], str(user.id), f"{tag.replace(' ', '_')}.pdf")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(data)
+    doc = Document(user_id=user.id, filename="legacy.pdf", stored_path=path, mime="application/pdf", size_bytes=len(data))
+    db.session.add(doc)
+    return doc
+
+
+def test_dedupe_existing_can_be_rerun(app, seed):
+    with app.app_context():
+        user = make_user("blob-legacy@example.com")
+        docs = [_legacy_document(user, f"legacy {i}") for i in range(2)]
+        copy = _legacy_document(make_user("blob-legacy-copy@example.com"), "legacy 0")
+        db.session.commit()
+        legacy_paths = [doc.stored_path for doc in docs + [copy]]
+
+        first = blobstore.dedupe_existing()
+        assert first["migrated"] == 3
+        assert first["duplicates"] == 1
+        assert not any(os.path.exists(path) for path in legacy_paths)
+        assert docs[0].stored_path == copy.stored_path
+        assert db.session.get(Blob, docs[0].sha256).ref_count == 2
+
+        again = blobstore.dedupe_existing()
+        assert again["migrated"] == 0
+        assert db.session.get(Blob, docs[0].sha256).ref_count == 2
+        assert all(os.path.exists(doc.stored_path) for doc in docs)
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from werkzeug.exceptions import Forbidden, NotFound
+
+from models import Document, db
+from utils.delivery import sandboxed_path
+
+from tests.conftest import PDF_BYTES
+
+
+def _doc(app, doc_id):
+    with app.app_context():
+        doc = db.session.get(Document, doc_id)
+        return doc.stored_path, doc.sha256
+
+
+def test_etag_and_not_modified(app, member_client, seed):
+    _, sha = _doc(app, seed.pdf_id)
+    url = f"/documents/{seed.pdf_id}/download"
+    resp = member_client.get(url)
+    assert resp.status_code == 200
+    # the content hash, strong, and not cacheable by shared caches
+    assert resp.headers["ETag"] == f'"{sha}"'
+    assert "private" in resp.headers["Cache-Control"]
+
+    resp = member_client.get(url, headers={"If-None-Match": f'"{sha}"'})
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+    resp = member_client.get(url, headers={"If-None-Match": '"something-else"'})
+    assert resp.status_code == 200
+
+
+def test_range(member_client, seed):
+    resp = member_client.get(f"/documents/{seed.pdf_id}/download", headers={"Range": "bytes=0-7"})
+    assert resp.status_code == 206
+    assert resp.data == PDF_BYTES[:8]
+    assert resp.headers["Content-Range"] == f"bytes 0-7/{len(PDF_BYTES)}"
+    assert resp.headers["Accept-Ranges"] == "bytes"
+
+
+def test_x_accel_redirect(app, member_client, seed, monkeypatch):
+    monkeypatch.setitem(app.config, "FILE_DELIVERY", "x-accel")
+    path, _ = _doc(app, seed.pdf_id)
+    resp = member_client.get(f"/documents/{seed.pdf_id}/download")
+    assert resp.status_code == 200
+    assert resp.data == b""
+    rel = os.path.relpath(os.path.realpath(path), os.path.realpath(app.config["UPLOAD_DIR"]))
+    assert resp.headers["X-Accel-Redirect"] == "/_protected/" + rel.replace(os.sep, "/")
+    assert resp.headers["Content-Disposition"].startswith("attachment")
+    assert resp.headers["Content-Type"] == "application/pdf"
+    assert "X-Sendfile" not in resp.headers
+
+
+def test_x_sendfile(app, member_client, seed, monkeypatch):
+    monkeypatch.setitem(app.config, "FILE_DELIVERY", "x-sendfile")
+    path, _ = _doc(app, seed.pdf_id)
+    resp = member_client.get(f"/documents/{seed.pdf_id}/view")
+    assert resp.status_code == 200
+    assert resp.data == b""
+    assert resp.headers["X-Sendfile"] == os.path.realpath(path)
+    assert "X-Accel-Redirect" not in resp.headers
+
+
+def test_sandboxed_path_rejects_escapes(app, tmp_path):
+    outside = tmp_path / "secret.txt"
+    outside.write_text("secret")
+    root = app.config["UPLOAD_DIR"]
+    os.makedirs(root, exist_ok=True)
+    link = os.path.join(root, "escape-link.txt")
+    os.symlink(outside, link)
+    try:
+        with app.test_request_context():
+            # absolute, dot-dot, a symlink out of the tree, the root itself
+            for path in (str(outside), os.path.join(root, "..", "test.db"), link, root):
+                with pytest.raises(Forbidden):
+                    sandboxed_path(path)
+            with pytest.raises(NotFound):
+                sandboxed_path(os.path.join(root, "missing.pdf"))
+            with pytest.raises(NotFound):
+                sandboxed_path(None)
+    finally:
+        os.remove(link)
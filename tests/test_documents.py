@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from utils.querycount import assert_max_queries
+
+from tests.conftest import PDF_BYTES, query_budget
+
+
+def test_documents(member_client):
+    with assert_max_queries(query_budget("documents")):
+        resp = member_client.get("/documents")
+    assert resp.status_code == 200
+
+
+def test_documents_upload(member_client):
+    # already stored content: the blob is reused, so this is the dedupe path
+    data = {"file": (io.BytesIO(PDF_BYTES), "copy.pdf"), "note": "copy"}
+    with assert_max_queries(6):
+        resp = member_client.post("/documents/upload", data=data, content_type="multipart/form-data")
+    assert resp.status_code == 302
+
+
+def test_documents_upload_new_content(other_client):
+    data = {"file": (io.BytesIO(PDF_BYTES.replace(b"200 200", b"300 300")), "new.pdf")}
+    # + the savepoint around the blob insert
+    with assert_max_queries(query_budget("documents_upload")):
+        resp = other_client.post("/documents/upload", data=data, content_type="multipart/form-data")
+    assert resp.status_code == 302
+
+
+def test_document_download(member_client, seed):
+    with assert_max_queries(query_budget("document_download")):
+        resp = member_client.get(f"/documents/{seed.pdf_id}/download")
+    assert resp.status_code == 200
+    assert resp.data == PDF_BYTES
+
+
+def test_document_of_another_user(other_client, seed):
+    with assert_max_queries(query_budget("document_download")):
+        resp = other_client.get(f"/documents/{seed.pdf_id}/download")
+    assert resp.status_code == 403
+
+
+def test_document_view(member_client, seed):
+    with assert_max_queries(query_budget("document_view")):
+        resp = member_client.get(f"/documents/{seed.pdf_id}/view")
+    assert resp.status_code == 200
+
+
+@pytest.mark.parametrize("doc", ["pdf_id", "image_id"])
+def test_document_thumb(member_client, seed, doc):
+    with assert_max_queries(query_budget("document_thumb")):
+        resp = member_client.get(f"/documents/{getattr(seed, doc)}/thumb")
+    assert resp.status_code == 200
+
+
+@pytest.mark.parametrize("url", ["/documents/direct", "/documents/direct/complete", "/documents/direct/abort"])
+def test_direct_upload_needs_s3(member_client, url):
+    with assert_max_queries(1):
+        resp = member_client.post(url, json={})
+    assert resp.status_code == 404
@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import BrokenExecutor
+
+import pytest
+from PIL import Image
+
+from utils import imagenorm, storage
+
+
+def _png(path, size):
+    Image.new("RGB", size, (10, 120, 200)).save(path, "PNG")
+
+
+def test_normalize_downsamples(app):
+    with app.app_context():
+        src = os.path.join(storage.scratch_dir(), "big.png")
+        _png(src, (app.config["IMAGE_MAX_EDGE"] + 100, 10))
+        out = imagenorm._run_normalize(app, src, "png")
+        with Image.open(out) as im:
+            assert max(im.size) == app.config["IMAGE_MAX_EDGE"]
+        os.remove(out)
+        # already within bounds and without metadata: left alone
+        _png(src, (32, 32))
+        assert imagenorm._run_normalize(app, src, "png") is None
+
+
+def test_dead_worker_is_replaced(app):
+    with app.app_context():
+        broken, threads = imagenorm._pools(app)
+        with pytest.raises(BrokenExecutor):
+            broken.submit(os._exit, 1).result(timeout=60)
+        src = os.path.join(storage.scratch_dir(), "after-crash.png")
+        _png(src, (app.config["IMAGE_MAX_EDGE"] + 100, 10))
+
+        with pytest.raises(BrokenExecutor):
+            imagenorm._run_normalize(app, src, "png")
+        assert imagenorm._procs is None
+
+        out = imagenorm._run_normalize(app, src, "png")
+        assert out is not None
+        os.remove(out)
+        assert imagenorm._pools(app) == (imagenorm._procs, threads)
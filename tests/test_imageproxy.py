@@ -0,0 +1,29 @@
+import os
+from concurrent.futures import BrokenExecutor
+
+import pytest
+
+from utils import imageproxy
+
+URL = "/img/320/jpg/images/boxer-left.jpg"
+
+
+def test_resized_image(client):
+    resp = client.get(URL)
+    assert resp.status_code == 200
+    assert resp.mimetype == "image/jpeg"
+
+
+def test_dead_worker_is_replaced(app, client):
+    broken = imageproxy._pool(app)
+    # a worker exiting mid-task breaks the executor, as the OOM killer would
+    with pytest.raises(BrokenExecutor):
+        broken.submit(os._exit, 1).result(timeout=60)
+
+    resp = client.get("/img/640/webp/images/boxer-left.jpg")
+    assert resp.status_code == 503
+    assert imageproxy._procs is None
+
+    resp = client.get("/img/640/webp/images/boxer-left.jpg")
+    assert resp.status_code == 200
+    assert imageproxy._procs is not broken
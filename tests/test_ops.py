@@ -0,0 +1,43 @@
+from models import News, db
+from utils import metrics
+from utils.querycount import assert_max_queries
+
+from tests.conftest import query_budget
+
+
+def test_metrics_requires_login(client):
+    with assert_max_queries(query_budget("metrics_export", signed_in=False)):
+        resp = client.get("/metrics")
+    assert resp.status_code == 401
+
+
+def test_metrics_requires_admin(member_client):
+    with assert_max_queries(query_budget("metrics_export")):
+        resp = member_client.get("/metrics")
+    assert resp.status_code == 403
+
+
+def test_metrics_export(admin_client):
+    with assert_max_queries(query_budget("metrics_export")):
+        resp = admin_client.get("/metrics")
+    assert resp.status_code == 200
+
+
+def test_readyz(client):
+    with assert_max_queries(query_budget("readyz", signed_in=False)):
+        resp = client.get("/readyz")
+    assert resp.status_code == 200
+
+
+def _checkouts():
+    series = metrics._histograms.get("db_pool_checkout_seconds", {})
+    return sum(count for _, _, count in series.values())
+
+
+def test_pool_checkout_timed_after_dispose(app, seed):
+    with app.app_context():
+        db.engine.dispose()
+        before = _checkouts()
+        News.query.first()
+        db.session.remove()
+        assert _checkouts() == before + 1
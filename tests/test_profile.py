@@ -0,0 +1,72 @@
+import io
+
+from models import User, db
+from utils import avatars
+from utils.querycount import assert_max_queries
+
+from tests.conftest import png_bytes, query_budget
+
+
+def test_profile_redirects(member_client):
+    with assert_max_queries(query_budget("profile")):
+        resp = member_client.get("/profile")
+    assert resp.status_code == 302
+
+
+def test_profile_requires_login(client):
+    with assert_max_queries(0):
+        resp = client.get("/profile/overview")
+    assert resp.status_code == 302
+
+
+def test_profile_overview(member_client):
+    with assert_max_queries(query_budget("profile_overview")):
+        resp = member_client.get("/profile/overview")
+    assert resp.status_code == 200
+
+
+def test_profile_edit_page(member_client):
+    with assert_max_queries(1):
+        resp = member_client.get("/profile/edit")
+    assert resp.status_code == 200
+
+
+def test_profile_edit(member_client):
+    with assert_max_queries(2):
+        resp = member_client.post("/profile/edit", data={"full_name": "Member Name", "username": "member"})
+    assert resp.status_code == 302
+
+
+def test_profile_edit_username(other_client):
+    with assert_max_queries(query_budget("profile_edit")):
+        resp = other_client.post("/profile/edit", data={"username": "other-renamed"})
+    assert resp.status_code == 302
+
+
+def test_profile_edit_avatar(other_client):
+    data = {"avatar": (io.BytesIO(png_bytes()), "me.png")}
+    with assert_max_queries(2):
+        resp = other_client.post("/profile/edit", data=data, content_type="multipart/form-data")
+    assert resp.status_code == 302
+
+
+def test_profile_avatar(member_client):
+    with assert_max_queries(query_budget("profile_avatar")):
+        resp = member_client.get("/profile/avatar")
+    assert resp.status_code == 200
+
+
+def test_avatar_variant(app, member_client, seed):
+    with app.test_request_context():
+        url = avatars.avatar_url(db.session.get(User, seed.member_id), 64)
+    with assert_max_queries(1):
+        resp = member_client.get(url)
+    assert resp.status_code == 200
+
+
+def test_avatar_variant_of_another_user(app, admin_client, seed):
+    with app.test_request_context():
+        url = avatars.avatar_url(db.session.get(User, seed.member_id), 64)
+    with assert_max_queries(query_budget("avatar_variant")):
+        resp = admin_client.get(url)
+    assert resp.status_code == 200
@@ -0,0 +1,116 @@
+import pytest
+
+from utils.querycount import assert_max_queries
+
+from tests.conftest import query_budget
+
+PAGES = {
+    "home": "/ru/",
+    "news_list": "/ru/news",
+    "schedule_page": "/ru/schedule",
+    "trainers_page": "/ru/trainers",
+    "contact": "/ru/contact",
+    "privacy": "/ru/privacy",
+    "terms": "/ru/terms",
+    "cookies": "/ru/cookies",
+    "safety": "/ru/safety",
+    "youth": "/ru/youth",
+    "marketing": "/ru/marketing",
+}
+
+
+@pytest.mark.parametrize("endpoint", sorted(PAGES))
+def test_public_page(client, endpoint):
+    with assert_max_queries(query_budget(endpoint, signed_in=False)):
+        resp = client.get(PAGES[endpoint])
+    assert resp.status_code == 200
+
+
+@pytest.mark.parametrize("endpoint", sorted(PAGES))
+def test_public_page_signed_in(member_client, endpoint):
+    with assert_max_queries(query_budget(endpoint)):
+        resp = member_client.get(PAGES[endpoint])
+    assert resp.status_code == 200
+
+
+def test_schedule_page_inlines_critical_css(client):
+    html = client.get("/ru/schedule").get_data(as_text=True)
+    head = html.split("</head>")[0]
+    # the grid is styled from the inline block, the full sheet is preloaded
+    assert ".schedule-grid{" in head
+    assert ".plan-card{" not in head
+    assert '<link rel="preload" href="/static/dist/schedule' in head
+
+
+def test_unprefixed_page_redirects(client):
+    with assert_max_queries(0):
+        resp = client.get("/news")
+    assert resp.status_code == 302
+
+
+def test_news_detail(client, seed):
+    with assert_max_queries(query_budget("news_detail", signed_in=False)):
+        resp = client.get(f"/ru/news/{seed.news_id}")
+    assert resp.status_code == 200
+
+
+def test_news_detail_missing(client, seed):
+    with assert_max_queries(query_budget("news_detail", signed_in=False)):
+        resp = client.get("/ru/news/999999")
+    assert resp.status_code == 404
+
+
+def test_robots(client):
+    with assert_max_queries(query_budget("robots", signed_in=False)):
+        resp = client.get("/robots.txt")
+    assert resp.status_code == 200
+
+
+def test_service_worker(client):
+    with assert_max_queries(query_budget("service_worker", signed_in=False)):
+        resp = client.get("/sw.js")
+    assert resp.status_code == 200
+
+
+def test_favicon(client):
+    with assert_max_queries(query_budget("favicon", signed_in=False)):
+        resp = client.get("/favicon.ico")
+    assert resp.status_code == 200
+
+
+def test_static(client):
+    with assert_max_queries(0):
+        resp = client.get("/static/robots.txt")
+    assert resp.status_code == 200
+
+
+def test_resized_image_off_allowlist(client):
+    with assert_max_queries(query_budget("resized_image", signed_in=False)):
+        resp = client.get("/img/321/webp/images/hero.svg")
+    assert resp.status_code == 404
+
+
+def test_csrf_token(client):
+    with assert_max_queries(query_budget("csrf_token_json", signed_in=False)):
+        resp = client.get("/csrf-token")
+    assert resp.status_code == 200
+    assert resp.get_json()["token"]
+
+
+def test_send_message_without_mail_config(client):
+    with assert_max_queries(query_budget("send_message", signed_in=False)):
+        resp = client.post("/send-message", data={"name": "Ann", "email": "ann@example.com", "message": "Hi"})
+    assert resp.status_code == 302
+
+
+def test_signup(client):
+    data = {"name": "Ann", "email": "ann@example.com", "phone": "555", "activity": "boxing"}
+    with assert_max_queries(query_budget("signup", signed_in=False)):
+        resp = client.post("/signup", data=data)
+    assert resp.status_code == 302
+
+
+def test_test_mail_without_mail_config(client):
+    with assert_max_queries(query_budget("test_mail", signed_in=False)):
+        resp = client.get("/test-mail")
+    assert resp.status_code == 500
@@ -0,0 +1,22 @@
+import pytest
+
+from models import News
+from utils.querycount import assert_max_queries
+
+
+def test_every_endpoint_has_a_budget(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()} - {"static"}
+    missing = sorted(endpoints - set(app.config["SQL_QUERY_BUDGETS"]))
+    assert not missing, f"add these to SQL_QUERY_BUDGETS in config.py: {missing}"
+
+
+def test_budgets_name_existing_endpoints(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    assert not sorted(set(app.config["SQL_QUERY_BUDGETS"]) - endpoints)
+
+
+def test_assert_max_queries_lists_statements(app, seed):
+    with pytest.raises(AssertionError, match=r"expected at most 1 queries, got 2:\n  2x SELECT"):
+        with app.app_context(), assert_max_queries(1):
+            for _ in range(2):
+                News.query.filter_by(id=seed.news_id).first()
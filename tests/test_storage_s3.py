@@ -0,0 +1,179 @@
+"""S3 driver and direct browser uploads against moto's in-process S3.
+
+moto doesn't enforce ``x-amz-checksum-sha256`` on presigned requests, so
+these check what the app signs and what it does with the checksums the
+bucket reports, not the bucket's own verification.
+"""
+
+import hashlib
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+requests = pytest.importorskip("requests")
+
+from models import Blob, Document, db  # noqa: E402
+from utils import blobstore, storage, thumbnails  # noqa: E402
+
+from tests.conftest import PDF_BYTES  # noqa: E402
+
+BUCKET = "club-docs"
+
+
+@pytest.fixture
+def s3(app, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    settings = {
+        "STORAGE_BACKEND": "s3",
+        "S3_BUCKET": BUCKET,
+        "S3_REGION": "us-east-1",
+        "S3_ENDPOINT_URL": None,
+        "S3_PREFIX": "",
+        "S3_TRUST_CHECKSUMS": True,
+        "S3_MULTIPART_THRESHOLD_MB": 8,
+        "S3_PART_SIZE_MB": 5,
+    }
+    for name, value in settings.items():
+        monkeypatch.setitem(app.config, name, value)
+    monkeypatch.delitem(app.extensions, "storage_s3", raising=False)
+    with moto.mock_aws():
+        with app.app_context():
+            store = storage.get_storage()
+            store.client.create_bucket(Bucket=BUCKET)
+        yield store
+        # let background ingest and preview jobs finish inside the mock
+        blobstore._get_executor().submit(lambda: None).result()
+        thumbnails._get_executor(app).submit(lambda: None).result()
+    app.extensions.pop("storage_s3", None)
+
+
+def _pdf(tag):
+    return PDF_BYTES + f"% {tag}\n".encode()
+
+
+def _keys(store, prefix):
+    listing = store.client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return [obj["Key"] for obj in listing.get("Contents", ())]
+
+
+def test_presign_put(app, s3):
+    body = _pdf("presign")
+    sha = hashlib.sha256(body).hexdigest()
+    with app.test_request_context():
+        plan = s3.presign_put("incoming/1/put", "application/pdf", len(body), sha)
+    assert plan["method"] == "put"
+    assert plan["headers"]["x-amz-checksum-sha256"] == storage.checksum_b64(sha)
+    signed = parse_qs(urlsplit(plan["url"]).query)["X-Amz-SignedHeaders"][0].split(";")
+    assert "x-amz-checksum-sha256" in signed
+    resp = requests.put(plan["url"], data=body, headers=plan["headers"])
+    assert resp.status_code == 200
+    with app.app_context():
+        head = s3.head("incoming/1/put")
+    assert head["ContentLength"] == len(body)
+    assert head["ContentType"] == "application/pdf"
+
+
+def test_ingest_stored_dedupes(app, s3):
+    body = _pdf("ingest-stored")
+    sha = hashlib.sha256(body).hexdigest()
+    with app.app_context():
+        for key in ("incoming/1/first", "incoming/1/second"):
+            s3.client.put_object(Bucket=BUCKET, Key=key, Body=body)
+        first = blobstore.ingest_stored("incoming/1/first", sha, "pdf", len(body), "application/pdf")
+        second = blobstore.ingest_stored("incoming/1/second", sha, "pdf", len(body), "application/pdf")
+        db.session.commit()
+        assert first.sha256 == second.sha256 == sha
+        assert first.stored_path == "s3:" + blobstore.blob_key(sha, "pdf")
+        assert db.session.get(Blob, sha).ref_count == 2
+        # moved server-side once, the duplicate dropped
+        assert _keys(s3, "incoming/1/") == []
+        assert _keys(s3, "blobs/") == [blobstore.blob_key(sha, "pdf")]
+        assert s3.open(first.stored_path).read() == body
+
+
+def _upload_parts(plan, body):
+    parts = []
+    for number, part in enumerate(plan["parts"], start=1):
+        chunk = body[(number - 1) * plan["part_size"]:number * plan["part_size"]]
+        resp = requests.put(part["url"], data=chunk, headers=part["headers"])
+        assert resp.status_code == 200
+        parts.append({"number": number, "etag": resp.headers["ETag"], "checksum": part["headers"]["x-amz-checksum-sha256"]})
+    return parts
+
+
+def _start_multipart(client, body, tag):
+    part_size = 5 * 1024 * 1024
+    parts_sha256 = [
+        hashlib.sha256(body[offset:offset + part_size]).hexdigest() for offset in range(0, len(body), part_size)
+    ]
+    resp = client.post(
+        "/documents/direct", json={"filename": f"{tag}.pdf", "size": len(body), "parts_sha256": parts_sha256}
+    )
+    assert resp.status_code == 200
+    plan = resp.get_json()
+    assert plan["method"] == "multipart"
+    assert len(plan["parts"]) == len(parts_sha256)
+    return plan
+
+
+def test_multipart_upload_is_ingested_in_the_background(app, s3, member_client):
+    app.config["S3_MULTIPART_THRESHOLD_MB"] = 0
+    # two parts: a full 5 MB one and a short last one
+    body = _pdf("multipart") + b"%" * (5 * 1024 * 1024)
+    plan = _start_multipart(member_client, body, "multipart")
+    parts = _upload_parts(plan, body)
+
+    resp = member_client.post(
+        "/documents/direct/complete",
+        json={"key": plan["key"], "upload_id": plan["upload_id"], "parts": parts, "filename": "multipart.pdf"},
+    )
+    assert resp.status_code == 200
+    doc_id = resp.get_json()["id"]
+    blobstore._get_executor().submit(lambda: None).result()
+
+    sha = hashlib.sha256(body).hexdigest()
+    with app.app_context():
+        doc = db.session.get(Document, doc_id)
+        assert doc.sha256 == sha
+        assert doc.stored_path == "s3:" + blobstore.blob_key(sha, "pdf")
+        assert doc.size_bytes == len(body)
+        assert db.session.get(Blob, sha).ref_count == 1
+        assert _keys(s3, plan["key"]) == []
+
+
+def test_multipart_with_foreign_parts_is_rejected(app, s3, member_client):
+    app.config["S3_MULTIPART_THRESHOLD_MB"] = 0
+    body = _pdf("foreign-parts")
+    plan = _start_multipart(member_client, body, "foreign-parts")
+    parts = _upload_parts(plan, body)
+    parts[0]["checksum"] = storage.checksum_b64(hashlib.sha256(b"something else").hexdigest())
+
+    with app.app_context():
+        before = Document.query.count()
+    resp = member_client.post(
+        "/documents/direct/complete",
+        json={"key": plan["key"], "upload_id": plan["upload_id"], "parts": parts, "filename": "foreign-parts.pdf"},
+    )
+    assert resp.status_code == 400
+    with app.app_context():
+        assert Document.query.count() == before
+        assert _keys(s3, plan["key"]) == []
+
+
+def test_multipart_needs_part_hashes(app, s3, member_client):
+    app.config["S3_MULTIPART_THRESHOLD_MB"] = 0
+    resp = member_client.post("/documents/direct", json={"filename": "x.pdf", "size": 100, "parts_sha256": []})
+    assert resp.status_code == 400
+
+
+def test_multipart_abort(app, s3, member_client):
+    app.config["S3_MULTIPART_THRESHOLD_MB"] = 0
+    plan = _start_multipart(member_client, _pdf("abort"), "abort")
+    assert s3.client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+    resp = member_client.post("/documents/direct/abort", json={"key": plan["key"], "upload_id": plan["upload_id"]})
+    assert resp.status_code == 200
+    assert not s3.client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
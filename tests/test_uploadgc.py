@@ -0,0 +1,72 @@
+import os
+import time
+
+from models import Blob, db
+from utils import storage, uploadgc
+
+from tests.conftest import PDF_BYTES, make_user, store_document
+
+DAY = 24 * 3600
+
+
+def _orphan(name, age_seconds):
+    path = os.path.join(storage.local_storage().root, "orphans", name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(b"orphan")
+    stamp = time.time() - age_seconds
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_gc_removes_only_orphans_past_the_grace_period(app, seed):
+    with app.app_context():
+        user = make_user("gc-keep@example.com")
+        doc = store_document(user, "keep.pdf", PDF_BYTES + b"% gc keep\n", "pdf", "application/pdf")
+        db.session.commit()
+        # referenced files are kept however old they are
+        os.utime(doc.stored_path, (time.time() - 2 * DAY,) * 2)
+        old = _orphan("old.bin", 2 * DAY)
+        young = _orphan("young.bin", 60)
+
+        stats = uploadgc.collect(grace_hours=24)
+
+        assert not os.path.exists(old)
+        assert os.path.exists(young)
+        assert os.path.exists(doc.stored_path)
+        assert stats["orphans"] == 1
+        assert stats["young"] >= 1
+
+
+def test_gc_dry_run_keeps_everything(app, seed):
+    old = None
+    with app.app_context():
+        old = _orphan("dry-run.bin", 2 * DAY)
+    result = app.test_cli_runner().invoke(args=["gc-uploads", "--dry-run", "--grace-hours", "24"])
+    assert result.exit_code == 0
+    assert result.output.startswith("[dry-run] ")
+    assert "orphans=1" in result.output
+    assert os.path.exists(old)
+    os.remove(old)
+
+
+def test_gc_reconciles_ref_counts_and_usage(app, seed):
+    with app.app_context():
+        user = make_user("gc-drift@example.com")
+        doc = store_document(user, "drift.pdf", PDF_BYTES + b"% gc drift\n", "pdf", "application/pdf")
+        db.session.commit()
+        stray = Blob(sha256="0" * 64, stored_path=doc.stored_path + ".stray", size_bytes=1, ref_count=1)
+        db.session.add(stray)
+        db.session.get(Blob, doc.sha256).ref_count = 5
+        user.storage_files = 9
+        db.session.commit()
+
+        stats = uploadgc.collect(grace_hours=24)
+
+        assert stats["blobs_fixed"] == 1
+        assert stats["blobs_dropped"] == 1
+        assert stats["usage_fixed"] >= 1
+        assert db.session.get(Blob, doc.sha256).ref_count == 1
+        assert db.session.get(Blob, "0" * 64) is None
+        db.session.refresh(user)
+        assert (user.storage_bytes, user.storage_files) == (doc.size_bytes, 1)
@@ -0,0 +1,75 @@
+from models import Document, User, db
+from utils import usage
+
+from tests.conftest import PDF_BYTES, make_user, store_document
+
+
+def _pdf(tag):
+    return PDF_BYTES + f"% {tag}\n".encode()
+
+
+def _counters(user):
+    db.session.refresh(user)
+    return user.storage_bytes, user.storage_files
+
+
+def test_counters_follow_documents(app, seed):
+    with app.app_context():
+        alice = make_user("usage-alice@example.com")
+        bob = make_user("usage-bob@example.com")
+        docs = [store_document(alice, f"{i}.pdf", _pdf(f"usage {i}"), "pdf", "application/pdf") for i in range(3)]
+        db.session.commit()
+        sizes = [doc.size_bytes for doc in docs]
+        assert _counters(alice) == (sum(sizes), 3)
+
+        db.session.delete(docs[0])
+        db.session.commit()
+        assert _counters(alice) == (sizes[1] + sizes[2], 2)
+
+        docs[1].user_id = bob.id
+        db.session.commit()
+        assert _counters(alice) == (sizes[2], 1)
+        assert _counters(bob) == (sizes[1], 1)
+
+        docs[2].user = bob
+        docs[2].size_bytes = 10
+        db.session.commit()
+        assert _counters(alice) == (0, 0)
+        assert _counters(bob) == (sizes[1] + 10, 2)
+
+        assert usage.rebuild() == 0
+
+
+def test_resized_document(app, seed):
+    with app.app_context():
+        user = make_user("usage-resize@example.com")
+        doc = store_document(user, "a.pdf", _pdf("resize"), "pdf", "application/pdf")
+        db.session.commit()
+        doc.size_bytes = 7
+        db.session.commit()
+        assert _counters(user) == (7, 1)
+
+
+def test_deleting_a_user_drops_their_documents(app, seed):
+    with app.app_context():
+        user = make_user("usage-gone@example.com")
+        for i in range(2):
+            store_document(user, f"{i}.pdf", _pdf(f"gone {i}"), "pdf", "application/pdf")
+        db.session.commit()
+        user_id = user.id
+        db.session.delete(user)
+        db.session.commit()
+        assert Document.query.filter_by(user_id=user_id).count() == 0
+        assert db.session.get(User, user_id) is None
+        assert usage.rebuild() == 0
+
+
+def test_quota(app, seed):
+    with app.test_request_context():
+        limit = usage.quota_bytes()
+        user = make_user("usage-quota@example.com", storage_bytes=limit - 10)
+        admin = make_user("usage-quota-admin@example.com", role="admin", storage_bytes=limit)
+        assert usage.quota_allows(user, 10)
+        assert not usage.quota_allows(user, 11)
+        assert usage.quota_allows(admin, 1)
+        db.session.rollback()
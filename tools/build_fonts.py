@@ -0,0 +1,156 @@
+"""Сборка шрифтов сайта: WOFF2-подмножества Roboto, Montserrat, Anton и Russo One.
+
+    python tools/build_fonts.py                     # скачать исходники и собрать изменившиеся
+    python tools/build_fonts.py --force             # пересобрать всё
+    python tools/build_fonts.py --source-dir ~/ttf  # взять TTF из каталога вместо скачивания
+
+Исходные TTF берутся из репозитория google/fonts (кэш — .font-cache/ в корне
+проекта), переменные шрифты фиксируются на нужной насыщенности. В подмножество
+попадают латиница с Latin-1 и эстонскими Š/Ž, кириллица и типографская
+пунктуация — этого хватает для ru/en/et. Результат пишется в
+static/fonts/<семейство>-<насыщенность>.woff2, а описание начертаний — в
+static/fonts/manifest.json, по которому utils/fonts.py выводит @font-face.
+Начертание пропускается, если sha256 исходника и набор символов не изменились.
+
+Нужен fontTools с поддержкой WOFF2: pip install "fonttools[woff]".
+"""
+
+import argparse
+import hashlib
+import json
+import urllib.request
+from pathlib import Path
+
+from fontTools import subset
+from fontTools.ttLib import TTFont
+from fontTools.varLib import instancer
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FONTS_DIR = BASE_DIR / "static" / "fonts"
+MANIFEST = FONTS_DIR / "manifest.json"
+CACHE_DIR = BASE_DIR / ".font-cache"
+SOURCE_URL = "https://raw.githubusercontent.com/google/fonts/main/"
+
+# Семейство, насыщенность, путь исходника в google/fonts. Набор начертаний —
+# тот же, что раньше запрашивался у Google Fonts в base.html.
+FACES = [
+    ("Roboto", 300, "ofl/roboto/Roboto[wdth,wght].ttf"),
+    ("Roboto", 400, "ofl/roboto/Roboto[wdth,wght].ttf"),
+    ("Roboto", 700, "ofl/roboto/Roboto[wdth,wght].ttf"),
+    ("Montserrat", 400, "ofl/montserrat/Montserrat[wght].ttf"),
+    ("Montserrat", 500, "ofl/montserrat/Montserrat[wght].ttf"),
+    ("Montserrat", 700, "ofl/montserrat/Montserrat[wght].ttf"),
+    ("Anton", 400, "ofl/anton/Anton-Regular.ttf"),
+    ("Russo One", 400, "ofl/russoone/RussoOne-Regular.ttf"),
+]
+
+# Латиница + Latin-1 (эстонские õ ä ö ü), Š š Ž ž, пунктуация, €, №; кириллица
+UNICODE_RANGE = (
+    "U+0000-00FF, U+0131, U+0152-0153, U+0160-0161, U+017D-017E, U+02BB-02BC, U+02C6, U+02DA, U+02DC, "
+    "U+0400-045F, U+0490-0491, U+04B0-04B1, U+2000-206F, U+20AC, U+2116, U+2122, U+2191, U+2193, "
+    "U+2212, U+2215, U+FEFF, U+FFFD"
+)
+LAYOUT_FEATURES = ["kern", "liga", "calt", "ccmp", "locl", "mark", "mkmk", "case", "tnum", "lnum"]
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_unicode_range(spec: str):
+    codepoints = set()
+    for part in spec.split(","):
+        lo, _, hi = part.strip()[2:].partition("-")
+        codepoints.update(range(int(lo, 16), int(hi or lo, 16) + 1))
+    return codepoints
+
+
+def output_name(family: str, weight: int) -> str:
+    return f"{family.lower().replace(' ', '-')}-{weight}.woff2"
+
+
+def fetch_source(rel: str, source_dir) -> Path:
+    """Путь к исходному TTF: из --source-dir или скачанный в кэш."""
+    name = Path(rel).name
+    if source_dir:
+        path = Path(source_dir) / name
+        if not path.exists():
+            raise FileNotFoundError(f"Font source not found: {path}")
+        return path
+    path = CACHE_DIR / name
+    if not path.exists():
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        url = SOURCE_URL + urllib.request.quote(rel)
+        print("download", url)
+        tmp = path.with_suffix(".part")
+        with urllib.request.urlopen(url, timeout=60) as resp, open(tmp, "wb") as fh:
+            fh.write(resp.read())
+        tmp.replace(path)
+    return path
+
+
+def build_face(src: Path, weight: int, out: Path) -> None:
+    font = TTFont(src)
+    if "fvar" in font:
+        # фиксируем все оси: wght — на нужном значении, остальные — по умолчанию
+        axes = {a.axisTag: (weight if a.axisTag == "wght" else a.defaultValue) for a in font["fvar"].axes}
+        font = instancer.instantiateVariableFont(font, axes, updateFontNames=False)
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = LAYOUT_FEATURES
+    options.hinting = False
+    options.name_IDs = [0, 1, 2, 3, 4, 5, 6]
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=parse_unicode_range(UNICODE_RANGE))
+    subsetter.subset(font)
+    font.flavor = "woff2"
+    tmp = out.with_suffix(".part")
+    font.save(tmp)
+    tmp.replace(out)
+
+
+def build_all(force: bool = False, source_dir=None):
+    FONTS_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = json.loads(MANIFEST.read_text()) if MANIFEST.exists() else {}
+    wanted = {}
+    for family, weight, rel in FACES:
+        name = output_name(family, weight)
+        src = fetch_source(rel, source_dir)
+        sha = file_sha256(src)
+        entry = manifest.get(name)
+        if (
+            not force
+            and entry
+            and entry.get("source_sha256") == sha
+            and entry.get("unicode_range") == UNICODE_RANGE
+            and (FONTS_DIR / name).exists()
+        ):
+            print("up to date", name)
+        else:
+            build_face(src, weight, FONTS_DIR / name)
+            entry = {
+                "family": family,
+                "weight": weight,
+                "style": "normal",
+                "source_sha256": sha,
+                "unicode_range": UNICODE_RANGE,
+                "size": (FONTS_DIR / name).stat().st_size,
+            }
+            print(f"built {name} ({entry['size'] // 1024} KB)")
+        wanted[name] = entry
+    for stale in set(manifest) - set(wanted):
+        (FONTS_DIR / stale).unlink(missing_ok=True)
+    MANIFEST.write_text(json.dumps(wanted, indent=2, sort_keys=True) + "\n")
+    print("Fonts in", FONTS_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="rebuild every face")
+    parser.add_argument("--source-dir", help="directory with the source TTF files (no download)")
+    args = parser.parse_args()
+    build_all(force=args.force, source_dir=args.source_dir)
@@ -1,48 +1,261 @@
+"""Сборка статических изображений: фавиконки, OG-картинка, адаптивные варианты и метаданные.
+
+    python tools/generate_icons.py            # пересобрать только изменившиеся
+    python tools/generate_icons.py --force    # пересобрать всё
+
+Адаптивные варианты (AVIF/WebP + JPEG или PNG для прозрачных) пишутся в
+static/images/build/<имя>-<ширина>.<ext>, а описание — в
+static/images/build/manifest.json, который читает utils/responsive.py.
+Исходник пропускается, если его sha256 совпадает с записанным в манифесте
+и все варианты на месте.
+
+Для каждой растровой картинки в static/images (кроме build/ и favicon/)
+в static/images/build/meta.json записываются ширина, высота, преобладающий
+цвет и крошечная размытая заглушка (data:-URI), которые шаблоны ставят
+в width/height и фон <img>, пока грузится сама картинка.
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
 from pathlib import Path
-from PIL import Image
+from urllib.parse import quote
+from PIL import Image, ImageOps
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-src_logo = BASE_DIR / "static" / "images" / "logo_header.png"
-src_hero = BASE_DIR / "static" / "images" / "mainheader.png"
-fav_dir = BASE_DIR / "static" / "images" / "favicon"
-fav_dir.mkdir(parents=True, exist_ok=True)
-
-# --- FAVICONS из логотипа ---
-if not src_logo.exists():
-    raise FileNotFoundError(f"Logo not found: {src_logo}")
-
-img = Image.open(src_logo).convert("RGBA")
-
-sizes = [
-    ("favicon-16x16.png", (16, 16)),
-    ("favicon-32x32.png", (32, 32)),
-    ("favicon-192.png", (192, 192)),
-    ("favicon-512.png", (512, 512)),
-]
-
-for name, size in sizes:
-    resized = img.resize(size, Image.LANCZOS)
-    resized.save(fav_dir / name, format="PNG")
-
-# Apple Touch Icon (180x180)
-apple = img.resize((180, 180), Image.LANCZOS)
-apple.save(fav_dir / "apple-touch-icon.png", format="PNG")
-
-# favicon.ico (16,32,48 в одном ICO)
-ico_sizes = [(16, 16), (32, 32), (48, 48)]
-ico_images = [img.resize(s, Image.LANCZOS) for s in ico_sizes]
-ico_path = fav_dir / "favicon.ico"
-ico_images[0].save(ico_path, format="ICO", sizes=ico_sizes)
-
-print("Favicons generated in", fav_dir)
-
-# --- OG IMAGE из mainheader ---
-if src_hero.exists():
-    hero = Image.open(src_hero).convert("RGB")
-    og_size = (1200, 630)
-    hero = hero.resize(og_size, Image.LANCZOS)
-    og_path = BASE_DIR / "static" / "images" / "og-image.jpg"
-    hero.save(og_path, format="JPEG", quality=90)
-    print("OG image saved to", og_path)
-else:
-    print("mainheader.png not found, skip og-image generation")
+IMAGES_DIR = BASE_DIR / "static" / "images"
+BUILD_DIR = IMAGES_DIR / "build"
+MANIFEST = BUILD_DIR / "manifest.json"
+META_INDEX = BUILD_DIR / "meta.json"
+src_logo = IMAGES_DIR / "logo_header.png"
+src_hero = IMAGES_DIR / "mainheader.png"
+fav_dir = IMAGES_DIR / "favicon"
+
+# Карточки на главной не шире ~600 px: 1280 покрывает двойную плотность экрана
+DEFAULT_WIDTHS = (320, 640, 960, 1280)
+# Исходник -> ширины вариантов (не больше ширины исходника)
+RESPONSIVE = {
+    "mainheader.png": (640, 960, 1280, 1920, 2560),
+    "boxer-left.jpg": DEFAULT_WIDTHS,
+    "boxer-right.jpg": DEFAULT_WIDTHS,
+    "boxing.jfif": DEFAULT_WIDTHS,
+    "kickboxing.jpg": DEFAULT_WIDTHS,
+    "wrestling.jpg": DEFAULT_WIDTHS,
+    "client-children.avif": DEFAULT_WIDTHS,
+    "client-teenagers.jpg": DEFAULT_WIDTHS,
+    "client-adults.jpg": DEFAULT_WIDTHS,
+    "client-elderly.png": DEFAULT_WIDTHS,
+    "logo_header.png": (60, 130, 180, 260),
+    "logo.png": (160, 320, 500, 1000),
+}
+QUALITY = {"avif": 55, "webp": 78, "jpg": 82}
+META_EXTS = {".jpg", ".jpeg", ".jfif", ".png", ".webp", ".avif", ".gif"}
+META_SKIP_DIRS = {"build", "favicon"}
+# Заглушка: длинная сторона в пикселях; браузер растягивает её под SVG-размытием
+PLACEHOLDER_PX = 16
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_favicons():
+    # --- FAVICONS из логотипа ---
+    if not src_logo.exists():
+        raise FileNotFoundError(f"Logo not found: {src_logo}")
+    fav_dir.mkdir(parents=True, exist_ok=True)
+
+    img = Image.open(src_logo).convert("RGBA")
+
+    sizes = [
+        ("favicon-16x16.png", (16, 16)),
+        ("favicon-32x32.png", (32, 32)),
+        ("favicon-192.png", (192, 192)),
+        ("favicon-512.png", (512, 512)),
+    ]
+
+    for name, size in sizes:
+        resized = img.resize(size, Image.LANCZOS)
+        resized.save(fav_dir / name, format="PNG")
+
+    # Apple Touch Icon (180x180)
+    apple = img.resize((180, 180), Image.LANCZOS)
+    apple.save(fav_dir / "apple-touch-icon.png", format="PNG")
+
+    # favicon.ico (16,32,48 в одном ICO)
+    ico_sizes = [(16, 16), (32, 32), (48, 48)]
+    ico_images = [img.resize(s, Image.LANCZOS) for s in ico_sizes]
+    ico_path = fav_dir / "favicon.ico"
+    ico_images[0].save(ico_path, format="ICO", sizes=ico_sizes)
+
+    print("Favicons generated in", fav_dir)
+
+
+def build_og_image():
+    # --- OG IMAGE из mainheader ---
+    if src_hero.exists():
+        hero = Image.open(src_hero).convert("RGB")
+        og_size = (1200, 630)
+        hero = hero.resize(og_size, Image.LANCZOS)
+        og_path = IMAGES_DIR / "og-image.jpg"
+        hero.save(og_path, format="JPEG", quality=90)
+        print("OG image saved to", og_path)
+    else:
+        print("mainheader.png not found, skip og-image generation")
+
+
+def _has_alpha(img: Image.Image) -> bool:
+    if img.mode != "RGBA":
+        return False
+    lo, _ = img.getchannel("A").getextrema()
+    return lo < 255
+
+
+def _variant_names(stem: str, widths, formats):
+    return [f"{stem}-{w}.{fmt}" for w in widths for fmt in formats]
+
+
+def build_responsive(name: str, widths, entry, force: bool):
+    """Собрать варианты одного исходника; возвращает запись манифеста."""
+    src = IMAGES_DIR / name
+    sha = file_sha256(src)
+    stem = Path(name).stem
+    if (
+        not force
+        and entry
+        and entry.get("sha256") == sha
+        and entry.get("requested") == list(widths)
+        and all((BUILD_DIR / v).exists() for v in _variant_names(stem, entry["widths"], entry["formats"]))
+    ):
+        return entry, False
+
+    with Image.open(src) as im:
+        img = ImageOps.exif_transpose(im)
+        img = img.convert("RGBA") if img.mode in ("P", "LA", "RGBA") else img.convert("RGB")
+    alpha = _has_alpha(img)
+    if not alpha:
+        img = img.convert("RGB")
+    fallback = "png" if alpha else "jpg"
+    formats = ["avif", "webp", fallback]
+
+    src_w, src_h = img.size
+    out_widths = sorted({min(w, src_w) for w in widths})
+    for old in BUILD_DIR.glob(f"{stem}-*.*"):
+        old.unlink()
+    for w in out_widths:
+        h = round(src_h * w / src_w)
+        resized = img.resize((w, h), Image.LANCZOS) if w != src_w else img
+        for fmt in formats:
+            path = BUILD_DIR / f"{stem}-{w}.{fmt}"
+            if fmt == "avif":
+                resized.save(path, format="AVIF", quality=QUALITY["avif"], speed=4)
+            elif fmt == "webp":
+                resized.save(path, format="WEBP", quality=QUALITY["webp"], method=6)
+            elif fmt == "jpg":
+                resized.save(path, format="JPEG", quality=QUALITY["jpg"], optimize=True, progressive=True)
+            else:
+                resized.save(path, format="PNG", optimize=True)
+    top = out_widths[-1]
+    return {
+        "sha256": sha,
+        "requested": list(widths),
+        "widths": out_widths,
+        "formats": formats,
+        "width": top,
+        "height": round(src_h * top / src_w),
+    }, True
+
+
+def build_all_responsive(force: bool = False):
+    BUILD_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = json.loads(MANIFEST.read_text()) if MANIFEST.exists() else {}
+    for name, widths in RESPONSIVE.items():
+        if not (IMAGES_DIR / name).exists():
+            print("skip, not found:", name)
+            continue
+        manifest[name], built = build_responsive(name, widths, manifest.get(name), force)
+        print("built" if built else "up to date", name)
+    for stale in set(manifest) - set(RESPONSIVE):
+        manifest.pop(stale)
+    MANIFEST.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    print("Responsive images in", BUILD_DIR)
+
+
+def _dominant_color(img: Image.Image) -> str:
+    small = img.convert("RGB")
+    small.thumbnail((64, 64))
+    pal = small.quantize(colors=5)
+    count, index = max(pal.getcolors())
+    r, g, b = pal.getpalette()[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _placeholder(img: Image.Image) -> str:
+    """Размытая заглушка: WebP 16 px внутри SVG с feGaussianBlur."""
+    tiny = img.convert("RGB")
+    tiny.thumbnail((PLACEHOLDER_PX, PLACEHOLDER_PX), Image.LANCZOS)
+    buf = io.BytesIO()
+    tiny.save(buf, format="WEBP", quality=50)
+    w, h = tiny.size
+    data = base64.b64encode(buf.getvalue()).decode("ascii")
+    svg = (
+        f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {w} {h}' preserveAspectRatio='none'>"
+        "<filter id='b' color-interpolation-filters='sRGB'><feGaussianBlur stdDeviation='1'/>"
+        "<feComponentTransfer><feFuncA type='discrete' tableValues='1 1'/></feComponentTransfer></filter>"
+        f"<image width='{w}' height='{h}' preserveAspectRatio='none' filter='url(#b)' "
+        f"href='data:image/webp;base64,{data}'/></svg>"
+    )
+    return "data:image/svg+xml," + quote(svg, safe=" =:/;,#()")
+
+
+def build_image_meta(path: Path, entry, force: bool):
+    """Запись meta.json для одной картинки; возвращает (запись, пересобрана ли)."""
+    sha = file_sha256(path)
+    if not force and entry and entry.get("sha256") == sha:
+        return entry, False
+    with Image.open(path) as im:
+        img = ImageOps.exif_transpose(im)
+        img = img.convert("RGBA") if img.mode in ("P", "LA", "RGBA") else img.convert("RGB")
+    alpha = _has_alpha(img)
+    return {
+        "sha256": sha,
+        "width": img.width,
+        "height": img.height,
+        "color": _dominant_color(img),
+        # у прозрачных картинок заглушка просвечивала бы сквозь них
+        "placeholder": None if alpha else _placeholder(img),
+    }, True
+
+
+def build_image_index(force: bool = False):
+    BUILD_DIR.mkdir(parents=True, exist_ok=True)
+    index = json.loads(META_INDEX.read_text()) if META_INDEX.exists() else {}
+    fresh = {}
+    for path in sorted(IMAGES_DIR.rglob("*")):
+        rel = path.relative_to(IMAGES_DIR)
+        if path.suffix.lower() not in META_EXTS or rel.parts[0] in META_SKIP_DIRS:
+            continue
+        key = "images/" + rel.as_posix()
+        fresh[key], built = build_image_meta(path, index.get(key), force)
+        if built:
+            print("meta", key)
+    META_INDEX.write_text(json.dumps(fresh, indent=2, sort_keys=True) + "\n")
+    print("Image metadata in", META_INDEX)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="rebuild every responsive image")
+    parser.add_argument("--skip-icons", action="store_true", help="only build responsive images")
+    args = parser.parse_args()
+    if not args.skip_icons:
+        build_favicons()
+        build_og_image()
+    build_all_responsive(force=args.force)
+    build_image_index(force=args.force)
@@ -0,0 +1,165 @@
+"""Content-hashed static URLs.
+
+``url_for('static', filename='css/style.css')`` becomes
+``/static/css/style.3f2a9c1b2d4e.css``, where the hash is the first
+``HASH_LEN`` hex digits of the file's sha256. Those URLs are served with
+``Cache-Control: public, max-age=31536000, immutable``, so repeat views
+make no static requests at all; a changed file gets a new URL.
+
+The map comes from ``static/assets-manifest.json`` when it exists (written
+by ``flask build-assets`` at deploy time, so workers never hash at runtime).
+Without it, files are hashed lazily on first use and re-hashed when their
+mtime or size changes, which keeps development edits visible.
+
+Precompressed ``.br``/``.gz`` siblings (see ``utils/compress.py``) share
+the original's URL: the view picks one by ``Accept-Encoding``.
+"""
+
+import hashlib
+import json
+import os
+import re
+import stat
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import current_app, send_from_directory
+
+from utils import compress, fragcache
+
+HASH_LEN = 12
+MANIFEST_NAME = "assets-manifest.json"
+IMMUTABLE_MAX_AGE = 31536000
+# Files whose URLs other sites or crawlers know by name
+UNHASHED = frozenset({MANIFEST_NAME, "robots.txt", "sitemap.xml", "images/favicon/site.webmanifest"})
+
+_HASHED_RE = re.compile(rf"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{{{HASH_LEN}}})(?P<ext>\.[^./]+)$")
+
+_manifest: Optional[Dict[str, str]] = None
+_lazy: Dict[str, Tuple[int, int, str]] = {}
+_lock = threading.Lock()
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()[:HASH_LEN]
+
+
+def _with_hash(filename: str, digest: str) -> str:
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+def build(static_folder: str) -> Dict[str, str]:
+    """Hash every static file and write the manifest; returns it."""
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            if rel in UNHASHED or not os.path.splitext(rel)[1]:
+                continue
+            if name.endswith(tuple(compress.SUFFIXES.values())) and os.path.isfile(path[:-3]):
+                # a precompressed sibling is served under the original's URL
+                continue
+            manifest[rel] = _with_hash(rel, _file_hash(path))
+    tmp = os.path.join(static_folder, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=0, sort_keys=True)
+    os.replace(tmp, os.path.join(static_folder, MANIFEST_NAME))
+    reset()
+    return manifest
+
+
+def reset() -> None:
+    global _manifest
+    with _lock:
+        _manifest = None
+        _lazy.clear()
+    fragcache.invalidate()
+
+
+def _load_manifest(static_folder: str) -> Dict[str, str]:
+    global _manifest
+    if _manifest is None:
+        with _lock:
+            if _manifest is None:
+                try:
+                    with open(os.path.join(static_folder, MANIFEST_NAME), encoding="utf-8") as fh:
+                        _manifest = json.load(fh)
+                except (OSError, ValueError):
+                    _manifest = {}
+    return _manifest
+
+
+def has_manifest(static_folder: str) -> bool:
+    return bool(_load_manifest(static_folder))
+
+
+def hashed_name(filename: str, static_folder: Optional[str] = None) -> str:
+    """``filename`` with its content hash inserted, or unchanged if it isn't a hashable file."""
+    static_folder = static_folder or current_app.static_folder
+    manifest = _load_manifest(static_folder)
+    if manifest:
+        return manifest.get(filename, filename)
+    if filename in UNHASHED or not os.path.splitext(filename)[1]:
+        return filename
+    path = os.path.join(static_folder, filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return filename
+    if not stat.S_ISREG(st.st_mode):
+        return filename
+    cached = _lazy.get(filename)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    hashed = _with_hash(filename, _file_hash(path))
+    with _lock:
+        _lazy[filename] = (st.st_mtime_ns, st.st_size, hashed)
+    return hashed
+
+
+def resolve(filename: str) -> Tuple[str, bool]:
+    """Map a requested static path to ``(file on disk, served under its current hash)``."""
+    m = _HASHED_RE.match(filename)
+    if m is None:
+        return filename, False
+    original = m.group("stem") + m.group("ext")
+    if not os.path.isfile(os.path.join(current_app.static_folder, original)):
+        # a real file that merely looks hashed
+        return filename, False
+    return original, hashed_name(original) == filename
+
+
+def init_assets(app) -> None:
+    """Emit hashed URLs from ``url_for('static')`` and serve them as immutable."""
+
+    @app.url_defaults
+    def _hashed_static(endpoint, values):
+        if endpoint == "static" and "filename" in values and app.config.get("STATIC_HASHED_URLS", True):
+            values["filename"] = hashed_name(values["filename"], app.static_folder)
+
+    def static(filename):
+        original, current = resolve(filename)
+        sibling = compress.precompressed_sibling(app.static_folder, original)
+        if not current:
+            # unversioned, or a stale hash from before a deploy: normal revalidation
+            resp = send_from_directory(
+                app.static_folder, sibling or original, max_age=app.get_send_file_max_age(original)
+            )
+        else:
+            resp = send_from_directory(app.static_folder, sibling or original, max_age=IMMUTABLE_MAX_AGE)
+            resp.cache_control.public = True
+            resp.cache_control.immutable = True
+        if os.path.splitext(original)[1] in compress.PRECOMPRESS_EXTS:
+            resp.vary.add("Accept-Encoding")
+        return resp
+
+    app.view_functions["static"] = static
@@ -0,0 +1,125 @@
+"""Avatar thumbnails: square WebP/JPEG variants rendered off the request thread.
+
+For an avatar stored at ``.../avatar_<token>.png`` the variants are written
+next to it (same storage driver) as ``avatar_<token>_<size>.<ext>``. The
+token changes with every upload, so variant URLs can be cached forever.
+"""
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+
+from utils import storage
+
+
+SIZES = (48, 128, 256)
+FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# One render per source at a time; concurrent callers wait for it
+_render_locks: dict = {}
+
+
+def avatar_token(avatar_path: Optional[str]) -> Optional[str]:
+    if not avatar_path:
+        return None
+    stem = os.path.splitext(os.path.basename(avatar_path))[0]
+    return stem[len("avatar_"):] if stem.startswith("avatar_") else stem
+
+
+def variant_path(avatar_path: str, size: int, ext: str) -> str:
+    return storage.sibling(avatar_path, f"_{size}.{ext}")
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _executor_lock:
+        lock = _render_locks.get(path)
+        if lock is None:
+            lock = _render_locks[path] = threading.Lock()
+        return lock
+
+
+def render_variants(src_path: str) -> None:
+    """Write every size/format variant for ``src_path`` (atomic per file)."""
+    store = storage.for_ref(src_path)
+    with _lock_for(src_path):
+        if all(store.exists(variant_path(src_path, s, e)) for s in SIZES for e in FORMATS):
+            return
+        with store.local_file(src_path) as local, Image.open(local) as im:
+            im = ImageOps.exif_transpose(im)
+            if im.mode not in ("RGB", "L"):
+                # flatten transparency onto the dark page background
+                bg = Image.new("RGB", im.size, (20, 20, 20))
+                bg.paste(im.convert("RGBA"), mask=im.convert("RGBA").split()[-1])
+                im = bg
+            else:
+                im = im.convert("RGB")
+            # avatars are shown as circles with object-fit: cover, so crop square
+            square = ImageOps.fit(im, (max(SIZES), max(SIZES)), Image.LANCZOS)
+        for size in SIZES:
+            thumb = square if size == max(SIZES) else square.resize((size, size), Image.LANCZOS)
+            for ext, fmt in FORMATS.items():
+                fd, tmp = tempfile.mkstemp(dir=storage.scratch_dir(), suffix=f".{ext}")
+                os.close(fd)
+                opts = {"quality": 82, "method": 4} if fmt == "WEBP" else {"quality": 85, "optimize": True, "progressive": True}
+                try:
+                    thumb.save(tmp, format=fmt, **opts)
+                    store.save(tmp, variant_path(src_path, size, ext), f"image/{'jpeg' if ext == 'jpg' else ext}")
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+    with _executor_lock:
+        _render_locks.pop(src_path, None)
+
+
+def _get_executor(app) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(app.config.get("AVATAR_WORKERS", 2)),
+                thread_name_prefix="avatar",
+            )
+        return _executor
+
+
+def schedule_variants(src_path: str) -> None:
+    """Render variants in the background pool; failures are only logged."""
+    app = current_app._get_current_object()
+
+    def _done(fut):
+        exc = fut.exception()
+        if exc is not None:
+            app.logger.warning("avatar: variant rendering failed", extra={"path": src_path, "error": str(exc)})
+
+    def _run():
+        with app.app_context():
+            render_variants(src_path)
+
+    _get_executor(app).submit(_run).add_done_callback(_done)
+
+
+def ensure_variant(src_path: str, size: int, ext: str) -> str:
+    """Ref of the requested variant, rendering synchronously if the pool hasn't yet."""
+    path = variant_path(src_path, size, ext)
+    if not storage.for_ref(src_path).exists(path):
+        render_variants(src_path)
+    return path
+
+
+def avatar_url(user, size: int, ext: str = "jpg") -> Optional[str]:
+    token = avatar_token(getattr(user, "avatar_path", None))
+    if not token:
+        return None
+    size = min((s for s in SIZES if s >= size), default=max(SIZES))
+    return url_for("avatar_variant", user_id=user.id, token=token, size=size, ext=ext)
+
+
+def avatar_srcset(user, ext: str = "jpg") -> str:
+    return ", ".join(f"{avatar_url(user, s, ext)} {s}w" for s in SIZES)
@@ -0,0 +1,276 @@
+"""Content-addressed, reference-counted document storage.
+
+Files live at ``blobs/<aa>/<bb>/<sha256>.<ext>`` in the configured storage
+(``UPLOAD_DIR`` or the S3 bucket, see ``utils.storage``); a ``Blob`` row
+tracks how many ``Document`` rows point at it. Identical uploads share one
+file, deleting a document decrements the count, and the file is removed
+once the last reference is gone and the transaction has committed.
+
+A direct multipart upload (see ``utils.storage``) is registered before its
+content hash is known: the bucket only checksums the parts. The document
+points at its ``incoming/`` object until ``schedule_ingest`` has hashed it
+in the background and moved it under its blob key.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Blob, Document
+from utils import storage
+from utils.thumbnails import no_thumb_path, thumb_path
+
+
+BLOBS_DIRNAME = "blobs"
+STAGING_DIRNAME = ".staging"
+_PENDING_KEY = "blobstore_unlink"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def blobs_root() -> str:
+    return os.path.join(current_app.config.get("UPLOAD_DIR", "./uploads"), BLOBS_DIRNAME)
+
+
+def staging_dir() -> str:
+    """Where uploads are saved before ``ingest`` moves them under their hash."""
+    return os.path.join(blobs_root(), STAGING_DIRNAME)
+
+
+def blob_key(sha256: str, ext: str) -> str:
+    ext = (ext or "").lstrip(".").lower()
+    name = f"{sha256}.{ext}" if ext else sha256
+    return "/".join((BLOBS_DIRNAME, sha256[:2], sha256[2:4], name))
+
+
+def _same_file(path: Optional[str], ref: Optional[str]) -> bool:
+    if not path or not ref:
+        return False
+    if ref.startswith(storage.S3_SCHEME):
+        return path == ref
+    return os.path.realpath(path) == os.path.realpath(ref)
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stored_sha256(ref: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a stored object, streamed from its storage driver."""
+    h = hashlib.sha256()
+    body = storage.for_ref(ref).open(ref)
+    try:
+        for chunk in iter(lambda: body.read(chunk_size), b""):
+            h.update(chunk)
+    finally:
+        body.close()
+    return h.hexdigest()
+
+
+def _remove_quietly(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def ingest(path: str, sha256: str, ext: str, size: int, mime: Optional[str]) -> Blob:
+    """Take ownership of the file at ``path`` and return its (referenced) blob.
+
+    If the content is already stored, ``path`` is deleted and the existing
+    blob's ref_count is incremented; otherwise the file is moved into place.
+    The caller commits the session.
+    """
+    existing = db.session.get(Blob, sha256)
+    if existing is None:
+        ref = storage.get_storage().save(path, blob_key(sha256, ext), mime)
+        try:
+            with db.session.begin_nested():
+                blob = Blob(sha256=sha256, stored_path=ref, size_bytes=size, mime=mime, ref_count=1)
+                db.session.add(blob)
+            return blob
+        except IntegrityError:
+            # Concurrent upload of the same content won the insert; fall through
+            existing = db.session.get(Blob, sha256)
+            if existing is None:
+                raise
+            path = None
+    if path and not _same_file(path, existing.stored_path):
+        store = storage.for_ref(existing.stored_path)
+        if store.exists(existing.stored_path):
+            _remove_quietly(path)
+        else:
+            # Self-heal a blob whose file went missing (e.g. restored DB, lost volume)
+            store.save(path, existing.stored_path, mime)
+    _add_ref(sha256)
+    db.session.refresh(existing)
+    return existing
+
+
+def ingest_stored(ref: str, sha256: str, ext: str, size: int, mime: Optional[str]) -> Blob:
+    """Like ``ingest`` for an object already in storage (direct S3 upload).
+
+    The object at ``ref`` is moved server-side to its blob key, or deleted if
+    the content is already stored.
+    """
+    store = storage.get_storage()
+    existing = db.session.get(Blob, sha256)
+    if existing is None:
+        dest = store.move(ref, blob_key(sha256, ext))
+        try:
+            with db.session.begin_nested():
+                blob = Blob(sha256=sha256, stored_path=dest, size_bytes=size, mime=mime, ref_count=1)
+                db.session.add(blob)
+            return blob
+        except IntegrityError:
+            existing = db.session.get(Blob, sha256)
+            if existing is None:
+                raise
+    elif store.exists(existing.stored_path):
+        store.delete(ref)
+    else:
+        store.move(ref, existing.stored_path)
+    _add_ref(sha256)
+    db.session.refresh(existing)
+    return existing
+
+
+def ingest_document(doc_id: int, ext: str) -> Optional[Document]:
+    """Hash a document that still points at its uploaded object and ingest it.
+
+    Documents that already have a ``sha256`` are left alone, so running it
+    twice is harmless.
+    """
+    doc = db.session.get(Document, doc_id)
+    if doc is None or doc.sha256:
+        return doc
+    try:
+        sha = stored_sha256(doc.stored_path)
+        blob = ingest_stored(doc.stored_path, sha, ext, doc.size_bytes, doc.mime)
+        doc.sha256, doc.stored_path = sha, blob.stored_path
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return doc
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="blob-ingest")
+        return _executor
+
+
+def schedule_ingest(doc_id: int, ext: str, then: Optional[Callable[[Document], None]] = None) -> None:
+    """Run ``ingest_document`` in the background, then ``then(doc)``; failures are only logged."""
+    app = current_app._get_current_object()
+
+    def _run():
+        with app.app_context():
+            doc = ingest_document(doc_id, ext)
+            if doc is not None and then is not None:
+                then(doc)
+
+    def _done(fut):
+        exc = fut.exception()
+        if exc is not None:
+            app.logger.warning("blobstore: ingest failed", extra={"document": doc_id, "error": str(exc)})
+
+    _get_executor().submit(_run).add_done_callback(_done)
+
+
+def _add_ref(sha256: str) -> None:
+    db.session.execute(
+        db.update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1)
+    )
+
+
+def _release(connection, sha: str, sess) -> None:
+    table = Blob.__table__
+    connection.execute(
+        table.update().where(table.c.sha256 == sha).values(ref_count=table.c.ref_count - 1)
+    )
+    row = connection.execute(
+        db.select(table.c.ref_count, table.c.stored_path).where(table.c.sha256 == sha)
+    ).first()
+    if row is not None and row.ref_count <= 0:
+        connection.execute(table.delete().where(table.c.sha256 == sha))
+        if sess is not None:
+            sess.info.setdefault(_PENDING_KEY, []).append(row.stored_path)
+
+
+def release(sha256: str) -> None:
+    """Drop one reference without deleting a document (it now points elsewhere)."""
+    _release(db.session.connection(), sha256, db.session())
+
+
+@event.listens_for(Document, "after_delete")
+def _release_blob(mapper, connection, target):
+    if target.sha256:
+        _release(connection, target.sha256, object_session(target))
+
+
+@event.listens_for(Session, "after_commit")
+def _unlink_released(session):
+    for ref in session.info.pop(_PENDING_KEY, ()):
+        store = storage.for_ref(ref)
+        store.delete(ref)
+        store.delete(thumb_path(ref))
+        store.delete(no_thumb_path(ref))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_released(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def dedupe_existing(dry_run: bool = False) -> dict:
+    """Move every legacy per-user document file into the blob store.
+
+    Documents already pointing at a blob are skipped, so the migration can be
+    re-run safely. Returns counters for reporting.
+    """
+    stats = {"documents": 0, "migrated": 0, "duplicates": 0, "missing": 0, "bytes_freed": 0}
+    seen = set()
+    docs = Document.query.order_by(Document.id.asc()).all()
+    for doc in docs:
+        stats["documents"] += 1
+        blob = db.session.get(Blob, doc.sha256) if doc.sha256 else None
+        if blob is not None and _same_file(doc.stored_path, blob.stored_path):
+            continue
+        path = doc.stored_path or ""
+        if not os.path.isfile(path):
+            stats["missing"] += 1
+            continue
+        sha = file_sha256(path)
+        size = os.path.getsize(path)
+        ext = os.path.splitext(path)[1].lstrip(".")
+        if sha in seen or db.session.get(Blob, sha) is not None:
+            stats["duplicates"] += 1
+            stats["bytes_freed"] += size
+        seen.add(sha)
+        stats["migrated"] += 1
+        if dry_run:
+            continue
+        blob = ingest(path, sha, ext, size, doc.mime)
+        doc.sha256 = sha
+        doc.stored_path = blob.stored_path
+        doc.size_bytes = size
+        db.session.commit()
+    return stats
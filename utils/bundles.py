@@ -0,0 +1,358 @@
+"""CSS/JS bundles: concatenated, minified files under ``static/dist``.
+
+``BUNDLES`` maps a bundle name to its source files (relative to ``static``).
+``flask build-assets`` writes every bundle before hashing the static tree,
+so bundles get content-hashed, immutable URLs like any other static file.
+Without a deploy-time build they are (re)built lazily when a source is newer.
+
+A bundle named ``*-critical.css`` keeps only the rules whose selectors match
+``CRITICAL_SELECTORS`` (header, hero, base typography), or the page's own
+pattern in ``PAGE_CRITICAL_SELECTORS``. Templates inline it in a ``<style>``
+tag and load the full stylesheet without blocking render.
+
+Minification is dependency-free and conservative: comments and redundant
+whitespace go, and a JS line break is kept wherever automatic semicolon
+insertion could depend on it, so the code behaves exactly as the source.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, url_for
+from markupsafe import Markup
+
+from utils import assets, fragcache
+
+DIST_DIR = "dist"
+
+BUNDLES: Dict[str, Tuple[str, ...]] = {
+    # every page
+    "site.css": ("css/style.css", "css/base.css"),
+    "site-critical.css": ("css/style.css", "css/base.css"),
+    "site.js": (
+        "js/csrf-fetch.js",
+        "js/main.js",
+        "js/flash.js",
+        "js/footer-guard.js",
+        "js/title-line.js",
+        "js/sw-register.js",
+    ),
+    # home
+    "home.css": ("css/home.css",),
+    "home-critical.css": ("css/home.css",),
+    # public schedule
+    "schedule.css": ("css/schedule.css",),
+    "schedule-critical.css": ("css/schedule.css",),
+    "schedule.js": ("js/schedule-page.js",),
+    # admin schedule editor
+    "admin-schedule.css": ("css/admin/edit_schedule.css",),
+    "admin-schedule-critical.css": ("css/admin/edit_schedule.css",),
+    "admin-schedule.js": (
+        "js/admin/edit_schedule.js",
+        "js/schedule_multiselect.js",
+        "js/admin/edit_schedule_init.js",
+    ),
+}
+
+# Above-the-fold selectors: a rule is critical if one of its selectors starts with
+# one of these (".hero" also covers ".hero-gym", ".hero-inner h1", ...)
+CRITICAL_SELECTORS = re.compile(
+    r"^(?::root|\*|html|body|a|img|svg|h1|h2|h3|p|main|picture\.rimg"
+    r"|\.container|\.pad-y|\.header|\.logo|\.nav|\.burger|\.lang-switch|\.auth-ctrls"
+    r"|\.btn|\.main|\.flash|\.hero|#nav)(?!\w)"
+)
+
+# The first screen of pages with their own stylesheet. Schedule: the week grid,
+# not the plans below it. Editor: its header, day tabs, add form and list, plus
+# the rules that keep the dropdown, modal and toasts hidden until used.
+PAGE_CRITICAL_SELECTORS = {
+    "schedule-critical.css": re.compile(
+        r"^(?:\.cards|\.card|\.actions-center|\.schedule-grid|\.schedule-item|\.day|\.today-chip"
+        r"|\.slots?|\.active-dot|\.time-badge|\.activity|\.coach-muted|\.badge-age)(?!\w)"
+    ),
+    "admin-schedule-critical.css": re.compile(
+        r"^(?::root|body|\.schedule-editor|\.editor|\.header|\.days-tabs|\.day-tab|\.add|\.input"
+        r"|\.multi-select-toggle|\.dropdown|\.days-options|\.schedule-list|\.empty-state"
+        r"|\.selection|\.btn|\.modal|\.toast)(?!\w)"
+    ),
+}
+
+_lock = threading.Lock()
+_inline_cache: Dict[str, Tuple[float, str]] = {}
+
+
+# --- minifiers -------------------------------------------------------------
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_STRING = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')")
+
+
+def _strip_css_comments(css: str) -> str:
+    parts = _CSS_STRING.split(css)
+    return "".join(p if i % 2 else _CSS_COMMENT.sub("", p) for i, p in enumerate(parts))
+
+
+def minify_css(css: str) -> str:
+    parts = _CSS_STRING.split(_strip_css_comments(css))
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            out.append(part)
+            continue
+        part = re.sub(r"\s+", " ", part)
+        part = re.sub(r"\s*([{};,>])\s*", r"\1", part)
+        part = re.sub(r":\s+", ":", part)
+        part = part.replace(";}", "}")
+        out.append(part)
+    return "".join(out).strip()
+
+
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "instanceof"}
+
+
+def _is_ident(ch: str) -> bool:
+    return ch.isalnum() or ch in "_$" or ord(ch) > 127
+
+
+def minify_js(js: str) -> str:
+    """Drop comments and indentation; keep newlines, strings, templates and regexes verbatim."""
+    out: List[str] = []
+    i, n = 0, len(js)
+    # stack of open template literals; each entry counts the ${ } braces inside
+    templates: List[int] = []
+    pending_space = pending_newline = False
+
+    def last_char() -> str:
+        for chunk in reversed(out):
+            if chunk.strip():
+                return chunk.rstrip()[-1]
+        return ""
+
+    def last_word() -> str:
+        text = "".join(out[-8:]).rstrip()
+        m = re.search(r"[\w$]+$", text)
+        return m.group(0) if m else ""
+
+    def emit(text: str) -> None:
+        nonlocal pending_space, pending_newline
+        if out:
+            prev = last_char()
+            if pending_newline and prev not in "{;,([" and text[0] not in "}),;]":
+                # a line break is only kept where ASI could depend on it
+                out.append("\n")
+            elif pending_space and prev and (
+                (_is_ident(prev) and _is_ident(text[0])) or (prev in "+-" and text[0] == prev)
+            ):
+                out.append(" ")
+        pending_space = pending_newline = False
+        out.append(text)
+
+    def read_quoted(start: int, quote: str) -> int:
+        j = start + 1
+        while j < n and js[j] != quote:
+            if js[j] == "\\":
+                j += 1
+            j += 1
+        return j + 1
+
+    def read_template_chunk(start: int) -> int:
+        # from just after ` or } up to and including the closing ` or ${
+        j = start
+        while j < n:
+            if js[j] == "\\":
+                j += 2
+                continue
+            if js[j] == "`":
+                return j + 1
+            if js.startswith("${", j):
+                return j + 2
+            j += 1
+        return n
+
+    while i < n:
+        ch = js[i]
+        if ch in " \t\r\n":
+            if ch == "\n":
+                pending_newline = True
+            else:
+                pending_space = True
+            i += 1
+        elif js.startswith("//", i):
+            end = js.find("\n", i)
+            i = n if end < 0 else end
+        elif js.startswith("/*", i):
+            end = js.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            pending_space = True
+        elif ch in "'\"":
+            end = read_quoted(i, ch)
+            emit(js[i:end])
+            i = end
+        elif ch == "`":
+            end = read_template_chunk(i + 1)
+            emit(js[i:end])
+            if js[end - 2:end] == "${":
+                templates.append(0)
+            i = end
+        elif templates and ch == "{":
+            templates[-1] += 1
+            emit(ch)
+            i += 1
+        elif templates and ch == "}":
+            if templates[-1] == 0:
+                templates.pop()
+                end = read_template_chunk(i + 1)
+                emit(js[i:end])
+                if js[end - 2:end] == "${":
+                    templates.append(0)
+                i = end
+            else:
+                templates[-1] -= 1
+                emit(ch)
+                i += 1
+        elif ch == "/" and (last_char() in _REGEX_AFTER or last_char() == "" or last_word() in _REGEX_KEYWORDS):
+            j, in_class = i + 1, False
+            while j < n and (in_class or js[j] != "/") and js[j] != "\n":
+                if js[j] == "\\":
+                    j += 1
+                elif js[j] == "[":
+                    in_class = True
+                elif js[j] == "]":
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and _is_ident(js[j]):
+                j += 1
+            emit(js[i:j])
+            i = j
+        else:
+            j = i + 1
+            if _is_ident(ch):
+                while j < n and _is_ident(js[j]):
+                    j += 1
+            emit(js[i:j])
+            i = j
+    return "".join(out).strip() + "\n"
+
+
+# --- critical CSS ----------------------------------------------------------
+
+def _split_rules(css: str) -> List[Tuple[str, Optional[str]]]:
+    """Top-level ``(prelude, block)`` pairs; block is None for ``@import ...;``-style rules."""
+    rules, i, n = [], 0, len(css)
+    while i < n:
+        brace, semi = css.find("{", i), css.find(";", i)
+        if brace < 0:
+            break
+        if 0 <= semi < brace and css[i:semi].strip().startswith("@"):
+            rules.append((css[i:semi].strip(), None))
+            i = semi + 1
+            continue
+        depth, j = 1, brace + 1
+        while j < n and depth:
+            if css[j] == "{":
+                depth += 1
+            elif css[j] == "}":
+                depth -= 1
+            j += 1
+        rules.append((css[i:brace].strip(), css[brace + 1:j - 1]))
+        i = j
+    return rules
+
+
+def critical_css(css: str, pattern=CRITICAL_SELECTORS) -> str:
+    keep = []
+    for prelude, block in _split_rules(_strip_css_comments(css)):
+        if block is None:
+            continue
+        if prelude.startswith("@media") or prelude.startswith("@supports"):
+            inner = critical_css(block, pattern)
+            if inner:
+                keep.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@"):
+            # @font-face, @keyframes: not needed for the first paint
+            continue
+        elif any(pattern.match(sel.strip()) for sel in prelude.split(",")):
+            keep.append(f"{prelude}{{{block}}}")
+    return "\n".join(keep)
+
+
+# --- building --------------------------------------------------------------
+
+def _dist_rel(name: str) -> str:
+    return f"{DIST_DIR}/{name}"
+
+
+def build_bundle(name: str, static_folder: str) -> str:
+    """Write ``static/dist/<name>``; returns its path."""
+    chunks = []
+    for rel in BUNDLES[name]:
+        with open(os.path.join(static_folder, rel), encoding="utf-8") as fh:
+            chunks.append(fh.read())
+    if name.endswith(".js"):
+        # a statement terminator between files guards against a missing trailing ';'
+        body = ";\n".join(minify_js(c).rstrip() for c in chunks) + "\n"
+    else:
+        source = "\n".join(chunks)
+        if name.endswith("-critical.css"):
+            source = critical_css(source, PAGE_CRITICAL_SELECTORS.get(name, CRITICAL_SELECTORS))
+        body = minify_css(source) + "\n"
+    path = os.path.join(static_folder, _dist_rel(name))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(body)
+    os.replace(tmp, path)
+    return path
+
+
+def build_all(static_folder: str) -> Dict[str, int]:
+    """Build every bundle; returns ``{name: size in bytes}``."""
+    return {name: os.path.getsize(build_bundle(name, static_folder)) for name in BUNDLES}
+
+
+def _stale(name: str, static_folder: str) -> bool:
+    try:
+        built = os.stat(os.path.join(static_folder, _dist_rel(name))).st_mtime
+    except OSError:
+        return True
+    return any(os.stat(os.path.join(static_folder, rel)).st_mtime > built for rel in BUNDLES[name])
+
+
+def ensure_built(name: str) -> str:
+    """Path of the bundle under ``static``, building it first if it's missing or outdated."""
+    if name not in BUNDLES:
+        raise KeyError(f"unknown bundle {name!r}")
+    static_folder = current_app.static_folder
+    # with a deploy-time manifest the build already ran: skip the stat() calls
+    if not assets.has_manifest(static_folder) and _stale(name, static_folder):
+        with _lock:
+            if _stale(name, static_folder):
+                build_bundle(name, static_folder)
+                fragcache.invalidate("head")
+    return _dist_rel(name)
+
+
+def bundle_url(name: str) -> str:
+    return url_for("static", filename=ensure_built(name))
+
+
+def bundle_link(name: str) -> Markup:
+    """A render-blocking ``<link rel=stylesheet>`` for a CSS bundle."""
+    return Markup('<link rel="stylesheet" href="{}">').format(bundle_url(name))
+
+
+def inline_bundle(name: str) -> Markup:
+    """Contents of a (critical CSS) bundle for a ``<style>`` tag."""
+    path = os.path.join(current_app.static_folder, ensure_built(name))
+    mtime = os.stat(path).st_mtime
+    cached = _inline_cache.get(name)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding="utf-8") as fh:
+            # a stylesheet can't legitimately contain "</", which would end the tag
+            cached = (mtime, fh.read().replace("</", "<\\/"))
+        _inline_cache[name] = cached
+    return Markup(cached[1])
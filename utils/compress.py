@@ -0,0 +1,187 @@
+"""Response compression: Brotli/gzip for dynamic responses, precompressed static files.
+
+Dynamic responses (HTML, JSON, JS, SVG, XML, plain text) are compressed in an
+``after_request`` hook when the client's ``Accept-Encoding`` allows it, the
+body is at least ``COMPRESS_MIN_SIZE`` bytes and compression actually saves
+space. Streamed responses are compressed chunk by chunk with a flush after
+each one, so the client still receives data as it is produced. File
+responses (``send_file``) are left alone.
+
+Static CSS/JS/SVG get ``.br``/``.gz`` siblings at build time
+(``flask build-assets`` calls ``precompress``); the static view in
+``utils/assets.py`` sends the sibling matching ``Accept-Encoding`` as is,
+so serving them costs no CPU per request.
+
+Brotli needs the optional ``Brotli`` package; without it only gzip is used.
+"""
+
+import gzip
+import os
+import zlib
+from typing import Dict, Iterable, Iterator, Optional
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on deployment
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset({
+    "text/html",
+    "text/plain",
+    "text/xml",
+    "text/javascript",
+    "application/json",
+    "application/xml",
+    "application/manifest+json",
+    "image/svg+xml",
+})
+# Static files that get precompressed siblings
+PRECOMPRESS_EXTS = frozenset({".css", ".js", ".svg"})
+# Sibling suffix per Content-Encoding, in order of preference
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(encodings: Iterable[str]) -> Optional[str]:
+    """Best of ``encodings`` the current request accepts, or None."""
+    offered = list(encodings)
+    if not offered:
+        return None
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _stream(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if chunk:
+                yield process(chunk) + flush()
+        yield finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def init_compression(app) -> None:
+    """Compress eligible responses according to ``Accept-Encoding``."""
+
+    @app.after_request
+    def _compress_response(response):
+        if not app.config.get("COMPRESS_ENABLED", True):
+            return response
+        if response.mimetype not in COMPRESSIBLE_TYPES or response.direct_passthrough:
+            return response
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return response
+        if "Content-Encoding" in response.headers or response.cache_control.no_transform:
+            return response
+        response.vary.add("Accept-Encoding")
+        if request.method == "HEAD":
+            return response
+        encoding = negotiate(available_encodings())
+        if encoding is None:
+            return response
+
+        if encoding == "br":
+            level = app.config.get("COMPRESS_BR_LEVEL", 5)
+        else:
+            level = app.config.get("COMPRESS_GZIP_LEVEL", 6)
+        if response.is_streamed:
+            response.response = _stream(response.response, encoding, level)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config.get("COMPRESS_MIN_SIZE", 500):
+                return response
+            compressed = _compress(data, encoding, level)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # a different byte representation needs a different validator
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
+
+
+def precompress(static_folder: str) -> Dict[str, int]:
+    """Write ``.br``/``.gz`` siblings for static CSS/JS/SVG that are new or changed.
+
+    A sibling that wouldn't be smaller than its source is not kept. Returns
+    counts of ``written`` and ``fresh`` (already up to date) siblings.
+    """
+    stats = {"written": 0, "fresh": 0}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if os.path.splitext(name)[1] not in PRECOMPRESS_EXTS:
+                continue
+            path = os.path.join(root, name)
+            src = os.stat(path)
+            data = None
+            for encoding in available_encodings():
+                out = path + SUFFIXES[encoding]
+                try:
+                    if os.stat(out).st_mtime >= src.st_mtime:
+                        stats["fresh"] += 1
+                        continue
+                except OSError:
+                    pass
+                if data is None:
+                    with open(path, "rb") as fh:
+                        data = fh.read()
+                compressed = _compress(data, encoding, 11 if encoding == "br" else 9)
+                if len(compressed) >= len(data):
+                    if os.path.exists(out):
+                        os.remove(out)
+                    continue
+                tmp = out + ".tmp"
+                with open(tmp, "wb") as fh:
+                    fh.write(compressed)
+                os.replace(tmp, out)
+                stats["written"] += 1
+    return stats
+
+
+def precompressed_sibling(static_folder: str, filename: str) -> Optional[str]:
+    """``filename`` plus the suffix of a fresh sibling the client accepts, if one exists."""
+    if os.path.splitext(filename)[1] not in PRECOMPRESS_EXTS:
+        return None
+    path = os.path.join(static_folder, filename)
+    try:
+        src_mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    candidates = []
+    for encoding in available_encodings():
+        try:
+            if os.stat(path + SUFFIXES[encoding]).st_mtime >= src_mtime:
+                candidates.append(encoding)
+        except OSError:
+            continue
+    encoding = negotiate(candidates)
+    return filename + SUFFIXES[encoding] if encoding else None
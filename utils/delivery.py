@@ -0,0 +1,101 @@
+"""File delivery for protected uploads.
+
+Views only authorize; ``deliver`` then either hands the transfer to the
+fronting proxy (``FILE_DELIVERY = "x-accel"`` for nginx, ``"x-sendfile"`` for
+Apache/lighttpd) so the worker is released immediately, or streams the file
+itself (``"app"``) with byte ranges, a strong ETag and 304 handling.
+"""
+
+import os
+from typing import Optional
+from urllib.parse import quote
+
+from flask import Response, abort, current_app, send_file
+
+from utils import metrics
+
+
+MODES = ("app", "x-accel", "x-sendfile")
+
+metrics.define("file_deliveries_total", "counter", "Protected file responses by delivery mode.")
+
+
+def upload_root() -> str:
+    return os.path.realpath(current_app.config.get("UPLOAD_DIR", "./uploads"))
+
+
+def sandboxed_path(path: Optional[str]) -> str:
+    """Resolve ``path`` and make sure it is a file inside UPLOAD_DIR (403/404 otherwise)."""
+    if not path:
+        abort(404)
+    base = upload_root()
+    real = os.path.realpath(path)
+    if not real.startswith(base + os.sep):
+        abort(403)
+    if not os.path.isfile(real):
+        abort(404)
+    return real
+
+
+def delivery_mode() -> str:
+    mode = (current_app.config.get("FILE_DELIVERY") or "app").lower()
+    return mode if mode in MODES else "app"
+
+
+def _offloaded(path: str, mode: str, mimetype: Optional[str], as_attachment: bool, download_name: Optional[str]) -> Response:
+    rv = Response(mimetype=mimetype or "application/octet-stream")
+    if mode == "x-accel":
+        rel = os.path.relpath(path, upload_root()).replace(os.sep, "/")
+        prefix = current_app.config.get("FILE_ACCEL_PREFIX", "/_protected/").rstrip("/")
+        rv.headers["X-Accel-Redirect"] = f"{prefix}/{quote(rel)}"
+    else:
+        rv.headers["X-Sendfile"] = path
+    if download_name:
+        rv.headers.set(
+            "Content-Disposition",
+            "attachment" if as_attachment else "inline",
+            filename=download_name,
+        )
+    elif as_attachment:
+        rv.headers["Content-Disposition"] = "attachment"
+    return rv
+
+
+def deliver(
+    path: str,
+    *,
+    as_attachment: bool = False,
+    download_name: Optional[str] = None,
+    mimetype: Optional[str] = None,
+    etag: Optional[str] = None,
+    max_age: Optional[int] = None,
+) -> Response:
+    """Send a sandboxed file (see ``sandboxed_path``) using the configured mode.
+
+    ``etag`` should be a content hash when one is known (blob sha256): it stays
+    stable across re-ingests and mtime changes, unlike Werkzeug's default.
+    """
+    mode = delivery_mode()
+    metrics.inc("file_deliveries_total", {"mode": mode})
+    if mode != "app":
+        rv = _offloaded(path, mode, mimetype, as_attachment, download_name)
+        if max_age:
+            rv.cache_control.max_age = max_age
+        else:
+            rv.cache_control.no_cache = True
+        rv.cache_control.private = True
+        return rv
+    # send_file answers If-None-Match / If-Modified-Since with 304 and Range
+    # with 206; ETags it sets are strong
+    rv = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=etag if etag else True,
+        max_age=max_age,
+    )
+    rv.cache_control.public = False
+    rv.cache_control.private = True
+    return rv
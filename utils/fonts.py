@@ -0,0 +1,84 @@
+"""Self-hosted web fonts built by ``tools/build_fonts.py``.
+
+The build writes WOFF2 subsets to ``static/fonts/`` plus a ``manifest.json``
+listing each face's family, weight and ``unicode-range``. ``font_tags()``
+turns it into ``<link rel=preload>`` tags for the faces in ``PRELOAD`` and
+an inline ``<style>`` with the ``@font-face`` rules (``font-display: swap``).
+The rules are generated here rather than shipped as a stylesheet so that
+their ``src`` URLs are the same content-hashed URLs as the preloads; the
+browser then reuses the preloaded response instead of fetching it twice.
+
+Until the fonts have been built, the Google Fonts stylesheets are linked
+instead so pages keep their typography.
+"""
+
+import json
+import os
+import threading
+from typing import List
+
+from flask import current_app, url_for
+from markupsafe import Markup
+
+from utils import fragcache
+
+FONTS_SUBDIR = "fonts"
+# Above the fold: header, hero heading and hero text are all set in Roboto
+PRELOAD = (("Roboto", 400), ("Roboto", 700))
+GOOGLE_FONTS = (
+    "https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;700&display=swap",
+    "https://fonts.googleapis.com/css2?family=Anton&family=Montserrat:wght@400;500;700&display=swap",
+    "https://fonts.googleapis.com/css2?family=Russo+One&display=swap",
+)
+
+_cache = {"mtime": None, "data": {}}
+_lock = threading.Lock()
+
+
+def _manifest() -> dict:
+    path = os.path.join(current_app.static_folder, FONTS_SUBDIR, "manifest.json")
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    with _lock:
+        if _cache["mtime"] != mtime:
+            with open(path, encoding="utf-8") as fh:
+                _cache["data"] = json.load(fh)
+            if _cache["mtime"] is not None:
+                # cached layout fragments embed the old URLs
+                fragcache.invalidate()
+            _cache["mtime"] = mtime
+        return _cache["data"]
+
+
+def font_files() -> List[str]:
+    """Built WOFF2 files under ``static/fonts``; empty until the fonts are built."""
+    return sorted(_manifest())
+
+
+def _google_fonts() -> Markup:
+    tags = [Markup('<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>')]
+    tags += [Markup('<link href="{}" rel="stylesheet">').format(href) for href in GOOGLE_FONTS]
+    return Markup("\n  ").join(tags)
+
+
+def font_tags() -> Markup:
+    """Preload links and ``@font-face`` rules for ``<head>``."""
+    faces = _manifest()
+    if not faces:
+        return _google_fonts()
+    urls = {name: url_for("static", filename=f"{FONTS_SUBDIR}/{name}") for name in faces}
+    tags = []
+    for name, face in sorted(faces.items()):
+        if (face["family"], face["weight"]) in PRELOAD:
+            tags.append(
+                Markup('<link rel="preload" href="{}" as="font" type="font/woff2" crossorigin>').format(urls[name])
+            )
+    rules = "".join(
+        '@font-face{{font-family:"{family}";font-style:{style};font-weight:{weight};font-display:swap;'
+        'src:url({url}) format("woff2");unicode-range:{unicode_range}}}'.format(url=urls[name], **face)
+        for name, face in sorted(faces.items())
+    )
+    tags.append(Markup("<style>{}</style>").format(Markup(rules)))
+    return Markup("\n  ").join(tags)
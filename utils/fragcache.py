@@ -0,0 +1,92 @@
+"""Jinja fragment cache for the shared layout.
+
+    {% cache "footer", CURRENT_LANG, now.year %} ... {% endcache %}
+
+The block is rendered once per distinct key (the fragment name plus the
+listed values) and the HTML is reused from an in-process LRU bounded to
+``FRAGMENT_CACHE_SIZE`` entries; 0 disables caching. The key must cover
+everything the block depends on, typically the locale and, for "active"
+links, the endpoint. Per-visitor values (CSRF tokens, avatars, login
+state) belong outside cached blocks.
+
+``invalidate()`` drops cached fragments: all of them, or those of one
+fragment name. Rebuilt static assets, fonts and responsive images call it
+because cached blocks embed their hashed URLs. In debug mode the cache is
+bypassed so template edits show up immediately.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from utils import metrics
+
+metrics.define("template_fragment_cache_total", "counter", "Layout fragment lookups by fragment and result.")
+
+_lock = threading.Lock()
+_fragments: "OrderedDict[Tuple[Hashable, ...], Markup]" = OrderedDict()
+
+
+def invalidate(fragment: Optional[str] = None) -> int:
+    """Drop cached fragments (every one, or one fragment name); returns how many."""
+    with _lock:
+        if fragment is None:
+            dropped = len(_fragments)
+            _fragments.clear()
+            return dropped
+        keys = [k for k in _fragments if k[0] == fragment]
+        for k in keys:
+            del _fragments[k]
+        return len(keys)
+
+
+def _get(key) -> Optional[Markup]:
+    with _lock:
+        html = _fragments.get(key)
+        if html is not None:
+            _fragments.move_to_end(key)
+        return html
+
+
+def _put(key, html: Markup, limit: int) -> None:
+    with _lock:
+        _fragments[key] = html
+        _fragments.move_to_end(key)
+        while len(_fragments) > limit:
+            _fragments.popitem(last=False)
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache name, key... %}...{% endcache %}``"""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render", [nodes.List(key)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        limit = current_app.config.get("FRAGMENT_CACHE_SIZE", 512)
+        if limit <= 0 or current_app.debug:
+            return caller()
+        key = tuple(str(part) for part in key)
+        html = _get(key)
+        metrics.inc("template_fragment_cache_total", {"fragment": key[0], "result": "hit" if html else "miss"})
+        if html is None:
+            html = Markup(caller())
+            _put(key, html, limit)
+        return html
+
+
+def init_fragment_cache(app) -> None:
+    app.jinja_env.add_extension(FragmentCacheExtension)
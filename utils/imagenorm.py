@@ -0,0 +1,236 @@
+"""Bounded image normalisation for uploaded PNG/JPEG files.
+
+``check`` runs in the request: it reads only the image header (Pillow opens
+lazily) and rejects pixel counts above IMAGE_MAX_PIXELS before anything is
+decoded. The expensive part, decoding, downsampling to IMAGE_MAX_EDGE,
+applying the EXIF orientation and re-encoding without EXIF/XMP/comments,
+runs in a process pool so it never holds the GIL of a request-serving
+worker. A small thread pool waits for the result and swaps it in:
+
+* documents are content-addressed, so the normalised file is ingested as a
+  new blob, the document re-pointed, and the original blob released;
+* avatars are overwritten in place, then their size variants are rendered.
+
+A pool process that dies (e.g. OOM-killed mid-decode) breaks the whole
+executor; that job fails and is logged, and the broken pool is dropped so
+the next upload starts a fresh one.
+"""
+
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import warnings
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from models import db, Document
+from utils import avatars, blobstore, metrics, storage, thumbnails
+from utils.uploads import UploadRejected
+
+
+IMAGE_EXTS = ("jpg", "png")
+
+metrics.define("image_normalize_seconds", "histogram", "Time spent re-encoding an uploaded image (in the pool).")
+
+_procs: Optional[ProcessPoolExecutor] = None
+_threads: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+class ImageTooLarge(UploadRejected):
+    """Pixel count above IMAGE_MAX_PIXELS (possible decompression bomb)."""
+
+
+def _limits(config) -> Tuple[int, int, int]:
+    return (
+        int(config.get("IMAGE_MAX_PIXELS", 40_000_000)),
+        int(config.get("IMAGE_MAX_EDGE", 2560)),
+        int(config.get("IMAGE_JPEG_QUALITY", 85)),
+    )
+
+
+def _probe(im: Image.Image, max_pixels: int) -> Tuple[int, int]:
+    width, height = im.size
+    if width <= 0 or height <= 0 or width * height > max_pixels:
+        raise ImageTooLarge(f"{width}x{height} exceeds {max_pixels} pixels")
+    return width, height
+
+
+def check(path: str) -> Tuple[int, int]:
+    """Header-only size check of a local file; raises ``ImageTooLarge``/``UploadRejected``."""
+    max_pixels = _limits(current_app.config)[0]
+    try:
+        with Image.open(path) as im:
+            return _probe(im, max_pixels)
+    except Image.DecompressionBombError as exc:
+        # Pillow's own hard limit (2x its default) tripped before ours could
+        raise ImageTooLarge(str(exc)) from exc
+    except UnidentifiedImageError as exc:
+        raise UploadRejected("not a readable image") from exc
+
+
+def check_bytes(head: bytes) -> Tuple[int, int]:
+    """Same as ``check`` from the first bytes of a file (PNG/JPEG keep the size up front)."""
+    max_pixels = _limits(current_app.config)[0]
+    try:
+        with Image.open(io.BytesIO(head)) as im:
+            return _probe(im, max_pixels)
+    except Image.DecompressionBombError as exc:
+        # Pillow's own hard limit (2x its default) tripped before ours could
+        raise ImageTooLarge(str(exc)) from exc
+    except UnidentifiedImageError as exc:
+        raise UploadRejected("not a readable image") from exc
+
+
+def _has_metadata(im: Image.Image) -> bool:
+    if any(key in im.info for key in ("exif", "xmp", "XML:com.adobe.xmp", "comment")):
+        return True
+    return bool(getattr(im, "text", None)) or len(im.getexif()) > 0
+
+
+def normalize_file(src: str, dest: str, ext: str, max_pixels: int, max_edge: int, quality: int) -> bool:
+    """Re-encode ``src`` into ``dest`` (runs in a pool process).
+
+    Returns False, writing nothing, when the image is already within
+    ``max_edge`` and carries no metadata: re-encoding it would only cost
+    quality.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    warnings.simplefilter("error", Image.DecompressionBombWarning)
+    with Image.open(src) as im:
+        _probe(im, max_pixels)
+        if max(im.size) <= max_edge and not _has_metadata(im):
+            return False
+        if ext == "jpg":
+            # decode at 1/2..1/8 scale when the target is that much smaller
+            im.draft("RGB", (max_edge, max_edge))
+        icc = im.info.get("icc_profile")
+        im = ImageOps.exif_transpose(im)
+        if max(im.size) > max_edge:
+            im.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        # EXIF (GPS, camera serials), XMP and comments are dropped: only pixels and the
+        # colour profile are written back
+        if ext == "jpg":
+            if im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            im.save(dest, format="JPEG", quality=quality, optimize=True, progressive=True, icc_profile=icc)
+        else:
+            im.save(dest, format="PNG", optimize=True, icc_profile=icc)
+        return True
+
+
+def _pools(app) -> Tuple[ProcessPoolExecutor, ThreadPoolExecutor]:
+    global _procs, _threads
+    with _pool_lock:
+        if _procs is None:
+            # spawn: forking a threaded gunicorn worker can deadlock the child
+            _procs = ProcessPoolExecutor(
+                max_workers=int(app.config.get("IMAGE_WORKERS", 2)),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        if _threads is None:
+            _threads = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-norm")
+        return _procs, _threads
+
+
+def _drop_pool(broken: ProcessPoolExecutor) -> None:
+    """Forget a process pool whose worker died so the next job starts a fresh one."""
+    global _procs
+    with _pool_lock:
+        if _procs is broken:
+            _procs = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_normalize(app, local_src: str, ext: str) -> Optional[str]:
+    """Normalise into a scratch file via the process pool.
+
+    Returns its path (the caller owns it), or None if nothing needed doing.
+    """
+    procs, _ = _pools(app)
+    max_pixels, max_edge, quality = _limits(app.config)
+    fd, tmp = tempfile.mkstemp(dir=storage.scratch_dir(), suffix=f".{ext}")
+    os.close(fd)
+    try:
+        with metrics.timed("image_normalize_seconds"):
+            changed = procs.submit(normalize_file, local_src, tmp, ext, max_pixels, max_edge, quality).result(timeout=120)
+    except BrokenExecutor:
+        os.remove(tmp)
+        _drop_pool(procs)
+        raise
+    except Exception:
+        os.remove(tmp)
+        raise
+    if not changed:
+        os.remove(tmp)
+        return None
+    return tmp
+
+
+def _submit(fn, *args) -> None:
+    app = current_app._get_current_object()
+    _, threads = _pools(app)
+
+    def _run():
+        with app.app_context():
+            fn(app, *args)
+
+    def _done(fut):
+        exc = fut.exception()
+        if exc is not None:
+            app.logger.warning("image: normalisation failed", extra={"job": fn.__name__, "error": str(exc)})
+
+    threads.submit(_run).add_done_callback(_done)
+
+
+def _normalize_document(app, doc_id: int, ext: str) -> None:
+    doc = db.session.get(Document, doc_id)
+    if doc is None:
+        return
+    old_sha, ref = doc.sha256, doc.stored_path
+    try:
+        with storage.for_ref(ref).local_file(ref) as src:
+            tmp = _run_normalize(app, src, ext)
+        if tmp is None:
+            return
+        size = os.path.getsize(tmp)
+        sha = blobstore.file_sha256(tmp)
+        if sha == old_sha:
+            os.remove(tmp)
+            return
+        blob = blobstore.ingest(tmp, sha, ext, size, doc.mime)
+        doc.sha256, doc.stored_path, doc.size_bytes = sha, blob.stored_path, size
+        if old_sha:
+            blobstore.release(old_sha)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        thumbnails.schedule_thumbnail(doc.stored_path, doc.mime)
+
+
+def schedule_document(doc_id: int, ext: str) -> None:
+    """Normalise an image document in the background, then render its preview."""
+    _submit(_normalize_document, doc_id, ext)
+
+
+def _normalize_avatar(app, ref: str, ext: str) -> None:
+    try:
+        store = storage.for_ref(ref)
+        with store.local_file(ref) as src:
+            tmp = _run_normalize(app, src, ext)
+        if tmp is not None:
+            store.save(tmp, ref, f"image/{'jpeg' if ext == 'jpg' else ext}")
+    finally:
+        avatars.render_variants(ref)
+
+
+def schedule_avatar(ref: str, ext: str) -> None:
+    """Normalise an avatar in place in the background, then render its variants."""
+    _submit(_normalize_avatar, ref, ext)
@@ -0,0 +1,286 @@
+"""Resized copies of locally hosted images: ``/img/<width>/<fmt>/<path>``.
+
+``News.image`` is a free-form URL and admins paste full-size photos, so
+news pages ask for a copy of the right width instead. Only files under
+``static`` are served, and only at the widths in ``IMAGE_PROXY_WIDTHS`` and
+the formats in ``IMAGE_PROXY_FORMATS``, so the set of variants (and the
+work an anonymous client can cause) stays small. External URLs are left
+as they are.
+
+A variant is decoded, downsampled and encoded in a process pool, like
+upload normalisation in ``imagenorm``, so it never holds the GIL of a
+request-serving worker. Results go to ``IMAGE_PROXY_CACHE_DIR`` under a
+key of the source path, its mtime and size, the width and the format;
+editing the source therefore yields new variants and the old ones age out.
+The directory is an LRU bounded to ``IMAGE_PROXY_CACHE_MB``: a hit bumps
+the file's mtime and, once the total goes over the limit, the least
+recently used files are deleted down to 90% of it.
+
+Concurrent misses for one variant share a single render (single-flight).
+That holds within a process; separate worker processes may each render
+it once, and since files are written under a temporary name and renamed
+the duplicate is harmless.
+
+A pool worker that dies (say, OOM-killed during a large decode) breaks the
+whole executor. The broken pool is dropped so the next miss starts a fresh
+one, and the requests that were waiting on it get a 503 instead of a 500.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import warnings
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from flask import abort, current_app, send_file, url_for
+from PIL import Image, ImageOps
+from werkzeug.security import safe_join
+
+from utils import assets, metrics
+
+ENDPOINT = "resized_image"
+SOURCE_EXTS = (".jpg", ".jpeg", ".jfif", ".png", ".webp")
+_MIME = {"webp": "image/webp", "jpg": "image/jpeg"}
+_QUALITY = {"webp": 78, "jpg": 82}
+
+metrics.define("image_proxy_requests_total", "counter", "Resized image requests by result (hit, miss, shared).")
+metrics.define("image_proxy_render_seconds", "histogram", "Time spent producing a resized image (in the pool).")
+
+_procs: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+_usage = {"bytes": None}
+_usage_lock = threading.Lock()
+
+
+def render_variant(src: str, dest: str, width: int, fmt: str, max_pixels: int) -> int:
+    """Write ``src`` downsampled to ``width`` as ``fmt`` into ``dest`` (runs in a pool process); returns its size."""
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    warnings.simplefilter("error", Image.DecompressionBombWarning)
+    with Image.open(src) as im:
+        # decode at 1/2..1/8 scale when the target is that much smaller
+        im.draft("RGB", (width, width * im.height // max(im.width, 1)))
+        im = ImageOps.exif_transpose(im)
+        if im.width > width:
+            # never upscale: a small source is re-encoded at its own size
+            im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+        if fmt == "jpg":
+            if im.mode not in ("RGB", "L"):
+                bg = Image.new("RGB", im.size, (255, 255, 255))
+                rgba = im.convert("RGBA")
+                bg.paste(rgba, mask=rgba.split()[-1])
+                im = bg
+            options = {"format": "JPEG", "quality": _QUALITY[fmt], "optimize": True, "progressive": True}
+        else:
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "PA") else "RGB")
+            options = {"format": "WEBP", "quality": _QUALITY[fmt], "method": 4}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".tmp")
+        os.close(fd)
+        try:
+            im.save(tmp, **options)
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return os.path.getsize(dest)
+
+
+def _pool(app) -> ProcessPoolExecutor:
+    global _procs
+    with _pool_lock:
+        if _procs is None:
+            # spawn: forking a threaded gunicorn worker can deadlock the child
+            _procs = ProcessPoolExecutor(
+                max_workers=int(app.config.get("IMAGE_PROXY_WORKERS", 2)),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _procs
+
+
+def _drop_pool(broken: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died (e.g. OOM-killed) so the next miss starts a fresh one."""
+    global _procs
+    with _pool_lock:
+        if _procs is broken:
+            _procs = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def widths() -> Tuple[int, ...]:
+    return tuple(sorted(current_app.config["IMAGE_PROXY_WIDTHS"]))
+
+
+def cache_dir() -> str:
+    return os.path.abspath(current_app.config["IMAGE_PROXY_CACHE_DIR"])
+
+
+def _cache_limit() -> int:
+    return int(current_app.config.get("IMAGE_PROXY_CACHE_MB", 200)) * 1024 * 1024
+
+
+def _cached_files(root: str) -> List[Tuple[float, int, str]]:
+    files = []
+    for dirpath, _dirs, names in os.walk(root):
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+    return files
+
+
+def _account(added: int) -> None:
+    """Track the cache size and evict least recently used files once it goes over the limit."""
+    root, limit = cache_dir(), _cache_limit()
+    with _usage_lock:
+        if _usage["bytes"] is None:
+            _usage["bytes"] = sum(size for _, size, _ in _cached_files(root))
+        else:
+            _usage["bytes"] += added
+        if _usage["bytes"] <= limit:
+            return
+        # rescan: other worker processes write to the same directory
+        files = sorted(_cached_files(root))
+        total = sum(size for _, size, _ in files)
+        target = limit * 9 // 10
+        evicted = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        _usage["bytes"] = total
+    current_app.logger.info("image proxy: cache evicted", extra={"files": evicted, "bytes": total})
+
+
+def source_path(filename: str) -> Optional[str]:
+    """Absolute path of an image under ``static`` (hashed names resolved), or None."""
+    filename = assets.resolve(filename)[0]
+    if not filename.lower().endswith(SOURCE_EXTS):
+        return None
+    path = safe_join(current_app.static_folder, filename)
+    return path if path and os.path.isfile(path) else None
+
+
+def _static_filename(src: Optional[str]) -> Optional[str]:
+    prefix = current_app.static_url_path + "/"
+    if not src or not src.startswith(prefix) or "?" in src:
+        return None
+    return src[len(prefix):]
+
+
+def _variant_key(src: str, width: int, fmt: str) -> str:
+    st = os.stat(src)
+    raw = f"{src}\0{st.st_mtime_ns}\0{st.st_size}\0{width}\0{fmt}\0{_QUALITY[fmt]}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def ensure_variant(src: str, width: int, fmt: str) -> str:
+    """Path of the cached variant, rendering it (once per process at a time) if missing."""
+    key = _variant_key(src, width, fmt)
+    dest = os.path.join(cache_dir(), key[:2], f"{key}.{fmt}")
+    if os.path.exists(dest):
+        try:
+            # LRU: the mtime is the last use
+            os.utime(dest)
+        except OSError:
+            pass
+        metrics.inc("image_proxy_requests_total", {"result": "hit"})
+        return dest
+    app = current_app._get_current_object()
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            max_pixels = int(app.config.get("IMAGE_MAX_PIXELS", 40_000_000))
+            pool = _pool(app)
+            try:
+                fut = pool.submit(render_variant, src, dest, width, fmt, max_pixels)
+            except BrokenExecutor:
+                _drop_pool(pool)
+                raise
+            _inflight[key] = fut
+    metrics.inc("image_proxy_requests_total", {"result": "miss" if leader else "shared"})
+    if not leader:
+        fut.result(timeout=120)
+        return dest
+    try:
+        with metrics.timed("image_proxy_render_seconds"):
+            size = fut.result(timeout=120)
+    except BrokenExecutor:
+        _drop_pool(pool)
+        raise
+    finally:
+        # the file is in place before the future completes, so later callers find it on disk
+        with _inflight_lock:
+            _inflight.pop(key, None)
+    _account(size)
+    return dest
+
+
+def serve(width: int, fmt: str, filename: str):
+    """Response for ``/img/<width>/<fmt>/<path>``; 404 for anything off the allowlists."""
+    if width not in widths() or fmt not in current_app.config["IMAGE_PROXY_FORMATS"] or fmt not in _MIME:
+        abort(404)
+    src = source_path(filename)
+    if src is None:
+        abort(404)
+    try:
+        path = ensure_variant(src, width, fmt)
+    except (OSError, Image.DecompressionBombError, Image.DecompressionBombWarning) as exc:
+        current_app.logger.warning("image proxy: rendering failed", extra={"path": filename, "error": str(exc)})
+        abort(404)
+    except BrokenExecutor as exc:
+        # transient: the next miss starts a fresh pool
+        current_app.logger.warning("image proxy: render worker died", extra={"path": filename, "error": str(exc)})
+        abort(503)
+    # the LRU touches the file on every hit, so validators come from the key and the source instead
+    resp = send_file(
+        path,
+        mimetype=_MIME[fmt],
+        conditional=True,
+        etag=os.path.splitext(os.path.basename(path))[0][:32],
+        last_modified=os.stat(src).st_mtime,
+        max_age=current_app.config["IMAGE_PROXY_MAX_AGE"],
+    )
+    resp.cache_control.public = True
+    return resp
+
+
+def resized_image(src: Optional[str], max_width: Optional[int] = None) -> Optional[dict]:
+    """``src``/``srcset``/``sources`` for the ``cover`` macro, or None if ``src`` isn't a local image.
+
+    Widths above ``max_width`` are left out of the ``srcset``.
+    """
+    filename = _static_filename(src)
+    if filename is None or source_path(filename) is None:
+        return None
+    filename = assets.resolve(filename)[0]
+    allowed = [w for w in widths() if max_width is None or w <= max_width] or [widths()[0]]
+    formats = current_app.config["IMAGE_PROXY_FORMATS"]
+
+    def srcset(fmt):
+        return ", ".join(
+            f"{url_for(ENDPOINT, width=w, fmt=fmt, filename=filename)} {w}w" for w in allowed
+        )
+
+    fallback = "jpg" if "jpg" in formats else formats[0]
+    return {
+        "sources": [{"type": _MIME[fmt], "srcset": srcset(fmt)} for fmt in formats if fmt != fallback],
+        "src": url_for(ENDPOINT, width=allowed[-1], fmt=fallback, filename=filename),
+        "srcset": srcset(fallback),
+    }
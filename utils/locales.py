@@ -0,0 +1,161 @@
+"""Locale-prefixed URLs for public pages: ``/ru/schedule``, ``/en/schedule``, ``/et/schedule``.
+
+A route registered with ``localized_route`` answers under every
+``/<lang_code>`` prefix, and that prefix alone picks the language, so one
+URL always returns the same bytes. The unprefixed rule stays registered
+only to redirect (302, ``Vary: Accept-Language, Cookie``) to the visitor's
+language: ``?lang=``, then ``session['lang']``, then ``Accept-Language``.
+``url_for`` fills ``lang_code`` in from the current request, so templates
+and redirects need no changes.
+
+A prefixed page requested without a session or remember-me cookie is
+*cacheable*: templates leave out everything per-visitor (the CSRF token
+is fetched by the contact form on submit), the session is never written
+and the response is marked ``public`` with ``s-maxage`` for a shared
+cache. Anything else on these routes is ``private``. Both kinds carry
+``Vary: Cookie`` so a cache can't hand a personalised page to someone else.
+"""
+
+from typing import List, Tuple
+from urllib.parse import urlencode
+
+from flask import current_app, g, has_request_context, redirect, request, session, url_for
+from flask_babel import get_locale
+from flask_login import current_user
+
+LANG_ARG = "lang_code"
+
+
+def _languages() -> List[str]:
+    return current_app.config["LANGUAGES"]
+
+
+def _localized(app) -> set:
+    return app.extensions.setdefault("localized_endpoints", set())
+
+
+def localized_route(app, rule: str, **options):
+    """Like ``app.route`` for GET pages, plus a ``/<lang_code>`` variant of the rule."""
+    prefix = "/<any({}):{}>".format(", ".join(app.config["LANGUAGES"]), LANG_ARG)
+
+    def decorator(view):
+        endpoint = options.pop("endpoint", view.__name__)
+        app.add_url_rule(prefix + rule, endpoint, view, **options)
+        app.add_url_rule(rule, endpoint, view, **options)
+        _localized(app).add(endpoint)
+        return view
+
+    return decorator
+
+
+def url_lang() -> str:
+    """Language from the URL prefix, or '' for unprefixed URLs."""
+    return g.get("url_lang", "") if has_request_context() else ""
+
+
+def is_localized(endpoint) -> bool:
+    return endpoint in _localized(current_app)
+
+
+def is_cacheable() -> bool:
+    """True while rendering a page that must not contain per-visitor data."""
+    return g.get("cacheable", False) if has_request_context() else False
+
+
+def preferred_lang() -> str:
+    """The visitor's language for an unprefixed URL."""
+    langs = _languages()
+    lang = request.args.get("lang")
+    if lang in langs:
+        return lang
+    if session.get("lang") in langs:
+        return session["lang"]
+    return request.accept_languages.best_match(langs) or current_app.config["BABEL_DEFAULT_LOCALE"]
+
+
+def alternates(external: bool = True) -> List[Tuple[str, str]]:
+    """``(hreflang, url)`` pairs for the current localized page, ending with ``x-default``."""
+    if not is_localized(request.endpoint):
+        return []
+    args = dict(request.view_args or {})
+    links = [(code, url_for(request.endpoint, _external=external, **{LANG_ARG: code}, **args)) for code in _languages()]
+    # the unprefixed URL redirects each visitor to their own language
+    links.append(("x-default", url_for(request.endpoint, _external=external, **{LANG_ARG: None}, **args)))
+    return links
+
+
+def lang_switch_url(code: str) -> str:
+    """Link for the language switcher: the same page in ``code``."""
+    if is_localized(request.endpoint) and request.view_args is not None:
+        return url_for(request.endpoint, **{LANG_ARG: code}, **request.view_args)
+    return f"{request.path}?{urlencode({'lang': code})}"
+
+
+def _has_visitor_cookie() -> bool:
+    names = (current_app.config["SESSION_COOKIE_NAME"], current_app.config.get("REMEMBER_COOKIE_NAME", "remember_token"))
+    return any(name in request.cookies for name in names)
+
+
+def init_locales(app) -> None:
+    """URL processors, the unprefixed-URL redirect and cache headers for localized routes."""
+
+    @app.url_value_preprocessor
+    def _pull_lang(endpoint, values):
+        if values and LANG_ARG in values:
+            g.url_lang = values.pop(LANG_ARG)
+
+    @app.url_defaults
+    def _add_lang(endpoint, values):
+        if endpoint not in _localized(app):
+            return
+        if LANG_ARG in values:
+            if values[LANG_ARG] is None:
+                # explicit None asks for the unprefixed URL (x-default)
+                values.pop(LANG_ARG)
+            return
+        lang = url_lang()
+        if not lang and has_request_context():
+            lang = str(get_locale() or "")
+        values[LANG_ARG] = lang if lang in app.config["LANGUAGES"] else app.config["BABEL_DEFAULT_LOCALE"]
+
+    @app.before_request
+    def _route_lang():
+        if request.endpoint not in _localized(app) or request.method not in ("GET", "HEAD"):
+            return None
+        lang = url_lang()
+        if not lang:
+            args = request.args.to_dict(flat=False)
+            args.pop("lang", None)
+            target = url_for(request.endpoint, **{LANG_ARG: preferred_lang()}, **(request.view_args or {}))
+            if args:
+                target += "?" + urlencode(args, doseq=True)
+            resp = redirect(target, 302)
+            resp.vary.update(("Accept-Language", "Cookie"))
+            resp.cache_control.private = True
+            return resp
+        if request.args.get("lang") in _languages() and request.args["lang"] != lang:
+            # old-style switcher link on a prefixed URL
+            return redirect(lang_switch_url(request.args["lang"]), 302)
+        g.cacheable = not _has_visitor_cookie()
+        return None
+
+    @app.after_request
+    def _cache_headers(response):
+        if not url_lang() or request.endpoint not in _localized(app):
+            return response
+        response.vary.add("Cookie")
+        if "Cache-Control" in response.headers:
+            return response
+        if (
+            g.get("cacheable")
+            and response.status_code == 200
+            and not session.modified
+            and not current_user.is_authenticated
+        ):
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config["PUBLIC_PAGE_MAX_AGE"]
+            response.cache_control.s_maxage = app.config["PUBLIC_PAGE_S_MAXAGE"]
+        else:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        return response
@@ -0,0 +1,158 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from flask import g, has_request_context, request
+
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Attributes every LogRecord has; anything else was passed via ``extra=``
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "request_id",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_request_id() -> Optional[str]:
+    if not has_request_context():
+        return None
+    return getattr(g, "request_id", None)
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request's correlation id to every record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "request_id", None):
+            record.request_id = get_request_id()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Let through only a fraction of DEBUG records; higher levels always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, float(rate)))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id + extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            payload["request_id"] = rid
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # formatted on the logging thread by StructuredQueueHandler
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback apart from the message.
+
+    The stock ``prepare`` formats the record, folding any traceback into
+    ``msg``, and drops ``exc_info``, so the listener's JsonFormatter could no
+    longer emit it as ``exc``. Here the message is merged with its args and
+    the traceback rendered into ``exc_text`` while the frames still exist.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # tracebacks hold frames (and their locals) alive; the text is enough
+        record.exc_info = None
+        return record
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def configure_logging(app) -> None:
+    """Route app/library logging through a queue so stdout I/O happens off the request thread.
+
+    The request thread only enqueues records; a single QueueListener thread
+    formats them as JSON and writes them to stderr.
+    """
+    global _listener
+
+    level = getattr(logging, str(app.config.get("LOG_LEVEL", "INFO")).upper(), logging.INFO)
+    sample_rate = float(app.config["LOG_DEBUG_SAMPLE_RATE"])
+
+    _stop_listener()
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    qh = StructuredQueueHandler(log_queue)
+    # Filters run on the request thread so request_id is resolved while the context is live
+    qh.addFilter(RequestIdFilter())
+    qh.addFilter(DebugSampler(sample_rate))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        if isinstance(h, logging.handlers.QueueHandler):
+            root.removeHandler(h)
+    root.addHandler(qh)
+    root.setLevel(level)
+
+    # Flask's default stderr handler would duplicate every app.logger record
+    from flask.logging import default_handler
+
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(level)
+
+    @app.before_request
+    def _assign_request_id():
+        incoming = (request.headers.get(REQUEST_ID_HEADER) or "").strip()
+        g.request_id = incoming[:64] if incoming else uuid.uuid4().hex
+
+    @app.after_request
+    def _echo_request_id(response):
+        rid = get_request_id()
+        if rid:
+            response.headers.setdefault(REQUEST_ID_HEADER, rid)
+        return response
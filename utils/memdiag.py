@@ -0,0 +1,179 @@
+"""Memory diagnostics: tracemalloc control, snapshot diffs, live object census, RSS gauges.
+
+Everything except the RSS/meminfo gauges is per worker process: the
+superadmin page acts on whichever gunicorn worker serves the request and
+always shows that worker's pid.
+"""
+
+import gc
+import json
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from utils import metrics
+
+
+metrics.define("process_resident_memory_bytes", "gauge", "Resident set size of the worker process.")
+metrics.define("machine_memory_total_bytes", "gauge", "MemTotal from /proc/meminfo.")
+metrics.define("machine_memory_available_bytes", "gauge", "MemAvailable from /proc/meminfo.")
+metrics.define("tracemalloc_traced_bytes", "gauge", "Bytes currently traced by tracemalloc (0 when off).")
+
+_lock = threading.Lock()
+_baseline: Optional[tracemalloc.Snapshot] = None
+_last_report: Optional[Dict] = None
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        # ru_maxrss is the peak, not current, but better than nothing off Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+def meminfo() -> Dict[str, int]:
+    out = {}
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("MemTotal", "MemAvailable"):
+                    out[key] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return out
+
+
+def tracing() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def start(frames: int = 10) -> None:
+    global _baseline
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _baseline = tracemalloc.take_snapshot()
+
+
+def stop() -> None:
+    global _baseline
+    with _lock:
+        _baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def _snapshot_filtered() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+
+
+def diff(limit: int = 25) -> List[Dict]:
+    """Top allocation sites by growth since the baseline; the new snapshot becomes the baseline."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        return []
+    with _lock:
+        current = _snapshot_filtered()
+        previous = _baseline
+        _baseline = current
+    if previous is None:
+        stats = current.statistics("lineno")[:limit]
+        return [
+            {"site": str(s.traceback[0]), "size_diff": s.size, "count_diff": s.count, "size": s.size}
+            for s in stats
+        ]
+    stats = current.compare_to(previous, "lineno")[:limit]
+    return [
+        {"site": str(s.traceback[0]), "size_diff": s.size_diff, "count_diff": s.count_diff, "size": s.size}
+        for s in stats
+    ]
+
+
+def object_census(limit: int = 25) -> List[Dict]:
+    """Live gc-tracked objects grouped by type, largest shallow size first."""
+    counts: Counter = Counter()
+    sizes: Counter = Counter()
+    for obj in gc.get_objects():
+        tname = type(obj).__qualname__
+        counts[tname] += 1
+        try:
+            sizes[tname] += sys.getsizeof(obj)
+        except TypeError:
+            pass
+    return [{"type": t, "count": counts[t], "size": sz} for t, sz in sizes.most_common(limit)]
+
+
+def report(limit: int = 25, census: bool = False) -> Dict:
+    global _last_report
+    rep = {
+        "pid": os.getpid(),
+        "taken_at": datetime.now(timezone.utc).isoformat(),
+        "rss_bytes": rss_bytes(),
+        "meminfo": meminfo(),
+        "tracing": tracing(),
+        "traced": list(tracemalloc.get_traced_memory()) if tracing() else None,
+        "diff": diff(limit) if tracing() else [],
+        "types": object_census(limit) if census else [],
+    }
+    _last_report = rep
+    return rep
+
+
+def last_report() -> Optional[Dict]:
+    return _last_report
+
+
+def dump(directory: str, rep: Dict) -> str:
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(directory, f"mem_{stamp}_{rep.get('pid')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rep, f, ensure_ascii=False, indent=1)
+    return path
+
+
+def init_memdiag(app) -> None:
+    """Publish RSS / machine memory gauges and warn in the log when memory runs low."""
+    low_mb = int(app.config.get("MEMORY_LOW_MB", 150))
+
+    def _gauges():
+        rss = rss_bytes()
+        if rss is not None:
+            metrics.set_gauge("process_resident_memory_bytes", rss)
+        info = meminfo()
+        if "MemTotal" in info:
+            metrics.set_gauge("machine_memory_total_bytes", info["MemTotal"])
+        if "MemAvailable" in info:
+            metrics.set_gauge("machine_memory_available_bytes", info["MemAvailable"])
+            if info["MemAvailable"] < low_mb * 1024 * 1024:
+                app.logger.warning(
+                    "memory: machine running low",
+                    extra={"available_mb": info["MemAvailable"] // (1024 * 1024), "rss_mb": (rss or 0) // (1024 * 1024)},
+                )
+        metrics.set_gauge(
+            "tracemalloc_traced_bytes", tracemalloc.get_traced_memory()[0] if tracing() else 0
+        )
+
+    metrics.register_gauge_callback(_gauges)
@@ -0,0 +1,365 @@
+"""In-process request/DB/render/mail metrics with a Prometheus text exporter.
+
+Each worker keeps its own registry and periodically dumps it to
+``METRICS_DIR/<pid>.json``. ``/metrics`` merges every dump so the numbers
+are correct no matter which gunicorn worker serves the scrape.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# name -> (type, help, buckets)
+_DEFINITIONS: Dict[str, Tuple[str, str, Optional[Tuple[float, ...]]]] = {}
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[Labels, float]] = {}
+_histograms: Dict[str, Dict[Labels, list]] = {}
+_gauges: Dict[str, Dict[Labels, float]] = {}
+_gauge_callbacks = []
+
+_state = {"dir": None, "interval": 5.0, "last_flush": 0.0}
+
+
+def define(name: str, kind: str, help_text: str, buckets: Optional[Iterable[float]] = None) -> None:
+    _DEFINITIONS[name] = (kind, help_text, tuple(buckets or DEFAULT_BUCKETS) if kind == "histogram" else None)
+
+
+define("http_requests_total", "counter", "HTTP responses by endpoint, method and status.")
+define("http_request_duration_seconds", "histogram", "Request latency by endpoint.")
+define("db_query_duration_seconds", "histogram", "SQL statement execution time by endpoint.")
+define("db_pool_checkout_seconds", "histogram", "Time spent waiting for a pooled DB connection.",
+       buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0))
+define("db_pool_checked_out", "gauge", "Connections currently checked out of the pool.")
+define("db_pool_size", "gauge", "Configured pool_size (DB_POOL_SIZE).")
+define("db_pool_max_overflow", "gauge", "Configured max_overflow (DB_MAX_OVERFLOW).")
+define("template_render_seconds", "histogram", "Jinja render time by template.")
+define("mailgun_request_seconds", "histogram", "Outbound Mailgun API call time by status.")
+
+
+def _labels(labels: Optional[dict]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def inc(name: str, labels: Optional[dict] = None, value: float = 1.0) -> None:
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0.0) + value
+
+
+def observe(name: str, value: float, labels: Optional[dict] = None) -> None:
+    buckets = _DEFINITIONS[name][2]
+    key = _labels(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        h = series.get(key)
+        if h is None:
+            h = series[key] = [[0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                h[0][i] += 1
+                break
+        h[1] += value
+        h[2] += 1
+
+
+def set_gauge(name: str, value: float, labels: Optional[dict] = None) -> None:
+    with _lock:
+        _gauges.setdefault(name, {})[_labels(labels)] = float(value)
+
+
+def register_gauge_callback(fn) -> None:
+    """``fn()`` is called right before every dump to refresh live gauges."""
+    _gauge_callbacks.append(fn)
+
+
+@contextmanager
+def timed(name: str, labels: Optional[dict] = None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, labels)
+
+
+# Requests whose WSGI environ carries this key (the boot warmup's own page
+# renders) are left out of the request, SQL and template series
+UNRECORDED_ENVIRON_KEY = "metrics.unrecorded"
+
+
+def _unrecorded() -> bool:
+    return has_request_context() and bool(request.environ.get(UNRECORDED_ENVIRON_KEY))
+
+
+def current_endpoint() -> str:
+    if has_request_context():
+        return request.endpoint or "unmatched"
+    return "none"
+
+
+# ---------- multi-worker persistence ----------
+
+def _snapshot() -> dict:
+    for fn in list(_gauge_callbacks):
+        try:
+            fn()
+        except Exception:
+            pass
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "counters": {n: [[list(k), v] for k, v in s.items()] for n, s in _counters.items()},
+            "histograms": {
+                n: [[list(k), [list(h[0]), h[1], h[2]]] for k, h in s.items()] for n, s in _histograms.items()
+            },
+            "gauges": {n: [[list(k), v] for k, v in s.items()] for n, s in _gauges.items()},
+        }
+
+
+def flush(force: bool = False) -> None:
+    directory = _state["dir"]
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - _state["last_flush"] < _state["interval"]:
+        return
+    _state["last_flush"] = now
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _load_all() -> list:
+    directory = _state["dir"]
+    if not directory:
+        return [_snapshot()]
+    flush(force=True)
+    dumps = []
+    for fn in os.listdir(directory):
+        if not fn.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, fn), encoding="utf-8") as f:
+                dumps.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return dumps
+
+
+def _fmt_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + inner + "}"
+
+
+def _merge():
+    counters: Dict[str, Dict[Labels, float]] = {}
+    histograms: Dict[str, Dict[Labels, list]] = {}
+    gauges: Dict[str, Dict[Labels, float]] = {}
+
+    for dump in _load_all():
+        for name, series in dump.get("counters", {}).items():
+            dst = counters.setdefault(name, {})
+            for k, v in series:
+                key = tuple(tuple(p) for p in k)
+                dst[key] = dst.get(key, 0.0) + v
+        for name, series in dump.get("histograms", {}).items():
+            dst = histograms.setdefault(name, {})
+            for k, (b, s, c) in series:
+                key = tuple(tuple(p) for p in k)
+                cur = dst.get(key)
+                if cur is None or len(cur[0]) != len(b):
+                    cur = dst[key] = [[0] * len(b), 0.0, 0]
+                cur[0] = [x + y for x, y in zip(cur[0], b)]
+                cur[1] += s
+                cur[2] += c
+        # Gauges describe live state: a dead worker's last value is meaningless
+        if not _pid_alive(int(dump.get("pid", 0))):
+            continue
+        for name, series in dump.get("gauges", {}).items():
+            dst = gauges.setdefault(name, {})
+            for k, v in series:
+                key = tuple(tuple(p) for p in k) + (("pid", str(dump.get("pid"))),)
+                dst[key] = v
+    return counters, histograms, gauges
+
+
+def live_gauge(name: str) -> Dict[Labels, float]:
+    """Current values of a gauge across all live workers (labels include ``pid``)."""
+    return _merge()[2].get(name, {})
+
+
+def render_prometheus() -> str:
+    """Merge every worker's dump and render Prometheus text format 0.0.4."""
+    counters, histograms, gauges = _merge()
+
+    lines = []
+    for name, (kind, help_text, buckets) in _DEFINITIONS.items():
+        if kind == "counter":
+            series = counters.get(name)
+        elif kind == "histogram":
+            series = histograms.get(name)
+        else:
+            series = gauges.get(name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in sorted(series):
+            if kind == "histogram":
+                bucket_counts, total, count = series[key]
+                acc = 0
+                for bound, n in zip(buckets, bucket_counts):
+                    acc += n
+                    lines.append(f"{name}_bucket{_fmt_labels(key + (('le', repr(bound)),))} {acc}")
+                lines.append(f"{name}_bucket{_fmt_labels(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_fmt_labels(key)} {total}")
+                lines.append(f"{name}_count{_fmt_labels(key)} {count}")
+            else:
+                lines.append(f"{name}{_fmt_labels(key)} {series[key]}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- wiring ----------
+
+_timed_pools: Dict[type, type] = {}
+
+
+def _timed_pool_class(cls: type) -> type:
+    """Subclass of the engine's pool class whose ``connect`` feeds db_pool_checkout_seconds."""
+    if getattr(cls, "_metrics_timed", False):
+        return cls
+    timed_cls = _timed_pools.get(cls)
+    if timed_cls is None:
+
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                return cls.connect(self)
+            finally:
+                observe("db_pool_checkout_seconds", time.perf_counter() - start)
+
+        timed_cls = _timed_pools[cls] = type(cls.__name__, (cls,), {"connect": connect, "_metrics_timed": True})
+    return timed_cls
+
+
+def _instrument_engine(engine) -> None:
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("_metrics_t0")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        if _unrecorded():
+            return
+        observe("db_query_duration_seconds", elapsed, {"endpoint": current_endpoint()})
+        if has_request_context():
+            g.db_time = getattr(g, "db_time", 0.0) + elapsed
+
+    # Pool events fire only after a connection is handed out, so time the
+    # whole checkout (including waiting on an exhausted pool) in the pool class.
+    # engine.dispose() builds the new pool through recreate(), i.e. from
+    # self.__class__, so the timing carries over.
+    engine.pool.__class__ = _timed_pool_class(type(engine.pool))
+
+    def _pool_gauges():
+        # engine.pool, not a captured instance: dispose() replaces it
+        checkedout = getattr(engine.pool, "checkedout", None)
+        if callable(checkedout):
+            set_gauge("db_pool_checked_out", checkedout())
+
+    register_gauge_callback(_pool_gauges)
+
+
+def _instrument_templates(app) -> None:
+    local = threading.local()
+
+    def _before(sender, template, context, **extra):
+        stack = getattr(local, "stack", None)
+        if stack is None:
+            stack = local.stack = []
+        stack.append(time.perf_counter())
+
+    def _after(sender, template, context, **extra):
+        stack = getattr(local, "stack", None)
+        if stack:
+            started = stack.pop()
+            if _unrecorded():
+                return
+            observe("template_render_seconds", time.perf_counter() - started,
+                    {"template": template.name or "string"})
+
+    before_render_template.connect(_before, app, weak=False)
+    template_rendered.connect(_after, app, weak=False)
+
+
+def init_metrics(app, engine) -> None:
+    directory = app.config.get("METRICS_DIR")
+    if directory:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            _state["dir"] = directory
+        except OSError:
+            app.logger.warning("metrics: cannot create METRICS_DIR, exporting this worker only")
+    _state["interval"] = float(app.config.get("METRICS_FLUSH_INTERVAL", 5))
+
+    opts = app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}
+    if "pool_size" in opts:
+        set_gauge("db_pool_size", opts["pool_size"])
+    if "max_overflow" in opts:
+        set_gauge("db_pool_max_overflow", opts["max_overflow"])
+
+    _instrument_engine(engine)
+    _instrument_templates(app)
+
+    @app.before_request
+    def _metrics_start():
+        if not _unrecorded():
+            g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        t0 = getattr(g, "_metrics_t0", None)
+        if t0 is not None:
+            endpoint = current_endpoint()
+            observe("http_request_duration_seconds", time.perf_counter() - t0, {"endpoint": endpoint})
+            inc("http_requests_total",
+                {"endpoint": endpoint, "method": request.method, "status": response.status_code})
+        flush()
+        return response
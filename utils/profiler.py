@@ -0,0 +1,179 @@
+"""Opt-in sampling profiler for single requests, written as speedscope JSON.
+
+An admin adds ``X-Profile: 1`` (or ``?_profile=1``) to any request; a
+background thread then samples that request thread's stack every
+``PROFILE_INTERVAL_MS`` and the result lands in ``PROFILE_DIR`` as a file
+that https://www.speedscope.app opens directly. Without the flag the only
+cost is one header/arg lookup per request.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from flask import g, request
+
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ARG = "_profile"
+PROFILE_SUFFIX = ".speedscope.json"
+_SAFE_NAME_RE = re.compile(r"^[\w.-]+\.speedscope\.json$")
+
+
+class SamplingProfiler:
+    """Periodically snapshot one thread's Python stack from a helper thread."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_samples: int = 20000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_samples = max_samples
+        self.frames: List[Dict] = []
+        self._frame_index: Dict[Tuple[str, str, int], int] = {}
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+        self.duration = 0.0
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        idx = self._frame_index.get(key)
+        if idx is None:
+            idx = self._frame_index[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return idx
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+            if len(self.samples) >= self.max_samples:
+                break
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.duration = time.perf_counter() - self.started_at
+
+    def to_speedscope(self, name: str) -> dict:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "exporter": "wiru-sampling-profiler",
+            "name": name,
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(self.weights),
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }
+            ],
+        }
+
+
+def _wants_profile() -> bool:
+    return request.headers.get(PROFILE_HEADER) == "1" or request.args.get(PROFILE_ARG) == "1"
+
+
+def list_profiles(directory: str, limit: int = 100) -> List[Dict]:
+    try:
+        names = [n for n in os.listdir(directory) if n.endswith(PROFILE_SUFFIX)]
+    except OSError:
+        return []
+    items = []
+    for n in names:
+        try:
+            st = os.stat(os.path.join(directory, n))
+        except OSError:
+            continue
+        items.append({"name": n, "size": st.st_size, "mtime": datetime.fromtimestamp(st.st_mtime)})
+    items.sort(key=lambda x: x["mtime"], reverse=True)
+    return items[:limit]
+
+
+def profile_path(directory: str, name: str) -> Optional[str]:
+    """Resolve a capture name to a path inside ``directory`` (None if invalid)."""
+    if not _SAFE_NAME_RE.match(name or ""):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
+
+
+def _prune(directory: str, keep: int) -> None:
+    for item in list_profiles(directory, limit=10**6)[keep:]:
+        try:
+            os.remove(os.path.join(directory, item["name"]))
+        except OSError:
+            pass
+
+
+def init_profiler(app) -> None:
+    if not app.config.get("PROFILING_ENABLED", True):
+        return
+
+    @app.before_request
+    def _maybe_start_profile():
+        if not _wants_profile():
+            return
+        from flask_login import current_user
+
+        if not (current_user.is_authenticated and getattr(current_user, "is_admin", False)):
+            return
+        interval = float(app.config.get("PROFILE_INTERVAL_MS", 5)) / 1000.0
+        prof = SamplingProfiler(threading.get_ident(), interval=interval)
+        g._profiler = prof
+        prof.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        prof = g.pop("_profiler", None)
+        if prof is None:
+            return response
+        prof.stop()
+        directory = app.config.get("PROFILE_DIR", "./profiles")
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        endpoint = (request.endpoint or "unmatched").replace(".", "_")
+        name = f"{stamp}_{endpoint}_{int(prof.duration * 1000)}ms_{os.getpid()}{PROFILE_SUFFIX}"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                json.dump(prof.to_speedscope(f"{request.method} {request.path}"), f)
+            _prune(directory, int(app.config.get("PROFILE_KEEP", 50)))
+            response.headers["X-Profile-File"] = name
+        except OSError:
+            app.logger.warning("profiler: unable to write capture", extra={"dir": directory})
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(_exc=None):
+        prof = g.pop("_profiler", None)
+        if prof is not None:
+            prof.stop()
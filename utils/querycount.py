@@ -0,0 +1,132 @@
+"""Per-request SQL query counting, budgets and repeated-statement (N+1) detection."""
+
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from flask import current_app, g, has_request_context, request
+
+
+_WS_RE = re.compile(r"\s+")
+_STR_RE = re.compile(r"'(?:[^']|'')*'")
+_NUM_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_RE = re.compile(r"\bIN\s*\((?:[^()]*)\)", re.I)
+_SQLA_PARAM_RE = re.compile(r"__\[POSTCOMPILE_\w+\]")
+
+# Active assert_max_queries() recorders, innermost last
+_local = threading.local()
+
+
+def fingerprint(statement: str) -> str:
+    """Normalise a statement so executions differing only in literals compare equal."""
+    s = _SQLA_PARAM_RE.sub("?", statement)
+    s = _STR_RE.sub("?", s)
+    s = _NUM_RE.sub("?", s)
+    s = _IN_RE.sub("IN (?)", s)
+    return _WS_RE.sub(" ", s).strip()
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "fingerprints")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.seconds += elapsed
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int = 2):
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+
+def request_stats() -> Optional[QueryStats]:
+    if not has_request_context():
+        return None
+    return getattr(g, "sql_stats", None)
+
+
+def _recorders():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def assert_max_queries(n: int):
+    """Fail with the offending statements if more than ``n`` queries run inside the block.
+
+        with assert_max_queries(4):
+            client.get("/admin/users/1")
+    """
+    stats = QueryStats()
+    stack = _recorders()
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.remove(stats)
+    if stats.count > n:
+        lines = "\n".join(f"  {cnt}x {fp}" for fp, cnt in stats.fingerprints.most_common())
+        raise AssertionError(f"expected at most {n} queries, got {stats.count}:\n{lines}")
+
+
+def _budget_for(endpoint: Optional[str]) -> int:
+    budgets = current_app.config.get("SQL_QUERY_BUDGETS") or {}
+    if endpoint in budgets:
+        return int(budgets[endpoint])
+    return int(current_app.config.get("SQL_QUERY_BUDGET", 10))
+
+
+def init_query_counter(app, engine) -> None:
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_qc_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("_qc_t0")
+        elapsed = time.perf_counter() - stack.pop() if stack else 0.0
+        stats = request_stats()
+        if stats is not None:
+            stats.record(statement, elapsed)
+        for rec in getattr(_local, "stack", ()):
+            rec.record(statement, elapsed)
+
+    @app.before_request
+    def _qc_start():
+        g.sql_stats = QueryStats()
+
+    @app.after_request
+    def _qc_check(response):
+        stats = request_stats()
+        if stats is None:
+            return response
+        threshold = int(app.config.get("SQL_REPEAT_THRESHOLD", 3))
+        repeated = stats.repeated(threshold)
+        budget = _budget_for(request.endpoint)
+        if stats.count > budget or repeated:
+            app.logger.warning(
+                "sql: query budget exceeded" if stats.count > budget else "sql: repeated statements",
+                extra={
+                    "endpoint": request.endpoint,
+                    "queries": stats.count,
+                    "budget": budget,
+                    "db_ms": round(stats.seconds * 1000, 2),
+                    "repeated": [{"sql": fp[:300], "times": n} for fp, n in repeated[:5]],
+                },
+            )
+        if app.config.get("SQL_SERVER_TIMING"):
+            response.headers.add(
+                "Server-Timing", f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'
+            )
+        return response
@@ -0,0 +1,106 @@
+"""Responsive static images built by ``tools/generate_icons.py``.
+
+The build writes ``static/images/build/<stem>-<width>.<ext>`` plus a
+``manifest.json`` describing, per source file, the widths and formats that
+exist and the intrinsic size of the largest one. Templates use the
+``picture`` macro in ``_picture.html``, which calls ``responsive_image``
+below; without a manifest entry it falls back to the original file.
+
+The same build writes ``meta.json`` with the intrinsic size, dominant
+colour and a tiny blurred placeholder of every image in ``static/images``.
+``image_attrs`` turns an entry into ``width``/``height`` and a background
+that is painted until the image arrives, so the layout is stable at once.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Dict, Optional
+
+from flask import current_app, url_for
+from markupsafe import Markup
+
+from utils import assets, fragcache
+
+BUILD_SUBDIR = "images/build"
+_MIME = {"avif": "image/avif", "webp": "image/webp", "jpg": "image/jpeg", "png": "image/png"}
+_HASH_IN_NAME = re.compile(rf"\.[0-9a-f]{{{assets.HASH_LEN}}}(?=\.[^./]+$)")
+
+_cache: Dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def _load(name: str) -> dict:
+    path = os.path.join(current_app.static_folder, BUILD_SUBDIR, name)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    with _lock:
+        cached = _cache.get(name)
+        if cached is None or cached["mtime"] != mtime:
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            if cached is not None:
+                # cached layout fragments embed the old URLs and sizes
+                fragcache.invalidate()
+            cached = _cache[name] = {"mtime": mtime, "data": data}
+        return cached["data"]
+
+
+def _manifest() -> dict:
+    return _load("manifest.json")
+
+
+def _srcset(stem: str, widths, fmt: str) -> str:
+    return ", ".join(
+        f"{url_for('static', filename=f'{BUILD_SUBDIR}/{stem}-{w}.{fmt}')} {w}w" for w in widths
+    )
+
+
+def responsive_image(name: str) -> Optional[dict]:
+    """``<source>`` list, fallback ``src``/``srcset`` and intrinsic size for ``images/<name>``.
+
+    Returns None when the image hasn't been built; callers then use the original.
+    """
+    entry = _manifest().get(name)
+    if not entry:
+        return None
+    stem = os.path.splitext(name)[0]
+    widths = entry["widths"]
+    *modern, fallback = entry["formats"]
+    # the middle width is a reasonable default for browsers that ignore srcset
+    default = widths[len(widths) // 2]
+    return {
+        "sources": [{"type": _MIME[fmt], "srcset": _srcset(stem, widths, fmt)} for fmt in modern],
+        "src": url_for("static", filename=f"{BUILD_SUBDIR}/{stem}-{default}.{fallback}"),
+        "srcset": _srcset(stem, widths, fallback),
+        "width": entry["width"],
+        "height": entry["height"],
+    }
+
+
+def image_meta(src: Optional[str]) -> Optional[dict]:
+    """Index entry for ``images/x.jpg``, ``/static/images/x.jpg`` or its hashed URL; None if unknown."""
+    if not src:
+        return None
+    prefix = current_app.static_url_path + "/"
+    if src.startswith(prefix):
+        src = _HASH_IN_NAME.sub("", src[len(prefix):])
+    return _load("meta.json").get(src)
+
+
+def image_attrs(src: Optional[str], dims: bool = True) -> Markup:
+    """`` width=.. height=.. style=..`` for an ``<img>``: intrinsic size plus a blurred placeholder."""
+    meta = image_meta(src)
+    if not meta:
+        return Markup("")
+    attrs = Markup("")
+    if dims:
+        attrs += Markup(' width="{}" height="{}"').format(meta["width"], meta["height"])
+    if meta.get("placeholder"):
+        # transparent images get no placeholder: it would show through them
+        style = "background:{} url('{}') center/cover no-repeat".format(meta["color"], meta["placeholder"])
+        attrs += Markup(' style="{}"').format(style)
+    return attrs
@@ -0,0 +1,85 @@
+"""Service worker generated from the asset manifest, served at ``/sw.js``.
+
+The worker precaches the content-hashed site bundles (and the self-hosted
+fonts when they are built), answers any content-hashed static URL cache
+first and serves the public schedule stale-while-revalidate, so a repeat
+visit shows tonight's classes instantly even on a poor connection.
+
+Its version is a hash of the rendered script. The precache list holds
+hashed URLs, so any deploy that changes a bundle changes the script; the
+browser then installs the new worker, which deletes the old caches. The
+script itself is served ``no-cache`` with an ETag, so checking for an
+update costs a 304.
+
+Only pages the server marked ``Cache-Control: public`` are stored, i.e.
+the anonymous variant (see ``utils/locales``). The worker can't read the
+session cookie, so it tracks sign-in from what it sees: a POST to a login
+URL or a non-public page response means a session, a public response or
+a logout means none. While signed in, pages always come from the network.
+
+With ``SERVICE_WORKER_ENABLED=0`` the same URL serves a worker that clears
+its caches and unregisters itself.
+"""
+
+import hashlib
+import re
+import threading
+from typing import Dict, List, Tuple
+
+from flask import current_app, render_template, url_for
+
+from utils import assets, bundles, fonts, locales
+
+TEMPLATE = "sw.js"
+VERSION_PLACEHOLDER = "__SW_VERSION__"
+# Bundles every public page needs; admin and inlined critical CSS are left out
+PRECACHE_BUNDLES = ("site.css", "site.js", "home.css", "schedule.css", "schedule.js")
+MAX_RUNTIME_STATIC = 60
+# Views that start a session when POSTed to
+LOGIN_ENDPOINTS = ("login", "register", "admin_login")
+
+_lock = threading.Lock()
+_rendered: Dict[Tuple, Tuple[str, str]] = {}
+
+
+def precache_urls() -> List[str]:
+    urls = [bundles.bundle_url(name) for name in PRECACHE_BUNDLES]
+    urls += [url_for("static", filename=f"{fonts.FONTS_SUBDIR}/{name}") for name in fonts.font_files()]
+    return urls
+
+
+def _swr_pattern() -> str:
+    langs = "|".join(re.escape(code) for code in current_app.config["LANGUAGES"])
+    schedule = url_for("schedule_page", **{locales.LANG_ARG: None})
+    return rf"^/(?:{langs}){re.escape(schedule)}/?$"
+
+
+def _hashed_pattern() -> str:
+    static = current_app.static_url_path + "/"
+    return rf"^{re.escape(static)}.+\.[0-9a-f]{{{assets.HASH_LEN}}}\.[^./]+$"
+
+
+def render() -> Tuple[str, str]:
+    """``(script, version)`` for the current assets; rendered once per distinct precache list."""
+    enabled = current_app.config.get("SERVICE_WORKER_ENABLED", True)
+    precache = precache_urls() if enabled else []
+    key = (enabled, tuple(precache))
+    cached = _rendered.get(key)
+    if cached is not None:
+        return cached
+    body = render_template(
+        TEMPLATE,
+        enabled=enabled,
+        precache=precache,
+        swr_pattern=_swr_pattern(),
+        hashed_pattern=_hashed_pattern(),
+        logout_path=url_for("logout"),
+        login_paths=[url_for(endpoint) for endpoint in LOGIN_ENDPOINTS],
+        max_runtime_static=MAX_RUNTIME_STATIC,
+    )
+    version = hashlib.sha256(body.encode("utf-8")).hexdigest()[:assets.HASH_LEN]
+    result = (body.replace(VERSION_PLACEHOLDER, version), version)
+    with _lock:
+        _rendered.clear()
+        _rendered[key] = result
+    return result
@@ -0,0 +1,358 @@
+"""Where uploaded files live: the local volume or an S3-compatible bucket.
+
+``STORAGE_BACKEND = "local"`` (default) keeps files under UPLOAD_DIR and
+stores their paths in the DB, exactly as before. ``"s3"`` stores
+``s3:<key>`` refs instead and serves downloads as redirects to short-lived
+presigned URLs; it also lets the browser upload straight to the bucket (one
+presigned PUT, or presigned multipart parts for large files). Any
+MinIO/R2/Ceph endpoint works via ``S3_ENDPOINT_URL``. Every direct upload
+carries a signed SHA-256: of the whole body for a single PUT, of each part
+for multipart, where the object's checksum is then the composite one.
+
+Callers hold a *ref* (the value of ``Document.stored_path``,
+``Blob.stored_path`` or ``User.avatar_path``) and go through ``for_ref``:
+anything without the ``s3:`` scheme is a local path, so rows written before
+switching to S3 keep working.
+"""
+
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from flask import abort, current_app, redirect
+
+from utils.delivery import deliver, sandboxed_path
+
+
+S3_SCHEME = "s3:"
+
+
+def checksum_b64(sha256_hex: str) -> str:
+    """A hex SHA-256 as S3's ``x-amz-checksum-sha256`` value."""
+    return base64.b64encode(bytes.fromhex(sha256_hex)).decode("ascii")
+
+
+def composite_sha256(part_checksums: Sequence[str]) -> str:
+    """Checksum S3 reports for a multipart object: the SHA-256 of the part digests.
+
+    Without the ``-<parts>`` suffix, which some stores leave off.
+    """
+    h = hashlib.sha256()
+    for checksum in part_checksums:
+        h.update(base64.b64decode(checksum, validate=True))
+    return base64.b64encode(h.digest()).decode("ascii")
+
+
+def scratch_dir() -> str:
+    """Local directory for temporary files on their way into storage."""
+    path = os.path.join(current_app.config.get("UPLOAD_DIR", "./uploads"), ".incoming")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def sibling(ref: str, suffix: str) -> str:
+    """Ref of a derived file stored next to ``ref`` (``<stem><suffix>``)."""
+    return os.path.splitext(ref)[0] + suffix
+
+
+class LocalStorage:
+    name = "local"
+    direct_uploads = False
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def save(self, local_path: str, key: str, mime: Optional[str] = None) -> str:
+        """Move ``local_path`` into storage under ``key``; returns the ref to persist.
+
+        ``key`` is relative to UPLOAD_DIR, or an existing ref to overwrite.
+        """
+        dest = key if key.startswith(self.root) or os.path.isabs(key) else os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.replace(local_path, dest)
+        except OSError:
+            # different filesystem: copy next to the target, then rename into place
+            tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(local_path, tmp)
+            os.replace(tmp, dest)
+            os.remove(local_path)
+        return dest
+
+    def exists(self, ref: str) -> bool:
+        return os.path.isfile(ref)
+
+    def size(self, ref: str) -> Optional[int]:
+        try:
+            return os.path.getsize(ref)
+        except OSError:
+            return None
+
+    def delete(self, ref: str) -> None:
+        try:
+            os.remove(ref)
+        except OSError:
+            pass
+
+    def open(self, ref: str) -> BinaryIO:
+        return open(sandboxed_path(ref), "rb")
+
+    def iter_files(self) -> Iterator[Tuple[str, int, float]]:
+        """``(ref, size, mtime)`` for every file under UPLOAD_DIR."""
+        for dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    @contextmanager
+    def local_file(self, ref: str) -> Iterator[str]:
+        yield sandboxed_path(ref)
+
+    def send(self, ref: str, **kwargs):
+        return deliver(sandboxed_path(ref), **kwargs)
+
+
+class S3Storage:
+    name = "s3"
+    direct_uploads = True
+
+    def __init__(self, config):
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+        except ImportError as exc:  # pragma: no cover - depends on deployment
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the boto3 package") from exc
+        self.bucket = config.get("S3_BUCKET")
+        if not self.bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        self.prefix = (config.get("S3_PREFIX") or "").strip("/")
+        self.expires = int(config.get("S3_PRESIGN_EXPIRES", 300))
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=config.get("S3_ENDPOINT_URL") or None,
+            region_name=config.get("S3_REGION") or None,
+            aws_access_key_id=config.get("S3_ACCESS_KEY_ID") or None,
+            aws_secret_access_key=config.get("S3_SECRET_ACCESS_KEY") or None,
+            config=BotoConfig(
+                signature_version="s3v4",
+                s3={"addressing_style": config.get("S3_ADDRESSING_STYLE", "auto")},
+            ),
+        )
+
+    def _key(self, ref: str) -> str:
+        key = ref[len(S3_SCHEME):] if ref.startswith(S3_SCHEME) else ref
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    @staticmethod
+    def ref(key: str) -> str:
+        return key if key.startswith(S3_SCHEME) else S3_SCHEME + key
+
+    def _missing(self, exc) -> bool:
+        code = str(getattr(exc, "response", {}).get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def save(self, local_path: str, key: str, mime: Optional[str] = None) -> str:
+        extra = {"ContentType": mime} if mime else None
+        # upload_file switches to multipart on its own for large files
+        self.client.upload_file(local_path, self.bucket, self._key(key), ExtraArgs=extra)
+        os.remove(local_path)
+        return self.ref(key)
+
+    def head(self, ref: str) -> Optional[Dict]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(ref), ChecksumMode="ENABLED")
+        except Exception as exc:
+            if self._missing(exc):
+                return None
+            raise
+
+    def exists(self, ref: str) -> bool:
+        return self.head(ref) is not None
+
+    def size(self, ref: str) -> Optional[int]:
+        info = self.head(ref)
+        return None if info is None else int(info["ContentLength"])
+
+    def delete(self, ref: str) -> None:
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=self._key(ref))
+        except Exception as exc:
+            current_app.logger.warning("storage: delete failed", extra={"ref": ref, "error": str(exc)})
+
+    def move(self, src: str, dest: str) -> str:
+        """Server-side copy + delete; no bytes pass through the worker."""
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self._key(dest),
+            CopySource={"Bucket": self.bucket, "Key": self._key(src)},
+        )
+        self.delete(src)
+        return self.ref(dest)
+
+    def open(self, ref: str) -> BinaryIO:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(ref))["Body"]
+        except Exception as exc:
+            if self._missing(exc):
+                raise FileNotFoundError(ref) from exc
+            raise
+
+    def iter_files(self) -> Iterator[Tuple[str, int, float]]:
+        """``(ref, size, mtime)`` for every object under S3_PREFIX."""
+        paginator = self.client.get_paginator("list_objects_v2")
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", ()):
+                key = obj["Key"][len(prefix):]
+                yield self.ref(key), int(obj["Size"]), obj["LastModified"].timestamp()
+
+    def read_head(self, ref: str, n: int) -> bytes:
+        obj = self.client.get_object(Bucket=self.bucket, Key=self._key(ref), Range=f"bytes=0-{n - 1}")
+        return obj["Body"].read()
+
+    @contextmanager
+    def local_file(self, ref: str) -> Iterator[str]:
+        fd, tmp = tempfile.mkstemp(dir=scratch_dir(), suffix=os.path.splitext(ref)[1])
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self._key(ref), tmp)
+            yield tmp
+        finally:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def send(
+        self,
+        ref: str,
+        *,
+        as_attachment: bool = False,
+        download_name: Optional[str] = None,
+        mimetype: Optional[str] = None,
+        etag: Optional[str] = None,
+        max_age: Optional[int] = None,
+    ):
+        params = {"Bucket": self.bucket, "Key": self._key(ref)}
+        if mimetype:
+            params["ResponseContentType"] = mimetype
+        disposition = "attachment" if as_attachment else "inline"
+        if download_name:
+            disposition += f"; filename*=UTF-8''{quote(download_name)}"
+        params["ResponseContentDisposition"] = disposition
+        url = self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.expires)
+        rv = redirect(url)
+        rv.cache_control.private = True
+        # the redirect must not outlive the signature
+        rv.cache_control.max_age = min(max_age or 0, self.expires // 2)
+        return rv
+
+    # -- direct browser uploads --
+
+    def presign_put(self, key: str, mime: str, size: int, sha256_hex: str) -> Dict:
+        """Single PUT; the bucket verifies the body against the signed SHA-256."""
+        checksum = checksum_b64(sha256_hex)
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._key(key),
+                "ContentType": mime,
+                "ContentLength": size,
+                "ChecksumSHA256": checksum,
+            },
+            ExpiresIn=self.expires,
+        )
+        return {
+            "method": "put",
+            "url": url,
+            "headers": {"Content-Type": mime, "x-amz-checksum-sha256": checksum},
+        }
+
+    def start_multipart(self, key: str, mime: str, part_size: int, part_sha256: Sequence[str]) -> Dict:
+        """One presigned URL per part, each signed with that part's SHA-256."""
+        upload = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=self._key(key), ContentType=mime, ChecksumAlgorithm="SHA256"
+        )
+        upload_id = upload["UploadId"]
+        parts = []
+        for number, sha256_hex in enumerate(part_sha256, start=1):
+            checksum = checksum_b64(sha256_hex)
+            url = self.client.generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": self.bucket,
+                    "Key": self._key(key),
+                    "UploadId": upload_id,
+                    "PartNumber": number,
+                    "ChecksumSHA256": checksum,
+                },
+                ExpiresIn=self.expires,
+            )
+            parts.append({"url": url, "headers": {"x-amz-checksum-sha256": checksum}})
+        return {"method": "multipart", "upload_id": upload_id, "part_size": part_size, "parts": parts}
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Dict]) -> None:
+        """``parts`` are ``{"number", "etag", "checksum"}`` as the browser reports them."""
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": int(p["number"]), "ETag": str(p["etag"]), "ChecksumSHA256": str(p["checksum"])}
+                    for p in parts
+                ]
+            },
+        )
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key(key), UploadId=upload_id)
+        except Exception as exc:
+            current_app.logger.warning("storage: abort multipart failed", extra={"ref": key, "error": str(exc)})
+
+
+def _driver(name: str):
+    ext = current_app.extensions
+    key = f"storage_{name}"
+    store = ext.get(key)
+    if store is None:
+        if name == "s3":
+            store = S3Storage(current_app.config)
+        else:
+            store = LocalStorage(current_app.config.get("UPLOAD_DIR", "./uploads"))
+        ext[key] = store
+    return store
+
+
+def get_storage():
+    """The driver new files are written to (STORAGE_BACKEND)."""
+    backend = (current_app.config.get("STORAGE_BACKEND") or "local").lower()
+    return _driver("s3" if backend == "s3" else "local")
+
+
+def local_storage() -> LocalStorage:
+    return _driver("local")
+
+
+def for_ref(ref: str):
+    """Driver that holds ``ref``."""
+    return _driver("s3" if (ref or "").startswith(S3_SCHEME) else "local")
+
+
+def send_stored(ref: Optional[str], **kwargs):
+    """Response delivering a stored file (see ``utils.delivery.deliver`` for kwargs)."""
+    if not ref:
+        abort(404)
+    return for_ref(ref).send(ref, **kwargs)
@@ -0,0 +1,206 @@
+"""Document previews: a small JPEG of the image or of the first PDF page.
+
+The preview of ``<sha256>.<ext>`` is stored beside it (in the same storage
+driver) as ``<sha256>.thumb.jpg``, so duplicate uploads share one preview
+and it goes away with the blob. Rendering runs in a background pool after
+upload; the ``/documents/<id>/thumb`` view renders on demand if the pool
+hasn't yet.
+
+PDF pages are rasterised with ``pypdfium2`` (in requirements.txt), else
+with poppler's ``pdftoppm`` if it is on PATH. Without either, PDFs have no
+preview and the view falls back to a static icon.
+
+A file that can't be previewed (no renderer for its type, or rendering
+failed) gets an empty ``<sha256>.thumb.none`` marker instead, so the view
+doesn't retry the render on every request; ``backfill --force`` ignores
+the markers.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+from utils import storage
+
+
+THUMB_SUFFIX = ".thumb.jpg"
+NO_THUMB_SUFFIX = ".thumb.none"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# pdfium is not thread-safe
+_pdfium_lock = threading.Lock()
+
+
+def thumb_path(stored_path: str) -> str:
+    return storage.sibling(stored_path, THUMB_SUFFIX)
+
+
+def no_thumb_path(stored_path: str) -> str:
+    return storage.sibling(stored_path, NO_THUMB_SUFFIX)
+
+
+def _mark_no_preview(store, stored_path: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=storage.scratch_dir(), suffix=".none")
+    os.close(fd)
+    try:
+        store.save(tmp, no_thumb_path(stored_path), "application/octet-stream")
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _is_pdf(path: str, mime: Optional[str]) -> bool:
+    return (mime or "").lower() == "application/pdf" or path.lower().endswith(".pdf")
+
+
+def _render_pdf_page(path: str, px: int) -> Optional[Image.Image]:
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+    if pdfium is not None:
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(path)
+            try:
+                page = pdf[0]
+                width, height = page.get_size()
+                scale = px / max(width, height, 1)
+                return page.render(scale=scale).to_pil().convert("RGB")
+            finally:
+                pdf.close()
+    pdftoppm = shutil.which("pdftoppm")
+    if pdftoppm is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "page")
+        subprocess.run(
+            [pdftoppm, "-f", "1", "-l", "1", "-singlefile", "-jpeg", "-scale-to", str(px), path, out],
+            check=True,
+            timeout=30,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        with Image.open(out + ".jpg") as im:
+            return im.convert("RGB")
+
+
+def _render_image(path: str, px: int) -> Image.Image:
+    with Image.open(path) as im:
+        # JPEG can decode at 1/2..1/8 scale directly, much cheaper than a full decode
+        im.draft("RGB", (px, px))
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "L"):
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            rgba = im.convert("RGBA")
+            bg.paste(rgba, mask=rgba.split()[-1])
+            im = bg
+        im = im.convert("RGB")
+        im.thumbnail((px, px), Image.LANCZOS)
+        return im
+
+
+def render_thumbnail(stored_path: str, mime: Optional[str], px: int, force: bool = False) -> Optional[str]:
+    """Store the preview for ``stored_path`` and return its ref; ``None`` if it can't be previewed here."""
+    store = storage.for_ref(stored_path)
+    dest = thumb_path(stored_path)
+    if not force and store.exists(dest):
+        return dest
+    if not force and store.exists(no_thumb_path(stored_path)):
+        return None
+    with store.local_file(stored_path) as src:
+        try:
+            if _is_pdf(stored_path, mime):
+                im = _render_pdf_page(src, px)
+                if im is not None:
+                    im.thumbnail((px, px), Image.LANCZOS)
+            else:
+                im = _render_image(src, px)
+        except Exception:
+            # a corrupt file fails the same way every time
+            _mark_no_preview(store, stored_path)
+            raise
+    if im is None:
+        _mark_no_preview(store, stored_path)
+        return None
+    fd, tmp = tempfile.mkstemp(dir=storage.scratch_dir(), suffix=".jpg")
+    os.close(fd)
+    try:
+        im.save(tmp, format="JPEG", quality=80, optimize=True)
+        return store.save(tmp, dest, "image/jpeg")
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _get_executor(app) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(app.config.get("DOC_THUMB_WORKERS", 1)),
+                thread_name_prefix="doc-thumb",
+            )
+        return _executor
+
+
+def thumb_px() -> int:
+    return int(current_app.config.get("DOC_THUMB_PX", 240))
+
+
+def schedule_thumbnail(stored_path: str, mime: Optional[str]) -> None:
+    """Render the preview in the background pool; failures are only logged."""
+    app = current_app._get_current_object()
+    px = thumb_px()
+
+    def _done(fut):
+        exc = fut.exception()
+        if exc is not None:
+            app.logger.warning("thumbnail: rendering failed", extra={"path": stored_path, "error": str(exc)})
+
+    def _run():
+        with app.app_context():
+            render_thumbnail(stored_path, mime, px)
+
+    _get_executor(app).submit(_run).add_done_callback(_done)
+
+
+def ensure_thumbnail(stored_path: str, mime: Optional[str]) -> Optional[str]:
+    return render_thumbnail(stored_path, mime, thumb_px())
+
+
+def backfill(docs, force: bool = False) -> dict:
+    """Render missing previews synchronously (CLI); returns counters."""
+    stats = {"documents": 0, "rendered": 0, "existing": 0, "skipped": 0, "failed": 0}
+    px = thumb_px()
+    seen = set()
+    for doc in docs:
+        stats["documents"] += 1
+        path = doc.stored_path or ""
+        if path in seen:
+            stats["existing"] += 1
+            continue
+        seen.add(path)
+        store = storage.for_ref(path)
+        if not path or not store.exists(path):
+            stats["failed"] += 1
+            continue
+        if not force and store.exists(thumb_path(path)):
+            stats["existing"] += 1
+            continue
+        try:
+            if render_thumbnail(path, doc.mime, px, force=force) is None:
+                stats["skipped"] += 1
+            else:
+                stats["rendered"] += 1
+        except Exception as exc:
+            stats["failed"] += 1
+            current_app.logger.warning("thumbnail: backfill failed", extra={"doc_id": doc.id, "error": str(exc)})
+    return stats
@@ -0,0 +1,105 @@
+"""Garbage collection for uploaded files.
+
+Everything under UPLOAD_DIR (and, with the S3 driver, the bucket prefix) is
+compared with what the database still points at: ``User.avatar_path`` and
+its size variants, ``Document.stored_path``, ``Blob.stored_path`` and their
+previews. Unreferenced files older than the grace period are deleted; the
+grace period protects uploads that are spooled or stored but not yet
+committed. Blob ref counts and the per-user usage counters are reconciled
+in the same run.
+"""
+
+import os
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from flask import current_app
+
+from models import db, Blob, Document, User
+from utils import avatars, storage, usage
+from utils.thumbnails import no_thumb_path, thumb_path
+
+
+def _referenced() -> Tuple[Set[str], Set[str]]:
+    """Referenced local paths (realpath) and S3 refs."""
+    refs = []
+    for (path,) in db.session.execute(db.select(User.avatar_path).where(User.avatar_path.isnot(None))):
+        refs.append(path)
+        refs.extend(avatars.variant_path(path, size, ext) for size in avatars.SIZES for ext in avatars.FORMATS)
+    for column in (Document.stored_path, Blob.stored_path):
+        for (path,) in db.session.execute(db.select(column).distinct()):
+            if path:
+                refs.extend((path, thumb_path(path), no_thumb_path(path)))
+    local, remote = set(), set()
+    for ref in refs:
+        if ref.startswith(storage.S3_SCHEME):
+            remote.add(ref)
+        else:
+            local.add(os.path.realpath(ref))
+    return local, remote
+
+
+def reconcile_blobs(dry_run: bool = False) -> Dict[str, int]:
+    """Reset ``Blob.ref_count`` from the documents; drop blobs nobody references."""
+    counts = dict(
+        db.session.execute(
+            db.select(Document.sha256, db.func.count()).where(Document.sha256.isnot(None)).group_by(Document.sha256)
+        ).all()
+    )
+    stats = {"blobs_fixed": 0, "blobs_dropped": 0}
+    for blob in Blob.query.all():
+        want = counts.get(blob.sha256, 0)
+        if want == 0:
+            stats["blobs_dropped"] += 1
+            if not dry_run:
+                # the file itself is swept as an orphan once the grace period passes
+                db.session.delete(blob)
+        elif blob.ref_count != want:
+            stats["blobs_fixed"] += 1
+            if not dry_run:
+                blob.ref_count = want
+    if not dry_run:
+        db.session.commit()
+    return stats
+
+
+def _prune_empty_dirs(root: str) -> None:
+    for dirpath, dirs, files in os.walk(root, topdown=False):
+        if dirpath != root and not dirs and not files:
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                pass
+
+
+def collect(grace_hours: Optional[float] = None, dry_run: bool = False) -> Dict[str, int]:
+    """One GC pass; returns counters for reporting."""
+    if grace_hours is None:
+        grace_hours = float(current_app.config.get("UPLOAD_GC_GRACE_HOURS", 24))
+    stats = {"scanned": 0, "kept": 0, "young": 0, "orphans": 0, "bytes_freed": 0}
+    stats.update(reconcile_blobs(dry_run=dry_run))
+    local_refs, remote_refs = _referenced()
+    cutoff = time.time() - grace_hours * 3600
+
+    drivers = [storage.local_storage()]
+    if storage.get_storage() is not drivers[0]:
+        drivers.append(storage.get_storage())
+    for store in drivers:
+        for ref, size, mtime in store.iter_files():
+            stats["scanned"] += 1
+            remote = ref.startswith(storage.S3_SCHEME)
+            if (ref in remote_refs) if remote else (os.path.realpath(ref) in local_refs):
+                stats["kept"] += 1
+                continue
+            if mtime > cutoff:
+                stats["young"] += 1
+                continue
+            stats["orphans"] += 1
+            stats["bytes_freed"] += size
+            if not dry_run:
+                store.delete(ref)
+    if not dry_run:
+        _prune_empty_dirs(storage.local_storage().root)
+        stats["usage_fixed"] = usage.rebuild()
+        current_app.logger.info("uploads: gc finished", extra=stats)
+    return stats
@@ -0,0 +1,198 @@
+"""Streaming upload handling.
+
+Werkzeug's multipart parser hands every file part to ``Request._get_file_stream``.
+``UploadRequest`` returns a ``SpoolFile`` there that writes the chunks straight
+into ``UPLOAD_DIR/.incoming`` while hashing them, remembers the first bytes for
+type sniffing and raises 413 the moment the per-file limit is crossed. Saving an
+upload is then a rename into place instead of a second copy.
+"""
+
+import hashlib
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from flask import Request, current_app, has_app_context
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+CHUNK_SIZE = 64 * 1024
+INCOMING_DIRNAME = ".incoming"
+_SNIFF_BYTES = 16
+
+# magic prefix -> (canonical extension, mime)
+_MAGIC = (
+    (b"%PDF-", ("pdf", "application/pdf")),
+    (b"\x89PNG\r\n\x1a\n", ("png", "image/png")),
+    (b"\xff\xd8\xff", ("jpg", "image/jpeg")),
+)
+_EXT_ALIASES = {"jpeg": "jpg"}
+
+
+class UploadRejected(Exception):
+    """The upload is not acceptable (unknown/forbidden type, empty, ...)."""
+
+
+@dataclass
+class UploadInfo:
+    path: str
+    size: int
+    sha256: str
+    ext: str
+    mime: str
+
+
+def sniff(head: bytes):
+    """Return ``(ext, mime)`` detected from magic bytes, or ``None``."""
+    for magic, result in _MAGIC:
+        if head.startswith(magic):
+            return result
+    return None
+
+
+def max_upload_bytes() -> int:
+    return int(current_app.config.get("MAX_UPLOAD_MB", 15)) * 1024 * 1024
+
+
+def incoming_dir() -> str:
+    return os.path.join(current_app.config.get("UPLOAD_DIR", "./uploads"), INCOMING_DIRNAME)
+
+
+class SpoolFile:
+    """Writable/readable temp file that hashes, sniffs and enforces a size cap as it is written."""
+
+    def __init__(self, directory: str, limit: int):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{uuid.uuid4().hex}.part")
+        self._f = open(self.path, "w+b")
+        self.limit = limit
+        self.size = 0
+        self.head = b""
+        self._sha = hashlib.sha256()
+        self.committed = False
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.limit:
+            self.discard()
+            raise RequestEntityTooLarge()
+        if len(self.head) < _SNIFF_BYTES:
+            self.head += data[: _SNIFF_BYTES - len(self.head)]
+        self._sha.update(data)
+        return self._f.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha.hexdigest()
+
+    def commit_to(self, dest: str) -> None:
+        """Move the spooled bytes to ``dest`` (same filesystem, so a rename)."""
+        self._f.flush()
+        self._f.close()
+        os.replace(self.path, dest)
+        self.committed = True
+
+    def discard(self) -> None:
+        try:
+            self._f.close()
+        except Exception:
+            pass
+        if not self.committed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self.discard()
+
+    def __getattr__(self, name):
+        # read/seek/tell/readline/... for FileStorage consumers
+        if name == "_f":
+            raise AttributeError(name)
+        return getattr(self._f, name)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename or not has_app_context():
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        spool = SpoolFile(incoming_dir(), max_upload_bytes())
+        self.__dict__.setdefault("_spools", []).append(spool)
+        return spool
+
+    def close(self) -> None:
+        super().close()
+        # parts that never reached request.files (aborted mid-parse)
+        for spool in self.__dict__.pop("_spools", ()):
+            spool.discard()
+
+
+def _normalize_ext(ext: str) -> str:
+    ext = (ext or "").lower()
+    return _EXT_ALIASES.get(ext, ext)
+
+
+def allowed_ext(filename: str, allowed: Optional[Iterable[str]] = None) -> Optional[str]:
+    """Canonical extension of ``filename`` if it is an accepted upload type."""
+    ext = _normalize_ext(os.path.splitext(filename or "")[1].lstrip("."))
+    allowed_exts = {_normalize_ext(e) for e in (allowed or current_app.config.get("ALLOWED_UPLOAD_EXTENSIONS", ()))}
+    known = {result[0] for _, result in _MAGIC}
+    return ext if ext in allowed_exts and ext in known else None
+
+
+def mime_for_ext(ext: str) -> Optional[str]:
+    ext = _normalize_ext(ext)
+    for _, (known, mime) in _MAGIC:
+        if known == ext:
+            return mime
+    return None
+
+
+def save_upload(storage: FileStorage, dest_dir: str, prefix: str = "", allowed: Optional[Iterable[str]] = None) -> UploadInfo:
+    """Validate by content and move an uploaded file into ``dest_dir``.
+
+    The stored extension and mime type come from the sniffed magic bytes, not
+    from the client-supplied filename or Content-Type.
+    """
+    allowed_exts = {_normalize_ext(e) for e in (allowed or current_app.config.get("ALLOWED_UPLOAD_EXTENSIONS", ()))}
+    limit = max_upload_bytes()
+    os.makedirs(dest_dir, exist_ok=True)
+    stream = storage.stream
+
+    if isinstance(stream, SpoolFile):
+        size, head, digest = stream.size, stream.head, stream.sha256
+        spool = stream
+    else:
+        # Fallback for streams Werkzeug created itself (e.g. test clients):
+        # same chunked copy + checks, into a spool of our own
+        spool = SpoolFile(incoming_dir(), limit)
+        try:
+            stream.seek(0)
+        except Exception:
+            pass
+        try:
+            shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+        except Exception:
+            spool.discard()
+            raise
+        size, head, digest = spool.size, spool.head, spool.sha256
+
+    if size == 0:
+        spool.discard()
+        raise UploadRejected("empty file")
+    detected = sniff(head)
+    if detected is None or detected[0] not in allowed_exts:
+        spool.discard()
+        raise UploadRejected("unsupported file type")
+    ext, mime = detected
+    dest = os.path.join(dest_dir, f"{prefix}{uuid.uuid4().hex}.{ext}")
+    try:
+        spool.commit_to(dest)
+    except Exception:
+        spool.discard()
+        raise
+    return UploadInfo(path=dest, size=size, sha256=digest, ext=ext, mime=mime)
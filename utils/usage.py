@@ -0,0 +1,100 @@
+"""Per-user upload usage (``User.storage_bytes`` / ``storage_files``).
+
+The counters move with every ``Document`` insert and delete (including
+cascades from deleting a user), so checking a quota is a read of the
+already-loaded ``current_user`` instead of ``SUM(size_bytes)``. Counts are
+logical: a deduplicated blob still counts for every document that uses it.
+``rebuild`` recomputes them from scratch; the GC job runs it to fix drift.
+"""
+
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import event, func, inspect
+
+from models import db, Document, User
+
+
+def quota_bytes() -> int:
+    """Per-user limit in bytes; 0 means unlimited."""
+    return int(current_app.config.get("USER_QUOTA_MB", 0)) * 1024 * 1024
+
+
+def quota_allows(user, add_bytes: int) -> bool:
+    limit = quota_bytes()
+    if not limit or getattr(user, "is_admin", False):
+        return True
+    return (user.storage_bytes or 0) + max(add_bytes, 0) <= limit
+
+
+def _bump(connection, user_id: Optional[int], size: Optional[int], files: int) -> None:
+    if user_id is None:
+        return
+    table = User.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == user_id)
+        .values(
+            storage_bytes=table.c.storage_bytes + (size or 0),
+            storage_files=table.c.storage_files + files,
+        )
+    )
+
+
+@event.listens_for(Document, "after_insert")
+def _count_insert(mapper, connection, target):
+    _bump(connection, target.user_id, target.size_bytes, 1)
+
+
+@event.listens_for(Document, "after_delete")
+def _count_delete(mapper, connection, target):
+    _bump(connection, target.user_id, -(target.size_bytes or 0), -1)
+
+
+@event.listens_for(Document.size_bytes, "set", active_history=True)
+@event.listens_for(Document.user_id, "set", active_history=True)
+def _load_old_value(target, value, oldvalue, initiator):
+    # active_history loads the previous value on assignment even when the row
+    # was expired by a commit, so after_update knows what to move
+    pass
+
+
+@event.listens_for(Document, "after_update")
+def _count_update(mapper, connection, target):
+    attrs = inspect(target).attrs
+    size = attrs.size_bytes.history
+    owner = attrs.user_id.history
+    old_size = size.deleted[0] if size.deleted and size.added else target.size_bytes
+    if owner.deleted and owner.added:
+        # moved to another user: the whole document changes hands
+        _bump(connection, owner.deleted[0], -(old_size or 0), -1)
+        _bump(connection, target.user_id, target.size_bytes, 1)
+    elif size.deleted and size.added:
+        # e.g. an image document replaced by its normalised version
+        _bump(connection, target.user_id, (target.size_bytes or 0) - (old_size or 0), 0)
+
+
+def rebuild() -> int:
+    """Recompute every user's counters from ``document``; returns how many rows changed."""
+    doc = Document.__table__
+    usage = (
+        db.select(
+            doc.c.user_id,
+            func.coalesce(func.sum(doc.c.size_bytes), 0).label("bytes"),
+            func.count().label("files"),
+        )
+        .group_by(doc.c.user_id)
+    )
+    actual = {row.user_id: (int(row.bytes), int(row.files)) for row in db.session.execute(usage)}
+    changed = 0
+    for user_id, stored_bytes, stored_files in db.session.execute(
+        db.select(User.id, User.storage_bytes, User.storage_files)
+    ):
+        want = actual.get(user_id, (0, 0))
+        if (stored_bytes or 0, stored_files or 0) != want:
+            db.session.execute(
+                db.update(User).where(User.id == user_id).values(storage_bytes=want[0], storage_files=want[1])
+            )
+            changed += 1
+    db.session.commit()
+    return changed
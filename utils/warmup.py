@@ -0,0 +1,141 @@
+"""Boot-time warmup, so a freshly deployed machine is fast from its first visitor.
+
+Fly keeps one machine running and swaps in a cold process on every deploy.
+Without warmup the first visitors pay for opening the DB pool, compiling
+templates, loading the translation catalogs and the first run of every
+query. ``run`` does all of that up front:
+
+* opens ``pool_size`` connections at once and returns them to the pool;
+* loads the Babel catalog of every language in ``LANGUAGES``;
+* renders every public page (localized routes without URL arguments) once
+  per language through the test client, which compiles the templates,
+  fills the layout fragment cache and runs the pages' queries. These
+  requests are marked so they don't count as traffic in ``/metrics``.
+
+``start`` runs it in a background thread when the process is serving
+requests (``flask run``, gunicorn), not for other ``flask`` commands.
+``/readyz`` answers 503 until it has finished, and Fly's health check only
+routes traffic to the machine after that. A step that fails is logged and
+skipped: a page that errors should not keep the machine out of service.
+``WARMUP_ENABLED=0`` turns it off (``/readyz`` is then ready at once);
+``flask warmup`` runs it in the foreground and prints the timings.
+"""
+
+import multiprocessing
+import threading
+import time
+from typing import Dict, List
+
+import click
+from flask import url_for
+from flask_babel import force_locale, get_translations
+from sqlalchemy import text
+
+from models import db
+from utils import locales, metrics
+
+metrics.define("app_warmup_seconds", "gauge", "Duration of the boot-time warmup by step.")
+
+_state = {"status": "pending", "report": None}
+_lock = threading.Lock()
+
+
+def _warm_pool(app) -> int:
+    size = int(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}).get("pool_size", 5))
+    conns = []
+    try:
+        for _ in range(size):
+            conn = db.engine.connect()
+            conns.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
+
+
+def _warm_catalogs(app) -> int:
+    with app.test_request_context():
+        for lang in app.config["LANGUAGES"]:
+            with force_locale(lang):
+                get_translations()
+    return len(app.config["LANGUAGES"])
+
+
+def public_pages(app) -> List[str]:
+    """URLs of every localized GET page without URL arguments, in every language."""
+    endpoints = sorted({
+        rule.endpoint
+        for rule in app.url_map.iter_rules()
+        if locales.is_localized(rule.endpoint) and "GET" in rule.methods and rule.arguments == {locales.LANG_ARG}
+    })
+    with app.test_request_context():
+        return [
+            url_for(endpoint, **{locales.LANG_ARG: lang})
+            for lang in app.config["LANGUAGES"]
+            for endpoint in endpoints
+        ]
+
+
+def _warm_pages(app) -> int:
+    client = app.test_client()
+    failed = []
+    pages = public_pages(app)
+    for url in pages:
+        status = client.get(url, environ_base={metrics.UNRECORDED_ENVIRON_KEY: True}).status_code
+        if status != 200:
+            failed.append(f"{url} ({status})")
+    if failed:
+        app.logger.warning("warmup: pages failed", extra={"pages": failed})
+    return len(pages) - len(failed)
+
+
+STEPS = (("db_pool", _warm_pool), ("catalogs", _warm_catalogs), ("pages", _warm_pages))
+
+
+def run(app) -> Dict:
+    """Run every step and return ``{"seconds": total, "steps": {name: {"seconds", "count"}}}``."""
+    with _lock:
+        _state["status"] = "running"
+    started = time.perf_counter()
+    steps = {}
+    for name, step in STEPS:
+        t0 = time.perf_counter()
+        try:
+            with app.app_context():
+                count = step(app)
+        except Exception as exc:
+            app.logger.warning("warmup: step failed", extra={"step": name, "error": str(exc)})
+            count = None
+        seconds = round(time.perf_counter() - t0, 3)
+        steps[name] = {"seconds": seconds, "count": count}
+        metrics.set_gauge("app_warmup_seconds", seconds, {"step": name})
+    report = {"seconds": round(time.perf_counter() - started, 3), "steps": steps}
+    metrics.set_gauge("app_warmup_seconds", report["seconds"], {"step": "total"})
+    app.logger.info("warmup: done", extra=report)
+    with _lock:
+        _state.update(status="done", report=report)
+    return report
+
+
+def _serving() -> bool:
+    """False while another ``flask`` command (migrations, builds, ...) has loaded the app."""
+    if multiprocessing.parent_process() is not None:
+        # a pool process that imported the app
+        return False
+    ctx = click.get_current_context(silent=True)
+    return ctx is None or ctx.info_name == "run"
+
+
+def start(app) -> None:
+    if not app.config.get("WARMUP_ENABLED", True) or not _serving():
+        with _lock:
+            _state["status"] = "skipped"
+        return
+    threading.Thread(target=run, args=(app,), name="warmup", daemon=True).start()
+
+
+def status() -> Dict:
+    """``{"ready": bool, "status": ..., "report": ...}`` for the readiness check."""
+    with _lock:
+        return {"ready": _state["status"] in ("done", "skipped"), **_state}
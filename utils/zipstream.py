@@ -0,0 +1,114 @@
+"""Streaming ZIP writer.
+
+``stream_zip`` yields the archive as it is produced: ``zipfile`` writes into a
+non-seekable sink (so it emits data descriptors instead of seeking back),
+and the sink is drained after every chunk. Nothing is buffered beyond one
+read chunk plus the central directory entries, whatever the archive size.
+"""
+
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+CHUNK_SIZE = 64 * 1024
+# Formats that are already compressed: deflating them only burns CPU
+STORED_EXTENSIONS = frozenset({"pdf", "jpg", "jpeg", "png", "webp", "avif", "gif", "zip", "gz"})
+
+
+@dataclass
+class ZipEntry:
+    name: str
+    modified: Optional[datetime]
+    open: Callable[[], BinaryIO]
+    size: Optional[int] = None
+
+
+class _Sink:
+    """Write-only, tell-able, unseekable buffer that ``drain`` empties."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._chunks)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def compress_type_for(name: str) -> int:
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def unique_name(name: str, used: set) -> str:
+    """``name``, or ``stem (2).ext`` etc. if an earlier entry already took it."""
+    candidate, n = name, 1
+    stem, dot, ext = name.rpartition(".")
+    if not dot:
+        stem, ext = name, ""
+    while candidate.lower() in used:
+        n += 1
+        candidate = f"{stem} ({n}).{ext}" if dot else f"{stem} ({n})"
+    used.add(candidate.lower())
+    return candidate
+
+
+def stream_zip(
+    entries: Iterable[ZipEntry],
+    on_error: Optional[Callable[[ZipEntry, Exception], None]] = None,
+    errors_name: str = "_missing.txt",
+) -> Iterator[bytes]:
+    """Yield a ZIP archive of ``entries``.
+
+    Entries that can't be read are skipped, passed to ``on_error`` and listed
+    in a final ``errors_name`` text file inside the archive.
+    """
+    sink = _Sink()
+    failed = []
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:
+        for entry in entries:
+            try:
+                src = entry.open()
+            except Exception as exc:
+                failed.append(f"{entry.name}: {exc.__class__.__name__}")
+                if on_error is not None:
+                    on_error(entry, exc)
+                continue
+            info = zipfile.ZipInfo(entry.name, date_time=(entry.modified or datetime(1980, 1, 1)).timetuple()[:6])
+            info.compress_type = compress_type_for(entry.name)
+            info.external_attr = 0o644 << 16
+            try:
+                with src, zf.open(info, mode="w", force_zip64=(entry.size or 0) > (1 << 31) - CHUNK_SIZE) as dest:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        dest.write(chunk)
+                        if sink.pending:
+                            yield sink.drain()
+            except Exception as exc:
+                # The entry is closed with what was read so far, so the archive
+                # itself stays valid; the truncation is reported
+                failed.append(f"{entry.name}: truncated ({exc.__class__.__name__})")
+                if on_error is not None:
+                    on_error(entry, exc)
+            if sink.pending:
+                yield sink.drain()
+        if failed:
+            zf.writestr(errors_name, "\n".join(failed) + "\n")
+    yield sink.drain()